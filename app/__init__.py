@@ -3,7 +3,6 @@ from flask_sqlalchemy import SQLAlchemy
 import os
 import logging
 from dotenv import load_dotenv
-import bcrypt
 import secrets
 
 # Load environment variables
@@ -19,59 +18,212 @@ logger = logging.getLogger(__name__)
 # Initialize extensions
 db = SQLAlchemy()
 
+# Bump when models change; databases at an older version are upgraded on startup
+SCHEMA_VERSION = 3
+
+# Database URIs already bootstrapped by this process
+_bootstrapped_databases = set()
+
 def create_app():
     """Create and configure the Flask application"""
     app = Flask(__name__)
     
     # Configure the app
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(16))
+    app.config['SECRET_KEY'] = load_secret_key()
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///./docker_compose_file.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     
     # Initialize extensions with the app
     db.init_app(app)
+    if app.config['SQLALCHEMY_ENGINE_OPTIONS']:
+        from sqlalchemy import event
+        with app.app_context():
+            event.listen(db.engine, 'connect', configure_sqlite_connection)
+    
+    # Request, SQL and subprocess timings exported on /metrics
+    from app.services import instrumentation
+    instrumentation.init_app(app, db)
+    
+    # Opt-in cProfile dumps (PROFILE_REQUESTS or an admin's X-Profile header)
+    from app.services.profiler import request_profiler
+    request_profiler.init_app(app)
+    
+    # Requests with an API token authenticate without a cookie session
+    from app.services.token_service import ApiTokenSessionInterface
+    app.session_interface = ApiTokenSessionInterface()
     
     # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
     from app.routes.docker import docker_bp
     from app.routes.github import github_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.admin import admin_bp
+    from app.routes.bulk import bulk_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(docker_bp)
     app.register_blueprint(github_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(bulk_bp)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-        # Initialize admin user if not exists
-        from app.models.user import User
-        admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
-        
-        admin = User.query.filter_by(username=admin_username).first()
-        if not admin:
-            # Generate a 16-character strong password with special characters
-            import string
-            alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
-            admin_password = ''.join(secrets.choice(alphabet) for i in range(16))
-            
-            # Log the generated password at INFO level
-            logger.info(f'Generated admin password: {admin_password}')
-            
-            # Hash the password
-            hashed_password = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt())
-            admin = User(
-                username=admin_username,
-                password=hashed_password.decode('utf-8'),
-                is_admin=True
-            )
-            db.session.add(admin)
-            db.session.commit()
+    # Create or upgrade database tables once per database
+    bootstrap_database(app)
     
     # Health check endpoint
     @app.route('/health')
     def health_check():
         return {'status': 'healthy'}
     
-    return app
\ No newline at end of file
+    return app
+
+def sqlite_engine_options(database_uri):
+    """Engine options for file-based SQLite databases shared by request and deployment threads"""
+    if not database_uri.startswith('sqlite') or ':memory:' in database_uri or database_uri.rstrip('/') == 'sqlite:':
+        return {}
+    return {
+        'connect_args': {
+            # Seconds the driver waits for a lock; busy_timeout below covers the same for SQLite itself
+            'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 15000)) / 1000,
+            'check_same_thread': False
+        },
+        # Up to 50 connections so the 32 gunicorn threads plus deployment threads never wait for one;
+        # in WAL mode readers do not wait for the writer, only for a free connection
+        'pool_size': int(os.environ.get('SQLITE_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('SQLITE_MAX_OVERFLOW', 40)),
+        'pool_timeout': 30,
+        'pool_recycle': 3600
+    }
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Enable WAL so readers do not block the deployment writer, and wait on locks instead of failing"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')}")
+        cursor.execute(f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+        cursor.execute(f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT', 15000))}")
+    finally:
+        cursor.close()
+
+def load_secret_key():
+    """Return SECRET_KEY from the environment, or a generated key persisted under data/"""
+    secret_key = os.environ.get('SECRET_KEY')
+    if secret_key:
+        return secret_key
+    
+    import fcntl
+    
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    key_path = os.environ.get('SECRET_KEY_FILE', os.path.join(data_dir, '.secret_key'))
+    os.makedirs(os.path.dirname(key_path), exist_ok=True)
+    
+    # All workers open the same file; the first one to take the lock writes the key
+    fd = os.open(key_path, os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(fd, 'r+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            secret_key = f.read().strip()
+            if not secret_key:
+                secret_key = secrets.token_hex(32)
+                f.seek(0)
+                f.truncate()
+                f.write(secret_key)
+                f.flush()
+                os.fsync(f.fileno())
+                logger.info(f'Generated SECRET_KEY and saved it to {key_path}')
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return secret_key
+
+def bootstrap_database(app):
+    """Create tables, add new columns and the admin user when the schema version changes"""
+    database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if database_uri in _bootstrapped_databases:
+        return
+    
+    with app.app_context():
+        is_sqlite = db.engine.dialect.name == 'sqlite'
+        if is_sqlite and _schema_version() == SCHEMA_VERSION:
+            _bootstrapped_databases.add(database_uri)
+            return
+        
+        # Workers start at the same time; one upgrades the schema while the others wait
+        with _bootstrap_lock(is_sqlite):
+            if is_sqlite and _schema_version() == SCHEMA_VERSION:
+                _bootstrapped_databases.add(database_uri)
+                return
+            
+            from app.models import user  # noqa: F401 - register models before create_all
+            db.create_all()
+            _add_missing_columns()
+            _create_admin_user()
+            
+            if is_sqlite:
+                with db.engine.begin() as connection:
+                    connection.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            logger.info(f'Database schema is at version {SCHEMA_VERSION}')
+    
+    _bootstrapped_databases.add(database_uri)
+
+def _schema_version():
+    """Return the SQLite user_version of the current database"""
+    with db.engine.connect() as connection:
+        return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+def _bootstrap_lock(is_sqlite):
+    """Lock held across processes while the schema is created (a file next to the SQLite database)"""
+    from contextlib import nullcontext
+    from app.services.file_service import file_lock
+    
+    database = db.engine.url.database if is_sqlite else None
+    if not database or database == ':memory:' or database.startswith('file:'):
+        return nullcontext()
+    return file_lock(os.path.abspath(database))
+
+def _add_missing_columns():
+    """Add columns that were added to existing models (create_all only creates new tables)"""
+    from sqlalchemy import inspect
+    
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                logger.info(f'Added column {table.name}.{column.name}')
+
+def _create_admin_user():
+    """Initialize admin user if not exists"""
+    from app.models.user import User
+    admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
+    
+    admin = User.query.filter_by(username=admin_username).first()
+    if not admin:
+        import bcrypt
+        import string
+        
+        # Generate a 16-character strong password with special characters
+        alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
+        admin_password = ''.join(secrets.choice(alphabet) for i in range(16))
+        
+        # Log the generated password at INFO level
+        logger.info(f'Generated admin password: {admin_password}')
+        
+        # Hash the password
+        hashed_password = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt())
+        admin = User(
+            username=admin_username,
+            password=hashed_password.decode('utf-8'),
+            is_admin=True
+        )
+        db.session.add(admin)
+        db.session.commit()
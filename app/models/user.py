@@ -40,4 +40,48 @@ class DeploymentLog(db.Model):
     file = db.relationship('DockerComposeFile', backref='deployment_logs')
     
     def __repr__(self):
-        return f'<DeploymentLog {self.id} - {self.status}>'
\ No newline at end of file
+        return f'<DeploymentLog {self.id} - {self.status}>'
+
+class DeploymentState(db.Model):
+    """Model to track the last successful deployment of a compose file"""
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(500), unique=True, nullable=False, index=True)
+    config_hash = db.Column(db.String(64), nullable=False)
+    image_digests = db.Column(db.Text, nullable=True)  # JSON: service -> image id
+    container_state = db.Column(db.Text, nullable=True)  # JSON: service -> containers
+    content = db.Column(db.Text, nullable=True)  # File content that was deployed
+    deployed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DeploymentState {self.file_path} ({self.config_hash[:12]})>'
+
+
+class ApiToken(db.Model):
+    """Model to track API tokens issued to automation clients"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    jti = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    revoked = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    last_used_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationship
+    user = db.relationship('User', backref='api_tokens')
+    
+    def __repr__(self):
+        return f'<ApiToken {self.name} ({self.jti[:8]})>'
+
+
+class Credential(db.Model):
+    """Model to store third-party access tokens, encrypted with a key derived from SECRET_KEY"""
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    encrypted_token = db.Column(db.Text, nullable=False)
+    hint = db.Column(db.String(32), nullable=True)  # Masked token shown in the settings page
+    updated_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Credential {self.provider}>'
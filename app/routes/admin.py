@@ -0,0 +1,149 @@
+from flask import Blueprint, request, jsonify, session, send_from_directory
+from app.services.profiler import request_profiler
+from app.services.memory_tracker import memory_tracker, structure_sizes, process_rss, GROUP_BY, MAX_FRAMES
+
+# Create blueprint
+admin_bp = Blueprint('admin', __name__)
+
+def _require_admin():
+    """Return an error response unless the current user is an admin"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin privileges required'}), 403
+    return None
+
+@admin_bp.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List saved request profiles, newest first"""
+    error = _require_admin()
+    if error:
+        return error
+
+    return jsonify({
+        'success': True,
+        'directory': request_profiler.directory,
+        'max_files': request_profiler.max_files,
+        'profiles': request_profiler.list_profiles()
+    })
+
+@admin_bp.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """Download a saved .prof file"""
+    error = _require_admin()
+    if error:
+        return error
+    if not name.endswith('.prof'):
+        return jsonify({'error': 'Profile not found'}), 404
+
+    return send_from_directory(request_profiler.directory, name, as_attachment=True)
+
+@admin_bp.route('/api/admin/memory', methods=['GET'])
+def memory_report():
+    """Report process RSS, tracemalloc status and sizes of in-memory structures"""
+    error = _require_admin()
+    if error:
+        return error
+
+    return jsonify({
+        'success': True,
+        'rss': process_rss(),
+        'tracemalloc': memory_tracker.status(),
+        'structures': structure_sizes()
+    })
+
+@admin_bp.route('/api/admin/memory/start', methods=['POST'])
+def start_memory_tracing():
+    """Start tracemalloc"""
+    error = _require_admin()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    try:
+        frames = int(data.get('frames', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'frames must be an integer'}), 400
+    if not 1 <= frames <= MAX_FRAMES:
+        return jsonify({'error': f'frames must be between 1 and {MAX_FRAMES}'}), 400
+
+    started = memory_tracker.start(frames)
+    return jsonify({'success': True, 'started': started, 'tracemalloc': memory_tracker.status()})
+
+@admin_bp.route('/api/admin/memory/stop', methods=['POST'])
+def stop_memory_tracing():
+    """Stop tracemalloc and drop its snapshots"""
+    error = _require_admin()
+    if error:
+        return error
+
+    return jsonify({'success': True, 'stopped': memory_tracker.stop()})
+
+@admin_bp.route('/api/admin/memory/snapshots', methods=['POST'])
+def take_memory_snapshot():
+    """Take a snapshot and return its top allocation sites"""
+    error = _require_admin()
+    if error:
+        return error
+
+    group_by, limit, error = _report_options()
+    if error:
+        return error
+
+    info = memory_tracker.take_snapshot()
+    if info is None:
+        return jsonify({'error': 'tracemalloc is not running'}), 409
+
+    return jsonify({
+        'success': True,
+        'snapshot': info,
+        'top': memory_tracker.top(info['id'], group_by, limit),
+        'structures': structure_sizes()
+    })
+
+@admin_bp.route('/api/admin/memory/snapshots/<int:snapshot_id>', methods=['GET'])
+def get_memory_snapshot(snapshot_id):
+    """Top allocation sites of a stored snapshot"""
+    error = _require_admin()
+    if error:
+        return error
+
+    group_by, limit, error = _report_options()
+    if error:
+        return error
+
+    top = memory_tracker.top(snapshot_id, group_by, limit)
+    if top is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+
+    return jsonify({'success': True, 'snapshot_id': snapshot_id, 'group_by': group_by, 'top': top})
+
+@admin_bp.route('/api/admin/memory/diff', methods=['GET'])
+def diff_memory_snapshots():
+    """Compare two snapshots (?from=<id>&to=<id>), largest growth first"""
+    error = _require_admin()
+    if error:
+        return error
+
+    group_by, limit, error = _report_options()
+    if error:
+        return error
+
+    old_id = request.args.get('from', type=int)
+    new_id = request.args.get('to', type=int)
+    if old_id is None or new_id is None:
+        return jsonify({'error': 'from and to snapshot ids required'}), 400
+
+    diff = memory_tracker.diff(old_id, new_id, group_by, limit)
+    if diff is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+
+    return jsonify({'success': True, 'from': old_id, 'to': new_id, 'group_by': group_by, 'diff': diff})
+
+def _report_options():
+    """Read group_by and limit query parameters, returning (group_by, limit, error response)"""
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in GROUP_BY:
+        return None, None, (jsonify({'error': f"group_by must be one of {', '.join(GROUP_BY)}"}), 400)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    return group_by, limit, None
@@ -1,9 +1,10 @@
-from flask import Blueprint, request, jsonify, session, redirect, url_for
+from flask import Blueprint, request, jsonify, session, redirect, url_for, current_app
 from app import db
-from app.models.user import User
-import bcrypt
+from app.models.user import User, ApiToken
+from app.services.login_guard import login_guard
+from app.services.token_service import token_service
 from datetime import datetime
-import jwt
+import math
 import os
 
 # Create blueprint
@@ -16,12 +17,20 @@ def login():
     if not data or not data.get('username') or not data.get('password'):
         return jsonify({'error': 'Username and password required'}), 400
     
+    # Throttle per client IP and per IP and username before any database or bcrypt work
+    allowed, retry_after = login_guard.allow(request.remote_addr, data['username'])
+    if not allowed:
+        return _too_many_attempts(retry_after)
+    
     user = User.query.filter_by(username=data['username']).first()
     if not user:
         return jsonify({'error': 'Invalid username or password'}), 401
     
-    # Check password
-    if not bcrypt.checkpw(data['password'].encode('utf-8'), user.password.encode('utf-8')):
+    # Check password; concurrent bcrypt checks are capped
+    password_ok = login_guard.check_password(data['password'], user.password)
+    if password_ok is None:
+        return _too_many_attempts(1)
+    if not password_ok:
         return jsonify({'error': 'Invalid username or password'}), 401
     
     # Update last login
@@ -74,12 +83,86 @@ def change_password():
     user = User.query.get(session['user_id'])
     
     # Check old password
-    if not bcrypt.checkpw(data['old_password'].encode('utf-8'), user.password.encode('utf-8')):
+    password_ok = login_guard.check_password(data['old_password'], user.password)
+    if password_ok is None:
+        return _too_many_attempts(1)
+    if not password_ok:
         return jsonify({'error': 'Old password is incorrect'}), 400
     
+    import bcrypt
+    
     # Update password
     hashed_password = bcrypt.hashpw(data['new_password'].encode('utf-8'), bcrypt.gensalt())
     user.password = hashed_password.decode('utf-8')
     db.session.commit()
     
-    return jsonify({'success': True, 'message': 'Password changed successfully'}), 200
\ No newline at end of file
+    return jsonify({'success': True, 'message': 'Password changed successfully'}), 200
+
+@auth_bp.route('/api/tokens', methods=['GET'])
+def list_api_tokens():
+    """List API tokens of the current user"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    tokens = ApiToken.query.filter_by(user_id=session['user_id']).order_by(ApiToken.created_at.desc()).all()
+    return jsonify({
+        'success': True,
+        'tokens': [_token_info(token) for token in tokens]
+    })
+
+@auth_bp.route('/api/tokens', methods=['POST'])
+def create_api_token():
+    """Issue a long-lived API token for automation clients"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if session.get('api_token_id'):
+        return jsonify({'error': 'API tokens cannot issue other tokens'}), 403
+    
+    data = request.json or {}
+    name = (data.get('name') or '').strip()
+    if not name:
+        return jsonify({'error': 'Token name required'}), 400
+    
+    expires_in_days = data.get('expires_in_days')
+    if expires_in_days is not None and (not isinstance(expires_in_days, int) or expires_in_days <= 0):
+        return jsonify({'error': 'expires_in_days must be a positive integer'}), 400
+    
+    user = User.query.get(session['user_id'])
+    token, record = token_service.issue(current_app.secret_key, user, name, expires_in_days)
+    
+    # The token itself is only returned once
+    return jsonify({
+        'success': True,
+        'token': token,
+        'token_info': _token_info(record)
+    }), 201
+
+@auth_bp.route('/api/tokens/<int:token_id>', methods=['DELETE'])
+def revoke_api_token(token_id):
+    """Revoke an API token"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    record = ApiToken.query.filter_by(id=token_id, user_id=session['user_id']).first()
+    if not record:
+        return jsonify({'error': 'Token not found'}), 404
+    
+    token_service.revoke(record)
+    return jsonify({'success': True, 'message': 'Token revoked'})
+
+def _token_info(token):
+    """Serialize an ApiToken without its secret"""
+    return {
+        'id': token.id,
+        'name': token.name,
+        'revoked': token.revoked,
+        'created_at': token.created_at.isoformat() if token.created_at else None,
+        'expires_at': token.expires_at.isoformat() if token.expires_at else None,
+        'last_used_at': token.last_used_at.isoformat() if token.last_used_at else None
+    }
+
+def _too_many_attempts(retry_after):
+    """Fast 429 response for throttled login attempts"""
+    response = jsonify({'error': 'Too many login attempts, please try again later'})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
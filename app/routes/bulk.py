@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify, session
+import os
+from app.services.bulk_transform import BulkTransformService
+
+# Create blueprint
+bulk_bp = Blueprint('bulk', __name__)
+
+# Directory holding the downloaded and uploaded compose files
+DATA_DIR = os.environ.get('DATA_DIR', '/app/data')
+
+# Directories a bulk transform may select
+SYSTEM_TYPES = ('fnOS', 'QNAP', 'Synology', 'TrueNAS', 'UgreenNew', 'Ugreen', 'ZSpace', 'ZimaOS', 'local')
+
+@bulk_bp.route('/api/files/bulk-transform', methods=['POST'])
+def bulk_transform():
+    """Apply the same patch operations to every compose file matching a filter (admin only)
+
+    Dry run (the default) returns a unified diff per file; pass "dry_run": false to write the changes.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    data = request.get_json(silent=True) or {}
+    system_types = data.get('system_types') or None
+    if system_types is not None and (not isinstance(system_types, list) or
+                                     any(system_type not in SYSTEM_TYPES for system_type in system_types)):
+        return jsonify({'error': f'system_types must be a list of: {", ".join(SYSTEM_TYPES)}'}), 400
+
+    patterns = data.get('patterns') or None
+    if patterns is not None and (not isinstance(patterns, list) or
+                                 not all(isinstance(pattern, str) and pattern for pattern in patterns)):
+        return jsonify({'error': 'patterns must be a list of filename globs'}), 400
+
+    # Capped at BULK_TRANSFORM_WORKERS (CPU count by default) by the service
+    workers = data.get('workers')
+    if workers is not None and (not isinstance(workers, int) or isinstance(workers, bool) or workers < 1):
+        return jsonify({'error': 'workers must be a positive integer'}), 400
+
+    service = BulkTransformService(DATA_DIR)
+    success, report = service.run(data.get('operations'), system_types, patterns,
+                                  dry_run=data.get('dry_run', True) is not False, workers=workers)
+    if not success:
+        return jsonify({'error': report}), 400
+
+    return jsonify(dict(report, success=report['failed'] == 0))
@@ -1,12 +1,22 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context, current_app
 import os
 import subprocess
 import threading
 import uuid
 import time
-from app import db, create_app
-from app.models.user import DockerComposeFile, DeploymentLog
+from app import db
+from app.models.user import DockerComposeFile, DeploymentLog, DeploymentState
+from app.services.compose_service import ComposeService
+from app.services.docker_service import DockerService
+from app.services.stats_sampler import stats_sampler
+from app.services.metrics_store import metrics_store
+from app.services.mirror_service import mirror_service, configured_mirrors
+from app.services.compose_lint import compose_linter
+from app.services import instrumentation
 import json
+import re
+from datetime import datetime
+from collections import deque
 
 # Create blueprint
 docker_bp = Blueprint('docker', __name__)
@@ -14,6 +24,30 @@ docker_bp = Blueprint('docker', __name__)
 # Dictionary to store deployment processes
 deployment_processes = {}
 
+# Lines of live output kept per deployment (the full output is stored in DeploymentLog)
+DEPLOY_OUTPUT_TAIL_LINES = int(os.environ.get('DEPLOY_OUTPUT_TAIL_LINES', 1000))
+DEPLOY_OUTPUT_REFRESH = 0.5
+
+# Pull missing Docker Hub images through the fastest registry mirror unless a request says otherwise
+DEPLOY_USE_MIRROR = os.environ.get('DEPLOY_USE_MIRROR', 'false').lower() == 'true'
+
+# Check files against the compose spec before spawning compose (a request can skip it with "validate": false)
+DEPLOY_VALIDATE = os.environ.get('DEPLOY_VALIDATE', 'true').lower() == 'true'
+
+docker_service = DockerService()
+
+def _deployment_queue_depth():
+    """Deployments of this worker that are waiting or running, for /metrics"""
+    active = sum(1 for info in list(deployment_processes.values()) if info.get('status') in ('pending', 'deploying'))
+    return {(): active}
+
+instrumentation.registry.register(instrumentation.Gauge(
+    'compose_deployments_active', 'Deployments pending or running in this worker',
+    callback=_deployment_queue_depth))
+
+# Each log stream holds a worker thread, so cap them to keep threads free for other requests
+log_stream_slots = threading.BoundedSemaphore(int(os.environ.get('LOG_STREAM_MAX_CONCURRENT', 8)))
+
 @docker_bp.route('/api/docker/deploy', methods=['POST'])
 def deploy_compose():
     """Deploy a docker-compose file"""
@@ -27,23 +61,86 @@ def deploy_compose():
     file_path = data['file_path']
     if not os.path.exists(file_path):
         return jsonify({'error': 'File not found'}), 404
+    force = bool(data.get('force', False))
+    
+    # mirror: true picks the fastest healthy mirror, a mirror name uses that mirror, false pulls directly
+    mirror = data.get('mirror')
+    if mirror is None:
+        mirror = DEPLOY_USE_MIRROR
+    if isinstance(mirror, str) and mirror not in configured_mirrors():
+        return jsonify({'error': f'Unknown mirror: {mirror}'}), 400
+    if not isinstance(mirror, (bool, str)):
+        return jsonify({'error': 'mirror must be a boolean or a mirror name'}), 400
     
     # Determine Docker Compose version to use
     version_info = check_docker_compose_version()
     if version_info['version'] == 'unknown':
         return jsonify({'error': 'Docker Compose not available'}), 500
     
+    compose_service = ComposeService(version_info['version'])
+    command = ' '.join(compose_service.build_command(file_path, 'up', '-d'))
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # Reject invalid files before any compose process or image pull; results are cached by content hash
+    if DEPLOY_VALIDATE and data.get('validate', True) is not False:
+        lint = compose_linter.lint(content, os.path.dirname(os.path.abspath(file_path)))
+        if not lint['valid']:
+            instrumentation.deployments.inc(outcome='invalid')
+            first = lint['errors'][0]
+            return jsonify({
+                'error': f"Invalid compose file: {first['path']}: {first['message']}",
+                'errors': lint['errors'],
+                'warnings': lint['warnings']
+            }), 400
+    
     # Create deployment log
     compose_file = DockerComposeFile.query.filter_by(file_path=file_path).first()
-    deployment_id = str(uuid.uuid4())
+    services = None
+    
+    # Skip compose up when the resolved config, images and containers are unchanged
+    if not force:
+        state = DeploymentState.query.filter_by(file_path=os.path.abspath(file_path)).first()
+        unchanged, reason = compose_service.check_unchanged(file_path, state)
+        if unchanged:
+            log_entry = DeploymentLog(
+                file_id=compose_file.id if compose_file else 1,
+                status='unchanged',
+                command=command,
+                output=reason,
+                completed_at=db.func.current_timestamp()
+            )
+            db.session.add(log_entry)
+            db.session.commit()
+            instrumentation.deployments.inc(outcome='unchanged')
+
+            # Nothing runs, so the deployment is not tracked in deployment_processes;
+            # status requests are answered from the log entry
+            deployment_id = make_deployment_id(log_entry.id)
+
+            return jsonify({
+                'success': True,
+                'deployment_id': deployment_id,
+                'message': 'Deployment unchanged',
+                'unchanged': True,
+                'version': version_info['version']
+            })
+        
+        # Only redeploy the services changed since the last successful deployment
+        if state and state.content and not _env_changed_since(file_path, state.deployed_at):
+            services = compose_service.changed_services(state.content, content)
+            if services:
+                command = ' '.join(compose_service.build_command(file_path, 'up', '-d', *services))
     
     log_entry = DeploymentLog(
         file_id=compose_file.id if compose_file else 1,  # Default to 1 if not found
         status='pending',
-        command=f"{'docker compose' if version_info['version'] == 'v2' else 'docker-compose'} -f {file_path} up -d"
+        command=command
     )
     db.session.add(log_entry)
     db.session.commit()
+    deployment_id = make_deployment_id(log_entry.id)
     
     # Store process info BEFORE starting thread
     deployment_processes[deployment_id] = {
@@ -57,7 +154,8 @@ def deploy_compose():
     # Start deployment in a separate thread
     thread = threading.Thread(
         target=execute_deployment,
-        args=(file_path, version_info['version'], log_entry.id, deployment_id)
+        args=(current_app._get_current_object(), file_path, version_info['version'], log_entry.id,
+              deployment_id, content, services, mirror)
     )
     thread.daemon = True
     thread.start()
@@ -69,6 +167,9 @@ def deploy_compose():
         'success': True,
         'deployment_id': deployment_id,
         'message': 'Deployment started',
+        'unchanged': False,
+        'services': services,
+        'mirror': mirror,
         'version': version_info['version']
     })
 
@@ -79,7 +180,20 @@ def get_deployment_status(deployment_id):
         return jsonify({'error': 'Not authenticated'}), 401
     
     if deployment_id not in deployment_processes:
-        return jsonify({'error': 'Deployment not found'}), 404
+        # The deployment may be running in another worker process; fall back to its log entry
+        log_entry = get_deployment_log(deployment_id)
+        if not log_entry:
+            return jsonify({'error': 'Deployment not found'}), 404
+        completed = log_entry.status in ['success', 'failed', 'unchanged']
+        return jsonify({
+            'deployment_id': deployment_id,
+            'status': log_entry.status,
+            'progress': 100 if log_entry.status in ['success', 'unchanged'] else (0 if completed else 50),
+            'output': log_entry.output or '',
+            'completed': completed,
+            'created_at': log_entry.created_at.isoformat() if log_entry.created_at else None,
+            'completed_at': log_entry.completed_at.isoformat() if log_entry.completed_at else None
+        })
     
     process_info = deployment_processes[deployment_id]
     log_entry = DeploymentLog.query.get(process_info['log_id'])
@@ -89,7 +203,7 @@ def get_deployment_status(deployment_id):
         'status': log_entry.status if log_entry else process_info['status'],
         'progress': process_info['progress'],
         'output': process_info['output'],
-        'completed': process_info['status'] in ['success', 'failed'],
+        'completed': process_info['status'] in ['success', 'failed', 'unchanged'],
         'created_at': log_entry.created_at.isoformat() if log_entry else None,
         'completed_at': log_entry.completed_at.isoformat() if log_entry and log_entry.completed_at else None
     })
@@ -106,16 +220,16 @@ def upgrade_docker_compose():
             'curl', '-SL', 
             'https://github.com/docker/compose/releases/download/v2.20.3/docker-compose-linux-x86_64', 
             '-o', '/usr/local/bin/docker-compose'
-        ], check=True, capture_output=True, text=True)
+        ], check=True, capture_output=True, text=True, timeout=300)
         
         # Make it executable
         subprocess.run(['chmod', '+x', '/usr/local/bin/docker-compose'], 
-                      check=True, capture_output=True, text=True)
+                      check=True, capture_output=True, text=True, timeout=30)
         
         # Create symlink if needed
         if not os.path.exists('/usr/local/bin/docker-compose'):
             subprocess.run(['ln', '-sf', '/usr/local/bin/docker-compose', '/usr/bin/docker-compose'], 
-                          check=True, capture_output=True, text=True)
+                          check=True, capture_output=True, text=True, timeout=30)
         
         return jsonify({'success': True, 'message': 'Docker Compose upgraded to v2 successfully'})
     except Exception as e:
@@ -151,6 +265,147 @@ def start_container(container_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@docker_bp.before_app_request
+def start_stats_sampler():
+    """Start the container stats sampler so metric history is recorded"""
+    if os.environ.get('STATS_SAMPLER_AUTOSTART', 'true').lower() in ('1', 'true', 'yes'):
+        stats_sampler.start()
+
+@docker_bp.route('/api/docker/containers/stats', methods=['GET'])
+def get_containers_stats():
+    """Get the latest CPU, memory, network and block IO sample of running containers"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    # The sampler runs in the background; requests only read its cached snapshot
+    stats_sampler.start()
+    return Response(stats_sampler.snapshot(), mimetype='application/json')
+
+@docker_bp.route('/api/docker/metrics/history', methods=['GET'])
+def get_metrics_history():
+    """Get CPU, memory and network history of a compose project or the host"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    # Host metrics are kept apart from project series, so a project may use any name
+    series = request.args.get('series')
+    host = request.args.get('host', 'false').lower() in ('1', 'true', 'yes')
+    if not series and not host:
+        return jsonify({'success': True, 'series': metrics_store.list_series(), 'host': metrics_store.has_host()})
+    
+    try:
+        start = float(request.args['start']) if request.args.get('start') else None
+        end = float(request.args['end']) if request.args.get('end') else None
+        step = int(request.args['step']) if request.args.get('step') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid start, end or step parameter'}), 400
+    
+    if host:
+        result = metrics_store.query_host(start=start, end=end, step=step)
+    else:
+        result = metrics_store.query(series, start=start, end=end, step=step)
+    if result is None:
+        return jsonify({'error': 'Series or resolution not found'}), 404
+    
+    result['success'] = True
+    return jsonify(result)
+
+@docker_bp.route('/api/docker/containers/<container_id>/logs/stream', methods=['GET'])
+def stream_container_logs(container_id):
+    """Stream container logs as server-sent events"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        since = _parse_log_time(request.args.get('since'))
+        until = _parse_log_time(request.args.get('until'))
+        tail = request.args.get('tail', '100')
+        tail = tail if tail == 'all' else max(0, int(tail))
+        # EventSource clients send the id of the last event they received when they reconnect
+        last_event_id = request.headers.get('Last-Event-ID')
+        resume_after = _log_time_key(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid since, until, tail or Last-Event-ID'}), 400
+    if resume_after is not None:
+        # Docker's since is inclusive, so read from the start of that second without a tail
+        # and drop the lines the client already has
+        since = resume_after // 1_000_000_000
+        tail = 'all'
+    
+    streams = request.args.get('stream', 'all')
+    if streams not in ('all', 'stdout', 'stderr'):
+        return jsonify({'error': 'stream must be all, stdout or stderr'}), 400
+    follow = request.args.get('follow', 'false').lower() in ('1', 'true', 'yes')
+    show_timestamps = request.args.get('timestamps', 'false').lower() in ('1', 'true', 'yes')
+    
+    if not log_stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many concurrent log streams'}), 429
+    
+    success, lines = docker_service.open_log_stream(
+        container_id,
+        follow=follow,
+        since=since,
+        until=until,
+        tail=tail,
+        stdout=streams in ('all', 'stdout'),
+        stderr=streams in ('all', 'stderr'),
+        timestamps=True
+    )
+    if not success:
+        log_stream_slots.release()
+        return jsonify({'error': lines}), 404 if lines == '容器不存在' else 500
+    
+    def generate():
+        for stream_name, line in lines:
+            # Each line starts with its RFC3339 timestamp, used as the event id
+            timestamp, _, text = line.partition(' ')
+            if not LOG_TIMESTAMP_PATTERN.match(timestamp):
+                timestamp, text = None, line
+            elif resume_after is not None and _log_time_key(timestamp) <= resume_after:
+                continue
+            if show_timestamps:
+                text = line
+            event_id = f'id: {timestamp}\n' if timestamp else ''
+            yield f'{event_id}event: {stream_name}\ndata: {text.replace(chr(13), "")}\n\n'
+        yield 'event: end\ndata: \n\n'
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(lines.close)
+    response.call_on_close(log_stream_slots.release)
+    return response
+
+LOG_TIMESTAMP_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:\d{2})?$')
+
+def _parse_log_time(value):
+    """Parse a unix timestamp or RFC3339 time into unix seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    
+    match = LOG_TIMESTAMP_PATTERN.match(value)
+    if not match:
+        raise ValueError(f'Invalid time: {value}')
+    base, fraction, tz = match.groups()
+    tz = '+00:00' if tz in (None, 'Z') else tz
+    seconds = datetime.fromisoformat(base + tz).timestamp()
+    return seconds + (float(fraction) if fraction else 0.0)
+
+def _log_time_key(value):
+    """Parse an RFC3339 time into integer nanoseconds, exact enough to compare log timestamps"""
+    match = LOG_TIMESTAMP_PATTERN.match(value)
+    if not match:
+        raise ValueError(f'Invalid time: {value}')
+    base, fraction, tz = match.groups()
+    tz = '+00:00' if tz in (None, 'Z') else tz
+    seconds = int(datetime.fromisoformat(base + tz).timestamp())
+    return seconds * 1_000_000_000 + int((fraction or '.')[1:10].ljust(9, '0'))
 
 @docker_bp.route('/api/docker/deployments', methods=['GET'])
 def get_deployments():
@@ -181,13 +436,14 @@ def get_deployments():
     
     return jsonify(result)
 
-def execute_deployment(file_path, compose_version, log_id, deployment_id):
+def execute_deployment(app, file_path, compose_version, log_id, deployment_id, content=None, services=None,
+                       mirror=False):
     """Execute deployment in a separate thread"""
     # Create application context for the thread
-    app = create_app()
     with app.app_context():
         process_info = deployment_processes[deployment_id]
         log_entry = DeploymentLog.query.get(log_id)
+        started_at = time.perf_counter()
     
         try:
             # Update status
@@ -196,9 +452,28 @@ def execute_deployment(file_path, compose_version, log_id, deployment_id):
             process_info['status'] = 'deploying'
             process_info['progress'] = 10
             
+            # Output; the live view keeps the last lines and is refreshed at most every
+            # DEPLOY_OUTPUT_REFRESH seconds, the full output is joined once for the log entry
+            output_lines = []
+            tail = deque(maxlen=DEPLOY_OUTPUT_TAIL_LINES)
+            refreshed_at = 0
+            
+            def emit(line):
+                nonlocal refreshed_at
+                output_lines.append(line)
+                tail.append(line)
+                now = time.monotonic()
+                if now - refreshed_at >= DEPLOY_OUTPUT_REFRESH:
+                    process_info['output'] = ''.join(tail)
+                    refreshed_at = now
+            
+            compose_service = ComposeService(compose_version)
+            if mirror:
+                process_info['progress'] = 20
+                pull_through_mirror(compose_service, file_path, services, mirror, emit)
+            
             # Build command
-            cmd = ['docker', 'compose', '-f', file_path, 'up', '-d'] if compose_version == 'v2' else \
-                  ['docker-compose', '-f', file_path, 'up', '-d']
+            cmd = compose_service.build_command(file_path, 'up', '-d', *(services or []))
             
             # Execute command
             process_info['progress'] = 30
@@ -210,19 +485,18 @@ def execute_deployment(file_path, compose_version, log_id, deployment_id):
                 bufsize=1
             )
             
-            # Read output
-            output_lines = []
             for line in process.stdout:
-                output_lines.append(line)
-                process_info['output'] = ''.join(output_lines)
+                emit(line)
                 # Update progress
                 process_info['progress'] = min(90, process_info['progress'] + 5)
+            process_info['output'] = ''.join(tail)
             
             # Wait for process to complete
             process.wait()
             
             # Update status based on exit code
             if process.returncode == 0:
+                record_deployment_state(compose_service, file_path, content)
                 log_entry.status = 'success'
                 process_info['status'] = 'success'
                 process_info['progress'] = 100
@@ -245,13 +519,105 @@ def execute_deployment(file_path, compose_version, log_id, deployment_id):
             process_info['output'] = f'Error: {str(e)}'
             process_info['progress'] = 0
         
+        instrumentation.deployments.inc(outcome=process_info['status'])
+        instrumentation.deployment_duration.observe(time.perf_counter() - started_at, outcome=process_info['status'])
+        
         # Clean up after some time
         time.sleep(3600)  # Keep for 1 hour
         if deployment_id in deployment_processes:
             del deployment_processes[deployment_id]
 
+def pull_through_mirror(compose_service, file_path, services, mirror, emit):
+    """Pull missing Docker Hub images through a registry mirror before compose up
+
+    Never fails the deployment: images the mirror could not provide are pulled
+    from their original registry by compose up.
+    """
+    try:
+        name = mirror_service.select(mirror if isinstance(mirror, str) else None)
+        if not name:
+            emit('No healthy registry mirror, pulling images from their original registries\n')
+            return
+        emit(f'Pulling missing images through {name}\n')
+        success, report = compose_service.pull_through_mirror(file_path, name, services, emit)
+        if not success:
+            mirror_service.record(name, {'kind': 'pull', 'ok': False, 'error': report})
+            emit(f'Mirror pull failed ({report}), pulling images from their original registries\n')
+            return
+        if report['pulled'] or report['fallback']:
+            throughput = report['bytes'] / report['duration'] if report['pulled'] and report['duration'] else None
+            mirror_service.record(name, {
+                'kind': 'pull',
+                # A mirror that served some of the images stays usable, one that served none is skipped
+                'ok': bool(report['pulled']),
+                'throughput': round(throughput) if throughput else None,
+                'error': f"{len(report['fallback'])} images not available" if report['fallback'] else None
+            })
+        for image in report['fallback']:
+            emit(f'{image} not pulled from {name}, falling back to its original registry\n')
+        emit(f"Pulled {len(report['pulled'])} images through {name} in {report['duration']}s\n")
+    except Exception as e:
+        emit(f'Mirror pull failed ({str(e)}), pulling images from their original registries\n')
+
+def make_deployment_id(log_id):
+    """Build a deployment id that embeds its DeploymentLog id"""
+    return f'{log_id}-{uuid.uuid4().hex}'
+
+def get_deployment_log(deployment_id):
+    """Look up the DeploymentLog of a deployment id created by make_deployment_id"""
+    log_id, _, _ = deployment_id.partition('-')
+    if not log_id.isdigit():
+        return None
+    return DeploymentLog.query.get(int(log_id))
+
+def _env_changed_since(file_path, deployed_at):
+    """Check whether the .env file next to a compose file changed after a deployment"""
+    env_file = os.path.join(os.path.dirname(file_path), '.env')
+    if not os.path.exists(env_file) or deployed_at is None:
+        return False
+    return datetime.utcfromtimestamp(os.path.getmtime(env_file)) > deployed_at
+
+def record_deployment_state(compose_service, file_path, content=None):
+    """Record config hash, image ids and containers of a successful deployment"""
+    try:
+        success, resolved = compose_service.resolve_config(file_path)
+        if not success:
+            return
+        image_digests, container_state = compose_service.collect_state(file_path, resolved['config'])
+        
+        abs_path = os.path.abspath(file_path)
+        state = DeploymentState.query.filter_by(file_path=abs_path).first()
+        if not state:
+            state = DeploymentState(file_path=abs_path)
+            db.session.add(state)
+        state.config_hash = resolved['hash']
+        state.image_digests = json.dumps(image_digests)
+        state.container_state = json.dumps(container_state)
+        state.content = content
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+# Cached Docker Compose version, re-checked after the TTL expires
+_compose_version_cache = {'value': None, 'checked_at': 0}
+COMPOSE_VERSION_TTL = 60
+
 def check_docker_compose_version():
     """Check Docker Compose version"""
+    cached = _compose_version_cache['value']
+    hit = bool(cached) and time.time() - _compose_version_cache['checked_at'] < COMPOSE_VERSION_TTL
+    instrumentation.count_cache('compose_version', hit)
+    if hit:
+        return cached
+    
+    version_info = _detect_docker_compose_version()
+    if version_info['version'] in ('v1', 'v2'):
+        _compose_version_cache['value'] = version_info
+        _compose_version_cache['checked_at'] = time.time()
+    return version_info
+
+def _detect_docker_compose_version():
+    """Detect the installed Docker Compose version"""
     try:
         # Try v2 first
         result = subprocess.run(['docker', 'compose', 'version'], 
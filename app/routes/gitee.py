@@ -10,6 +10,9 @@ from app.services.gitee_service import GiteeService
 # Create blueprint
 gitee_bp = Blueprint('gitee', __name__)
 
+# Directory holding the downloaded and uploaded compose files
+DATA_DIR = os.environ.get('DATA_DIR', '/app/data')
+
 # System types mapping
 system_types = {
     'fnOS': '飞牛系统',
@@ -305,7 +308,7 @@ def get_local_files():
         all_files = []
         for system_type in system_types.keys():
             # Check system directory
-            system_dir = os.path.join('/app/data', system_type)
+            system_dir = os.path.join(DATA_DIR, system_type)
             if os.path.exists(system_dir):
                 for filename in os.listdir(system_dir):
                     if filename.endswith('.yml') or filename.endswith('.yaml'):
@@ -322,7 +325,7 @@ def get_local_files():
                         })
         
         # Check local directory
-        local_dir = os.path.join('/app/data', 'local')
+        local_dir = os.path.join(DATA_DIR, 'local')
         if os.path.exists(local_dir):
             for filename in os.listdir(local_dir):
                 if filename.endswith('.yml') or filename.endswith('.yaml'):
@@ -365,7 +368,7 @@ def upload_local_file():
     
     try:
         # Create local directory if not exists
-        local_dir = os.path.join('/app/data', 'local')
+        local_dir = os.path.join(DATA_DIR, 'local')
         os.makedirs(local_dir, exist_ok=True)
         
         # Save file
@@ -1,15 +1,22 @@
 from flask import Blueprint, request, jsonify, session
 import os
-import requests
 import json
+import time
 from app import db
 from app.models.user import DockerComposeFile
-import yaml
 from app.services.github_service import GithubService
+from app.services.file_service import FileService, content_hash, file_hash, file_lock, write_file_atomic
+from app.services.compose_lint import compose_linter
 
 # Create blueprint
 github_bp = Blueprint('github', __name__)
 
+# Directory holding the downloaded and uploaded compose files
+DATA_DIR = os.environ.get('DATA_DIR', '/app/data')
+
+# Upper limit on files in one /api/github/download-batch request
+MAX_BATCH_DOWNLOADS = int(os.environ.get('GITHUB_MAX_BATCH_DOWNLOADS', 50))
+
 # System types mapping
 system_types = {
     'fnOS': '飞牛系统',
@@ -32,18 +39,20 @@ def get_github_files(system_type):
     if system_type not in system_types:
         return jsonify({'error': f'Invalid system type. Available: {list(system_types.keys())}'}), 400
     
-    # Get Github token from session
-    github_token = session.get('github_token', '')
-    
     try:
-        # Create GithubService instance with token
-        github_service = GithubService(token=github_token)
+        # Uses the server-side token shared by all users
+        github_service = GithubService()
         
         # Get files list
         success, data = github_service.get_files_list(system_type)
         
         if not success:
             error_msg = data.get('error', 'Unknown error')
+            if data.get('rate_limited'):
+                response = jsonify({'error': error_msg, 'rate_limited': True, 'reset_at': data.get('reset_at')})
+                if data.get('reset_at'):
+                    response.headers['Retry-After'] = str(max(1, int(data['reset_at'] - time.time())))
+                return response, 429
             return jsonify({'error': error_msg}), 500
         
         # Ensure files data is valid
@@ -71,6 +80,7 @@ def get_github_files(system_type):
                     'name': file.get('name', 'Unknown'),
                     'download_url': file.get('download_url', ''),
                     'size': file.get('size', 0),
+                    'sha': file.get('sha', ''),
                     'updated_at': file.get('updated_at', ''),
                     'exists_locally': file.get('exists_locally', False) or (existing_file is not None)
                 })
@@ -89,31 +99,64 @@ def get_github_files(system_type):
     except Exception as e:
         return jsonify({'error': f'Error fetching Github files: {str(e)}'}), 500
 
+def _parse_download(item):
+    """Validate one download request, returning (download dict, error message)"""
+    if not isinstance(item, dict) or not item.get('download_url') or not item.get('system_type') or not item.get('filename'):
+        return None, 'Missing required parameters'
+    if item['system_type'] not in system_types:
+        return None, 'Invalid system type'
+    if os.path.basename(item['filename']) != item['filename'] or item['filename'] in ('.', '..'):
+        return None, 'Invalid filename'
+    
+    size = item.get('size')
+    if size is not None:
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            return None, 'size must be an integer'
+    
+    return {
+        'download_url': item['download_url'],
+        'system_type': item['system_type'],
+        'filename': item['filename'],
+        # Size and blob SHA from the file listing; the download is verified against them
+        'size': size,
+        'sha': item.get('sha') or None
+    }, None
+
+def _record_download(filename, system_type, file_path):
+    """Create or update the database entry of a downloaded file"""
+    existing_file = DockerComposeFile.query.filter_by(
+        filename=filename,
+        system_type=system_type,
+        source='github'
+    ).first()
+    
+    if existing_file:
+        existing_file.file_path = file_path
+    else:
+        db.session.add(DockerComposeFile(
+            filename=filename,
+            system_type=system_type,
+            source='github',
+            file_path=file_path
+        ))
+
 @github_bp.route('/api/github/download', methods=['POST'])
 def download_github_file():
     """Download a file from Github"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    data = request.json
-    if not data or not data.get('download_url') or not data.get('system_type') or not data.get('filename'):
-        return jsonify({'error': 'Missing required parameters'}), 400
-    
-    download_url = data['download_url']
-    system_type = data['system_type']
-    filename = data['filename']
-    
-    # Validate system type
-    if system_type not in system_types:
-        return jsonify({'error': 'Invalid system type'}), 400
-    
-    # Get Github token from session
-    github_token = session.get('github_token', '')
+    item, error = _parse_download(request.json)
+    if error:
+        return jsonify({'error': error}), 400
     
     try:
-        # Create GithubService instance with token
-        github_service = GithubService(token=github_token)
-        success, data = github_service.download_file(download_url, system_type, filename)
+        # Uses the server-side token shared by all users
+        github_service = GithubService()
+        success, data = github_service.download_file(item['download_url'], item['system_type'], item['filename'],
+                                                     item['size'], item['sha'])
         
         if not success:
             return jsonify(data), 500
@@ -121,111 +164,93 @@ def download_github_file():
         file_path = data.get('file_path')
         
         # Update database
-        existing_file = DockerComposeFile.query.filter_by(
-            filename=filename,
-            system_type=system_type,
-            source='github'
-        ).first()
-        
-        if existing_file:
-            existing_file.file_path = file_path
-            db.session.commit()
-        else:
-            new_file = DockerComposeFile(
-                filename=filename,
-                system_type=system_type,
-                source='github',
-                file_path=file_path
-            )
-            db.session.add(new_file)
-            db.session.commit()
-        
-        # Get file size
-        size = os.path.getsize(file_path)
+        _record_download(item['filename'], item['system_type'], file_path)
+        db.session.commit()
         
         return jsonify({
             'success': True,
             'message': 'File downloaded successfully',
             'file_path': file_path,
-            'size': size
+            'size': data['size'],
+            'sha': data['sha'],
+            'changed': data['changed']
         })
     
     except Exception as e:
         return jsonify({'error': f'Error downloading file: {str(e)}'}), 500
 
-@github_bp.route('/api/github/system-types', methods=['GET'])
-def get_system_types():
-    """Get all available system types"""
+@github_bp.route('/api/github/download-batch', methods=['POST'])
+def download_github_files():
+    """Download several files from Github concurrently"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    # Get Github token from session
-    github_token = session.get('github_token', '')
+    data = request.json
+    if not data or not isinstance(data.get('files'), list) or not data['files']:
+        return jsonify({'error': 'files is required'}), 400
+    if len(data['files']) > MAX_BATCH_DOWNLOADS:
+        return jsonify({'error': f'At most {MAX_BATCH_DOWNLOADS} files per request'}), 400
+    
+    items = []
+    for index, entry in enumerate(data['files']):
+        item, error = _parse_download(entry)
+        if error:
+            return jsonify({'error': f'files[{index}]: {error}'}), 400
+        items.append(item)
     
     try:
-        # Check which system directories exist in Github
-        api_url = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
-        repo = os.environ.get('GITHUB_REPO', 'waiyanhein96/Docker-Compose-File')
-        
-        url = f"{api_url}/repos/{repo}/contents/"
+        github_service = GithubService()
+        outcomes = github_service.download_files(items)
         
-        # 使用查询参数传递token
-        params = {}
-        if github_token:
-            params['access_token'] = github_token
-        
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            
-            # Handle different status codes
-            if response.status_code == 200:
-                try:
-                    contents = response.json()
-                    # Validate response format
-                    if not isinstance(contents, list):
-                        raise ValueError("Invalid response format")
-                    
-                    available_systems = []
-                    for item in contents:
-                        if isinstance(item, dict) and item.get('type') == 'dir' and item.get('name') in system_types:
-                            available_systems.append({
-                                'key': item['name'],
-                                'name': system_types[item['name']]
-                            })
-                    
-                    return jsonify({
-                        'success': True,
-                        'system_types': available_systems
-                    })
-                except (ValueError, KeyError, TypeError):
-                    # Fall through to default system types
-                    pass
-                except Exception:
-                    # Fall through to default system types
-                    pass
+        results = []
+        for item, (success, result) in zip(items, outcomes):
+            entry = {'filename': item['filename'], 'system_type': item['system_type'], 'success': success}
+            if success:
+                _record_download(item['filename'], item['system_type'], result['file_path'])
+                entry.update(result)
             else:
-                # Fall through to default system types
-                pass
-        except requests.exceptions.RequestException:
-            # Fall through to default system types
-            pass
-        except Exception:
-            # Fall through to default system types
-            pass
+                entry['error'] = result.get('error', 'Unknown error')
+            results.append(entry)
+        db.session.commit()
         
-        # Return all system types as a fallback
-        default_systems = [{'key': k, 'name': v} for k, v in system_types.items()]
+        downloaded = sum(1 for entry in results if entry['success'])
         return jsonify({
-            'success': True,
-            'system_types': default_systems
+            'success': downloaded == len(results),
+            'downloaded': downloaded,
+            'failed': len(results) - downloaded,
+            'results': results
         })
     
-    except Exception:
-        # Return all system types as a fallback
+    except Exception as e:
+        return jsonify({'error': f'Error downloading files: {str(e)}'}), 500
+
+@github_bp.route('/api/github/system-types', methods=['GET'])
+def get_system_types():
+    """Get all available system types"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    # Discovering directories is not worth spending the last of the rate limit on
+    github_service = GithubService(interactive=False)
+    success, data = github_service.get_root_directories()
+    
+    if success:
+        available_systems = [{'key': name, 'name': system_types[name]}
+                             for name in data['directories'] if name in system_types]
         return jsonify({
             'success': True,
-            'system_types': [{'key': k, 'name': v} for k, v in system_types.items()]
+            'system_types': available_systems
         })
+    
+    # Return all system types as a fallback, saying why when it is the rate limit
+    result = {
+        'success': True,
+        'system_types': [{'key': k, 'name': v} for k, v in system_types.items()]
+    }
+    if data.get('rate_limited'):
+        result['warning'] = data['error']
+        result['rate_limit_reset_at'] = data.get('reset_at')
+    return jsonify(result)
 
 @github_bp.route('/api/github/file-content', methods=['POST'])
 def get_file_content():
@@ -244,26 +269,33 @@ def get_file_content():
             return jsonify({'error': 'File not found'}), 404
         
         # Read file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        content = raw.decode('utf-8')
+        version = content_hash(raw)
         
         # Try to parse YAML for structured editing
         try:
+            import yaml
             yaml_data = yaml.safe_load(content)
-            return jsonify({
+            response = jsonify({
                 'success': True,
                 'content': content,
+                'content_hash': version,
                 'parsed': True,
                 'yaml_data': yaml_data
             })
         except Exception as e:
             # Return raw content if parsing fails
-            return jsonify({
+            response = jsonify({
                 'success': True,
                 'content': content,
+                'content_hash': version,
                 'parsed': False,
                 'error': str(e)
             })
+        response.set_etag(version)
+        return response
     
     except Exception as e:
         return jsonify({'error': f'Error reading file: {str(e)}'}), 500
@@ -281,19 +313,114 @@ def update_file_content():
     file_path = data['file_path']
     content = data['content']
     
+    # Version the client edited (If-Match header or base_hash), to refuse overwriting someone else's save
+    expected = data.get('base_hash')
+    if not expected and len(request.if_match.as_set()) == 1:
+        expected = next(iter(request.if_match.as_set()))
+    
     try:
-        # Write file content
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # Hold the file's lock from the version check until the new content is in place,
+        # so two saves of the same version cannot both pass the check
+        with file_lock(file_path):
+            if expected:
+                current = file_hash(file_path)
+                if current is not None and current != expected:
+                    response = jsonify({
+                        'error': 'File was modified since it was loaded',
+                        'content_hash': current
+                    })
+                    response.set_etag(current)
+                    return response, 412
+            
+            # Unchanged content is not written, so the file's mtime stays put
+            changed, version = write_file_atomic(file_path, content)
         
-        return jsonify({
+        response = jsonify({
             'success': True,
-            'message': 'File updated successfully'
+            'message': 'File updated successfully' if changed else 'File unchanged',
+            'changed': changed,
+            'content_hash': version
         })
+        response.set_etag(version)
+        return response
     
     except Exception as e:
         return jsonify({'error': f'Error updating file: {str(e)}'}), 500
 
+@github_bp.route('/api/github/patch-file', methods=['POST'])
+def patch_file_content():
+    """Apply a batch of set/delete/append edits to a compose file, keeping comments and formatting"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.json
+    if not data or not data.get('file_path') or not isinstance(data.get('operations'), list):
+        return jsonify({'error': 'file_path and operations are required'}), 400
+    
+    file_path = data['file_path']
+    if not os.path.exists(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    try:
+        # Same as update-file: the read, the version check and the write happen under the file's lock
+        with file_lock(file_path):
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            
+            current = content_hash(raw)
+            if data.get('base_hash') and data['base_hash'] != current:
+                return jsonify({'error': 'File was modified since it was loaded', 'content_hash': current}), 412
+            
+            success, result = FileService().patch_yaml(raw.decode('utf-8'), data['operations'])
+            if not success:
+                return jsonify({'error': result}), 400
+            
+            if data.get('dry_run'):
+                return jsonify({
+                    'success': True,
+                    'dry_run': True,
+                    'changed': result['changed'],
+                    'results': result['results'],
+                    'content': result['content']
+                })
+            
+            changed, version = write_file_atomic(file_path, result['content'])
+        
+        response = jsonify({
+            'success': True,
+            'changed': changed,
+            'content_hash': version,
+            'results': result['results']
+        })
+        response.set_etag(version)
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': f'Error patching file: {str(e)}'}), 500
+
+@github_bp.route('/api/github/lint-file', methods=['POST'])
+def lint_file_content():
+    """Check a compose file (or unsaved content for it) against the compose spec and its variables"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.json
+    if not data or not (data.get('file_path') or isinstance(data.get('content'), str)):
+        return jsonify({'error': 'file_path or content is required'}), 400
+    
+    file_path = data.get('file_path')
+    if isinstance(data.get('content'), str):
+        # Unsaved editor content; the file's directory still provides the .env file
+        project_dir = os.path.dirname(os.path.abspath(file_path)) if file_path else None
+        return jsonify(dict(compose_linter.lint(data['content'], project_dir), success=True))
+    
+    if not os.path.exists(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    success, result = compose_linter.lint_file(file_path)
+    if not success:
+        return jsonify({'error': f'Error reading file: {result}'}), 500
+    return jsonify(dict(result, success=True))
+
 @github_bp.route('/api/local/files', methods=['GET'])
 def get_local_files():
     """Get local docker-compose files"""
@@ -305,7 +432,7 @@ def get_local_files():
         all_files = []
         for system_type in system_types.keys():
             # Check system directory
-            system_dir = os.path.join('/app/data', system_type)
+            system_dir = os.path.join(DATA_DIR, system_type)
             if os.path.exists(system_dir):
                 for filename in os.listdir(system_dir):
                     if filename.endswith('.yml') or filename.endswith('.yaml'):
@@ -322,7 +449,7 @@ def get_local_files():
                         })
         
         # Check local directory
-        local_dir = os.path.join('/app/data', 'local')
+        local_dir = os.path.join(DATA_DIR, 'local')
         if os.path.exists(local_dir):
             for filename in os.listdir(local_dir):
                 if filename.endswith('.yml') or filename.endswith('.yaml'):
@@ -365,7 +492,7 @@ def upload_local_file():
     
     try:
         # Create local directory if not exists
-        local_dir = os.path.join('/app/data', 'local')
+        local_dir = os.path.join(DATA_DIR, 'local')
         os.makedirs(local_dir, exist_ok=True)
         
         # Save file
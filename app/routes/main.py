@@ -1,8 +1,8 @@
 from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request
 import os
-import docker
 from datetime import datetime
-import requests
+from app.services.login_guard import login_guard
+from app.services.credential_store import credential_store
 
 # Create blueprint
 main_bp = Blueprint('main', __name__)
@@ -40,9 +40,16 @@ def get_system_info():
         'docker_compose_version': docker_compose_version,
         'mirrors_status': mirrors_status,
         'app_version': app_version,
+        'login_throttle': login_guard.stats(),
+        'rate_limits': rate_limit_summary(),
         'current_time': datetime.utcnow().isoformat()
     })
 
+def rate_limit_summary():
+    """Remaining GitHub API budget shared by all workers"""
+    from app.services.rate_limit import rate_limit_store
+    return rate_limit_store.summary()
+
 def check_docker_compose_version():
     """Check Docker Compose version"""
     import subprocess
@@ -64,21 +71,57 @@ def check_docker_compose_version():
         return {'version': 'error', 'error': str(e)}
 
 def check_mirrors():
-    """Check mirror availability"""
-    mirrors = [
-        'https://docker.1ms.run',
-        'https://docker.1panel.live'
-    ]
-    status = {}
+    """Mirror status from the recorded speed tests, probes and pulls (no network requests)"""
+    from app.services.mirror_service import mirror_service
     
-    for mirror in mirrors:
-        try:
-            response = requests.head(mirror, timeout=3)
-            status[mirror] = {'available': response.status_code < 400, 'status_code': response.status_code}
-        except Exception as e:
-            status[mirror] = {'available': False, 'error': str(e)}
+    return {item['url']: {
+        'available': item['healthy'],
+        'throughput': item['throughput'],
+        'ttfb_ms': item['ttfb_ms'],
+        'latency_ms': item['latency_ms'],
+        'checked_at': item['checked_at'],
+        'error': item['last_error']
+    } for item in mirror_service.rank()}
+
+@main_bp.route('/api/mirrors', methods=['GET'])
+def get_mirrors():
+    """Registry mirrors ranked by health, throughput and latency"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    from app.services.mirror_service import mirror_service
     
-    return status
+    return jsonify({
+        'mirrors': mirror_service.rank(),
+        'speed_test': mirror_service.speed_test_status(),
+        'test_image': mirror_service.test_image,
+        'test_bytes': mirror_service.test_bytes
+    })
+
+@main_bp.route('/api/mirrors/speed-test', methods=['POST'])
+def speed_test_mirrors():
+    """Start measuring pull throughput of all mirrors, or of the mirror given in the body
+
+    The test downloads from each mirror for several seconds, so it runs in the background;
+    poll /api/mirrors until speed_test.running is false.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin privileges required'}), 403
+    from app.services.mirror_service import mirror_service, configured_mirrors
+    
+    mirrors = configured_mirrors()
+    name = (request.get_json(silent=True) or {}).get('mirror')
+    if name:
+        if name not in mirrors:
+            return jsonify({'error': f'Unknown mirror: {name}'}), 400
+        mirrors = {name: mirrors[name]}
+    started, status = mirror_service.start_speed_test(mirrors)
+    if not started:
+        if status.get('error'):
+            return jsonify({'error': status['error']}), 500
+        return jsonify({'error': 'A speed test is already running', 'speed_test': status}), 409
+    return jsonify({'success': True, 'speed_test': status}), 202
 
 @main_bp.route('/api/docker-stats', methods=['GET'])
 def get_docker_stats():
@@ -87,6 +130,7 @@ def get_docker_stats():
         return jsonify({'error': 'Not authenticated'}), 401
     
     try:
+        import docker
         client = docker.from_env()
         containers = client.containers.list(all=True)
         images = client.images.list()
@@ -101,51 +145,62 @@ def get_docker_stats():
 
 @main_bp.route('/api/settings/github-token', methods=['GET'])
 def get_github_token():
-    """Get Github token from session"""
+    """Describe the server-side Github token (masked, never the token itself)"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    token = session.get('github_token', '')
+    # Tokens used to live in the session cookie; drop any left over
+    session.pop('github_token', None)
+    
+    info = credential_store.describe('github')
     return jsonify({
         'success': True,
-        'token': token,
-        'has_token': bool(token)
+        'token': info['hint'],
+        'has_token': info['has_token'],
+        'source': info['source'],
+        'updated_at': info['updated_at'],
+        'can_edit': bool(session.get('is_admin'))
     })
 
 @main_bp.route('/api/settings/github-token', methods=['POST'])
 def set_github_token():
-    """Set Github token in session"""
+    """Encrypt and store the Github token shared by all users (admin only)"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin privileges required'}), 403
     
     data = request.json
-    if not data or 'token' not in data:
+    if not data or not (data.get('token') or '').strip():
         return jsonify({'error': 'Token is required'}), 400
     
-    # Validate token format (simple check - Github tokens are alphanumeric strings)
     token = data['token'].strip()
-    
-    # Store token in session
-    session['github_token'] = token
+    record = credential_store.set('github', token, session['user_id'])
+    session.pop('github_token', None)
     
     return jsonify({
         'success': True,
         'message': 'Github token saved successfully',
-        'has_token': bool(token)
+        'token': record.hint,
+        'has_token': True
     })
 
 @main_bp.route('/api/settings/github-token', methods=['DELETE'])
 def clear_github_token():
-    """Clear Github token from session"""
+    """Delete the stored Github token (admin only)"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Admin privileges required'}), 403
     
-    # Remove token from session
-    if 'github_token' in session:
-        del session['github_token']
+    credential_store.clear('github')
+    session.pop('github_token', None)
+    info = credential_store.describe('github')
     
     return jsonify({
         'success': True,
         'message': 'Github token cleared successfully',
-        'has_token': False
+        'token': info['hint'],
+        'has_token': info['has_token'],
+        'source': info['source']
     })
\ No newline at end of file
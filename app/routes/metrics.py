@@ -0,0 +1,17 @@
+from flask import Blueprint, Response, jsonify, session
+import os
+from app.services.instrumentation import registry
+
+# Create blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+# Set METRICS_PUBLIC=true to let Prometheus scrape without an API token
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', 'false').lower() == 'true'
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Export this worker's metrics in the Prometheus text format"""
+    if not METRICS_PUBLIC and 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
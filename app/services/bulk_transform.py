@@ -0,0 +1,135 @@
+import os
+import time
+import fnmatch
+import difflib
+import logging
+
+from app.services.yaml_patch import YamlPatcher, YamlPatchError, validate_operations
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATTERNS = ('*.yml', '*.yaml')
+
+
+def transform_file(file_path, operations, dry_run=False, base_path=None, max_diff_lines=200):
+    """对单个文件应用操作并返回结果；在进程池的工作进程中运行，不依赖应用上下文"""
+    from app.services.file_service import write_file_atomic
+
+    started = time.perf_counter()
+    relative_path = os.path.relpath(file_path, base_path) if base_path else file_path
+    result = {'file_path': file_path, 'relative_path': relative_path}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        patcher = YamlPatcher(content)
+        result['operations'] = patcher.apply(operations)
+        new_content = patcher.dump()
+
+        if new_content == content:
+            result['status'] = 'unchanged'
+        elif dry_run:
+            result['status'] = 'changed'
+            diff = list(difflib.unified_diff(content.splitlines(keepends=True), new_content.splitlines(keepends=True),
+                                             fromfile=f'a/{relative_path}', tofile=f'b/{relative_path}'))
+            result['diff'] = ''.join(diff[:max_diff_lines])
+            result['diff_truncated'] = len(diff) > max_diff_lines
+        else:
+            changed, content_hash = write_file_atomic(file_path, new_content)
+            result['status'] = 'changed' if changed else 'unchanged'
+            result['content_hash'] = content_hash
+    except (YamlPatchError, UnicodeDecodeError, OSError) as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def _transform_chunk(file_paths, operations, dry_run, base_path, max_diff_lines):
+    """工作进程一次处理一批文件，减少进程间通信次数"""
+    return [transform_file(path, operations, dry_run, base_path, max_diff_lines) for path in file_paths]
+
+
+class BulkTransformService:
+    """把同一组 YAML 操作批量应用到数据目录下的 compose 文件"""
+
+    def __init__(self, base_data_path=None):
+        self.base_data_path = base_data_path or os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data'))
+        # 工作进程数上限，默认等于 CPU 核数
+        self.workers = int(os.environ.get('BULK_TRANSFORM_WORKERS', 0)) or os.cpu_count() or 1
+        # 文件数少于该值时在当前进程内处理，启动进程池不划算
+        self.min_parallel_files = int(os.environ.get('BULK_TRANSFORM_MIN_PARALLEL', 16))
+        # 预览模式下每个文件返回的 diff 行数上限
+        self.max_diff_lines = int(os.environ.get('BULK_TRANSFORM_MAX_DIFF_LINES', 200))
+
+    def match_files(self, system_types=None, patterns=None):
+        """返回匹配的文件路径；system_types 为空时包含所有子目录，patterns 按文件名匹配"""
+        patterns = patterns or DEFAULT_PATTERNS
+        if system_types:
+            directories = [os.path.join(self.base_data_path, system_type) for system_type in system_types]
+        elif not os.path.isdir(self.base_data_path):
+            # 新安装时数据目录可能还不存在
+            directories = []
+        else:
+            directories = [entry.path for entry in os.scandir(self.base_data_path)
+                           if entry.is_dir() and not entry.name.startswith('.')]
+        files = []
+        for directory in sorted(directories):
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.startswith('.') and \
+                        any(fnmatch.fnmatch(entry.name, pattern) for pattern in patterns):
+                    files.append(entry.path)
+        return sorted(files)
+
+    def run(self, operations, system_types=None, patterns=None, dry_run=True, workers=None):
+        """应用操作，返回 (成功, 报告)；操作无效时第二项为错误信息"""
+        try:
+            validate_operations(operations)
+        except YamlPatchError as e:
+            return False, str(e)
+
+        started = time.perf_counter()
+        files = self.match_files(system_types, patterns)
+        # 请求的进程数不超过配置的上限（默认 CPU 核数）
+        workers = max(1, min(workers or self.workers, self.workers, len(files) or 1))
+        if workers == 1 or len(files) < self.min_parallel_files:
+            workers = 1
+            results = [transform_file(path, operations, dry_run, self.base_data_path, self.max_diff_lines)
+                       for path in files]
+        else:
+            results = self._run_parallel(files, operations, dry_run, workers)
+
+        summary = {status: sum(1 for result in results if result['status'] == status)
+                   for status in ('changed', 'unchanged', 'error')}
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"批量修改{'预览' if dry_run else ''}完成: {len(files)} 个文件，修改 {summary['changed']}，"
+                    f"失败 {summary['error']}，{workers} 个进程，耗时 {duration_ms} ms")
+        return True, {
+            'dry_run': dry_run,
+            'total_files': len(files),
+            'changed': summary['changed'],
+            'unchanged': summary['unchanged'],
+            'failed': summary['error'],
+            'workers': workers,
+            'duration_ms': duration_ms,
+            'files': results
+        }
+
+    def _run_parallel(self, files, operations, dry_run, workers):
+        """用进程池处理文件，每个进程一次处理一批"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # 工作进程由 forkserver 创建，不从持有锁和线程的 Web 工作进程直接 fork
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['app.services.bulk_transform', 'ruamel.yaml'])
+        chunk_size = max(1, min(200, len(files) // (workers * 4)))
+        chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(_transform_chunk, chunk, operations, dry_run, self.base_data_path,
+                                       self.max_diff_lines) for chunk in chunks]
+            for future in futures:
+                results.extend(future.result())
+        return results
@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import ChainMap, OrderedDict
+
+from app.services.instrumentation import count_cache
+from app.services.yaml_patch import format_path
+
+logger = logging.getLogger(__name__)
+
+# 随应用发布的 compose-spec JSON Schema（来自 github.com/compose-spec/compose-spec，Apache-2.0）
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schemas', 'compose-spec.json')
+
+_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+# ${NAME<操作符><内容>} 支持的操作符，长的写在前面
+_OPERATORS = (':-', ':?', ':+', '-', '?', '+')
+_MAX_MESSAGE_LENGTH = 300
+
+# 编译后的校验器，首次使用时创建，所有线程共用
+_validator = None
+_validator_lock = threading.Lock()
+
+
+def get_validator():
+    """返回编译好的 compose-spec 校验器（引用解析只做一次）"""
+    global _validator
+    if _validator is None:
+        with _validator_lock:
+            if _validator is None:
+                from jsonschema.validators import validator_for
+
+                started = time.perf_counter()
+                with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+                    schema = json.load(f)
+                cls = validator_for(schema)
+                cls.check_schema(schema)
+                _validator = cls(schema)
+                logger.info(f"已加载 compose-spec 校验器，耗时 {round((time.perf_counter() - started) * 1000, 2)} ms")
+    return _validator
+
+
+def load_env_file(path):
+    """读取 .env 文件，返回 {变量: 值}；写法与 docker compose 一致（export 前缀、引号、行尾注释）"""
+    variables = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return variables
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('export '):
+            line = line[len('export '):].lstrip()
+        name, separator, value = line.partition('=')
+        name = name.strip()
+        if not separator or not _NAME.fullmatch(name):
+            continue
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+            quote, value = value[0], value[1:-1]
+            if quote == '"':
+                value = value.replace('\\n', '\n').replace('\\"', '"')
+        else:
+            value = re.split(r'\s+#', value, 1)[0].rstrip()
+        variables[name] = value
+    return variables
+
+
+def project_variables(project_dir):
+    """compose 插值使用的变量：项目目录下的 .env，进程环境变量优先（不复制环境变量）"""
+    return ChainMap(os.environ, load_env_file(os.path.join(project_dir, '.env')) if project_dir else {})
+
+
+class _Interpolation:
+    """对解析后的 compose 文件做变量插值，同时收集缺失的变量和读取过的变量"""
+
+    def __init__(self, variables):
+        self.variables = variables
+        self.errors = []
+        self.warnings = []
+        self.missing = set()
+        self.referenced = set()
+
+    def walk(self, node, path):
+        if isinstance(node, dict):
+            return {key: self.walk(value, path + [key]) for key, value in node.items()}
+        if isinstance(node, list):
+            return [self.walk(value, path + [index]) for index, value in enumerate(node)]
+        if isinstance(node, str) and '$' in node:
+            return self.interpolate(node, path)
+        return node
+
+    def interpolate(self, text, path):
+        result = []
+        index = 0
+        while index < len(text):
+            char = text[index]
+            following = text[index + 1:index + 2]
+            if char != '$':
+                result.append(char)
+                index += 1
+            elif following == '$':
+                result.append('$')
+                index += 2
+            elif following == '{':
+                end = _closing_brace(text, index + 2)
+                if end < 0:
+                    self._error(path, f'插值格式无效: {text}')
+                    result.append(text[index:])
+                    break
+                result.append(self._substitute(text[index + 2:end], path))
+                index = end + 1
+            else:
+                match = _NAME.match(text, index + 1)
+                if not match:
+                    # 与 docker compose v2 一致，后面不是变量名的 $ 原样保留
+                    result.append(char)
+                    index += 1
+                    continue
+                result.append(self._lookup(match.group(), path))
+                index = match.end()
+        return ''.join(result)
+
+    def _substitute(self, expression, path):
+        match = _NAME.match(expression)
+        if not match:
+            self._error(path, f'插值格式无效: ${{{expression}}}')
+            return ''
+        name, rest = match.group(), expression[match.end():]
+        if not rest:
+            return self._lookup(name, path)
+        operator = next((op for op in _OPERATORS if rest.startswith(op)), None)
+        if operator is None:
+            self._error(path, f'插值格式无效: ${{{expression}}}')
+            return ''
+        word = rest[len(operator):]
+        self.referenced.add(name)
+        value = self.variables.get(name)
+        # 带冒号的操作符把空值当作未设置
+        unset = value is None or (operator.startswith(':') and value == '')
+        if operator.endswith('-'):
+            return self.interpolate(word, path) if unset else value
+        if operator.endswith('+'):
+            return '' if unset else self.interpolate(word, path)
+        if unset:
+            message = self.interpolate(word, path) if word else '未设置'
+            self._error(path, f'必需的变量 {name} 没有值: {message}', variable=name)
+            return ''
+        return value
+
+    def _lookup(self, name, path):
+        self.referenced.add(name)
+        value = self.variables.get(name)
+        if value is None:
+            self.missing.add(name)
+            self.warnings.append({'path': format_path(path), 'variable': name,
+                                  'message': f'变量 {name} 未设置，将使用空字符串'})
+            return ''
+        return value
+
+    def _error(self, path, message, variable=None):
+        error = {'path': format_path(path), 'message': message}
+        if variable:
+            error['variable'] = variable
+            self.missing.add(variable)
+        self.errors.append(error)
+
+
+def _closing_brace(text, start):
+    """返回与 ${ 匹配的 } 的位置（支持嵌套的 ${...}），没有时返回 -1"""
+    depth = 1
+    index = start
+    while index < len(text):
+        if text.startswith('${', index):
+            depth += 1
+            index += 2
+            continue
+        if text[index] == '}':
+            depth -= 1
+            if depth == 0:
+                return index
+        index += 1
+    return -1
+
+
+def _truncate(message):
+    return message if len(message) <= _MAX_MESSAGE_LENGTH else message[:_MAX_MESSAGE_LENGTH] + '...'
+
+
+def _schema_errors(document, limit):
+    """按 compose-spec 校验，返回 [{'path', 'message'}]；oneOf/anyOf 取最相关的子错误"""
+    from jsonschema.exceptions import best_match
+
+    errors = []
+    for error in get_validator().iter_errors(document):
+        if error.context:
+            error = best_match(error.context)
+        errors.append((error.validator, format_path(list(error.absolute_path)), _truncate(error.message)))
+        if len(errors) >= limit:
+            break
+    # 子属性校验失败时 unevaluatedProperties 也会把该属性报为多余，只保留子属性的错误
+    paths = {path for _, path, _ in errors}
+    result = []
+    for validator, path, message in sorted(errors, key=lambda item: item[1]):
+        if validator == 'unevaluatedProperties' and \
+                any(other.startswith(f'{path}.') or (not path and other) for other in paths):
+            continue
+        result.append({'path': path or '(root)', 'message': message})
+    return result
+
+
+def _service_errors(document):
+    """compose up 时才会报出、schema 无法表达的常见错误"""
+    errors = []
+    services = document.get('services')
+    if not isinstance(services, dict):
+        return errors
+    for name, service in services.items():
+        if not isinstance(service, dict):
+            continue
+        if not service.get('image') and not service.get('build') and not service.get('extends') and \
+                not service.get('provider'):
+            errors.append({'path': f'services.{name}', 'message': f'服务 {name} 没有指定 image 或 build'})
+        depends_on = service.get('depends_on') or []
+        for dependency in (depends_on if isinstance(depends_on, (list, dict)) else []):
+            if isinstance(dependency, str) and dependency not in services:
+                errors.append({'path': f'services.{name}.depends_on',
+                               'message': f'服务 {name} 依赖的服务 {dependency} 不存在'})
+    return errors
+
+
+def _cache_key(content_hash, names, variables):
+    """检查结果的缓存键：内容哈希加上内容读取过的变量的值"""
+    values = [variables.get(name) for name in names]
+    return hashlib.sha256(json.dumps([content_hash, names, values]).encode('utf-8')).hexdigest()
+
+
+class ComposeLinter:
+    """部署前检查 compose 文件：YAML 语法、变量插值、compose-spec schema 和常见配置错误
+
+    结果按内容和文件读取过的变量的值缓存，文件和这些变量未变化时重复检查不再解析和校验。
+    """
+
+    def __init__(self):
+        self.cache_size = int(os.environ.get('COMPOSE_LINT_CACHE_SIZE', 256))
+        # 每个文件最多返回的 schema 错误数
+        self.max_errors = int(os.environ.get('COMPOSE_LINT_MAX_ERRORS', 50))
+        self._cache = OrderedDict()
+        # 内容哈希 -> 检查这份内容时读取过的变量名
+        self._references = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """返回检查结果缓存的条目数和上限"""
+        with self._lock:
+            return {'entries': len(self._cache), 'limit': self.cache_size}
+
+    def lint_file(self, file_path):
+        """检查磁盘上的文件，返回 (成功, 检查结果或错误信息)"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            return False, str(e)
+        return True, self.lint(content, os.path.dirname(os.path.abspath(file_path)))
+
+    def lint(self, content, project_dir=None):
+        """检查内容，project_dir 是 compose 项目目录（用于读取 .env）
+
+        返回 {'valid', 'errors', 'warnings', 'missing_variables', 'content_hash', 'cached', 'duration_ms'}
+        """
+        started = time.perf_counter()
+        variables = project_variables(project_dir)
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+        cached = None
+        with self._lock:
+            names = self._references.get(content_hash)
+        if names is not None:
+            # 只有内容读取过的变量参与缓存键，无关的环境变量变化不会让缓存失效
+            key = _cache_key(content_hash, names, variables)
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+        count_cache('compose_lint', cached is not None)
+        if cached is None:
+            cached, referenced = self._check(content, variables)
+            cached['content_hash'] = content_hash
+            with self._lock:
+                # 变量值不同时插值可能走不同分支（如 ${A:-${B}}），所以合并每次检查读取过的变量名；
+                # 命中的结果一定是在这些变量取相同值时得到的
+                names = tuple(sorted(referenced.union(self._references.get(content_hash, ()))))
+                self._references[content_hash] = names
+                self._references.move_to_end(content_hash)
+                self._cache[_cache_key(content_hash, names, variables)] = cached
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                while len(self._references) > self.cache_size:
+                    self._references.popitem(last=False)
+            hit = False
+        else:
+            hit = True
+        return dict(cached, cached=hit, duration_ms=round((time.perf_counter() - started) * 1000, 2))
+
+    def _check(self, content, variables):
+        import yaml
+
+        result = {'valid': False, 'errors': [], 'warnings': [], 'missing_variables': []}
+        try:
+            # libyaml 解析器比纯 Python 实现快一个数量级，不可用时退回 SafeLoader
+            document = yaml.load(content, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+        except yaml.YAMLError as e:
+            result['errors'].append({'path': '(root)', 'message': f'YAML 格式错误: {_truncate(str(e))}'})
+            return result, set()
+        if not isinstance(document, dict):
+            result['errors'].append({'path': '(root)', 'message': 'compose 文件的顶层必须是映射'})
+            return result, set()
+
+        interpolation = _Interpolation(variables)
+        document = interpolation.walk(document, [])
+        result['errors'].extend(interpolation.errors)
+        result['warnings'].extend(interpolation.warnings)
+        result['missing_variables'] = sorted(interpolation.missing)
+        result['errors'].extend(_schema_errors(document, self.max_errors))
+        result['errors'].extend(_service_errors(document))
+        result['valid'] = not result['errors']
+        return result, interpolation.referenced
+
+
+# 进程内共享的检查器和结果缓存
+compose_linter = ComposeLinter()
@@ -0,0 +1,368 @@
+import os
+import json
+import hashlib
+import logging
+import subprocess
+import threading
+from collections import OrderedDict
+
+from app.services.instrumentation import count_cache
+
+logger = logging.getLogger(__name__)
+
+# 解析结果缓存: 原始内容哈希 -> (配置哈希, 解析后的配置)
+_resolved_cache = OrderedDict()
+_resolved_cache_lock = threading.Lock()
+_RESOLVED_CACHE_SIZE = 128
+
+# Docker SDK 客户端（首次使用时创建）
+_docker_client = None
+
+
+def _get_docker_client():
+    """获取共享的Docker SDK客户端"""
+    global _docker_client
+    if _docker_client is None:
+        import docker
+        _docker_client = docker.from_env()
+    return _docker_client
+
+
+def resolved_cache_stats():
+    """返回解析结果缓存的条目数和上限"""
+    with _resolved_cache_lock:
+        return {'entries': len(_resolved_cache), 'limit': _RESOLVED_CACHE_SIZE}
+
+
+# Docker Hub 的各种写法
+DOCKER_HUB = 'docker.io'
+_DOCKER_HUB_ALIASES = ('docker.io', 'index.docker.io', 'registry-1.docker.io')
+
+
+def split_image(image):
+    """拆分镜像引用，返回 (仓库地址, 镜像路径, 标签或摘要)
+
+    例如 'nginx:1.25' -> ('docker.io', 'library/nginx', ':1.25')，
+    'ghcr.io/org/app@sha256:..' -> ('ghcr.io', 'org/app', '@sha256:..')。
+    """
+    name, at, digest = image.partition('@')
+    suffix = at + digest
+    slash, colon = name.rfind('/'), name.rfind(':')
+    if colon > slash:
+        name, suffix = name[:colon], name[colon:] + suffix
+    first, _, rest = name.partition('/')
+    if rest and ('.' in first or ':' in first or first == 'localhost'):
+        registry, path = first, rest
+    else:
+        registry, path = DOCKER_HUB, name
+    if registry in _DOCKER_HUB_ALIASES:
+        registry = DOCKER_HUB
+        if '/' not in path:
+            path = f'library/{path}'
+    return registry, path, suffix
+
+
+def rewrite_image(image, mirror, registries=(DOCKER_HUB,)):
+    """把镜像引用改为从镜像站拉取，不属于 registries 或包含变量的引用原样返回"""
+    mirror = mirror.split('://', 1)[-1].strip('/')
+    if not image or '$' in image:
+        return image
+    registry, path, suffix = split_image(image.strip())
+    if registry == mirror or registry not in registries:
+        return image
+    return f'{mirror}/{path}{suffix}'
+
+
+class ComposeService:
+    def __init__(self, compose_version='v2'):
+        # 根据版本选择命令
+        if compose_version == 'v2':
+            self.compose_cmd = ['docker', 'compose']
+        else:
+            self.compose_cmd = ['docker-compose']
+
+    def build_command(self, file_path, *args):
+        """构建compose命令"""
+        return self.compose_cmd + ['-f', file_path] + list(args)
+
+    def _raw_key(self, file_path):
+        """计算compose文件及同目录.env文件的原始内容哈希"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            digest.update(f.read())
+        env_file = os.path.join(os.path.dirname(file_path), '.env')
+        if os.path.exists(env_file):
+            with open(env_file, 'rb') as f:
+                digest.update(b'\0')
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def resolve_config(self, file_path):
+        """解析compose配置，返回 (成功, {'hash', 'config'} 或错误信息)"""
+        import yaml
+        
+        try:
+            raw_key = self._raw_key(file_path)
+        except OSError as e:
+            return False, str(e)
+
+        with _resolved_cache_lock:
+            cached = _resolved_cache.get(raw_key)
+            if cached is not None:
+                _resolved_cache.move_to_end(raw_key)
+        count_cache('compose_config', cached is not None)
+        if cached is not None:
+            return True, {'hash': cached[0], 'config': cached[1]}
+
+        try:
+            result = subprocess.run(
+                self.build_command(file_path, 'config'),
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+        except Exception as e:
+            return False, str(e)
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+
+        try:
+            config = yaml.safe_load(result.stdout) or {}
+        except yaml.YAMLError as e:
+            return False, str(e)
+
+        config_hash = self.hash_config(config)
+        with _resolved_cache_lock:
+            _resolved_cache[raw_key] = (config_hash, config)
+            _resolved_cache.move_to_end(raw_key)
+            while len(_resolved_cache) > _RESOLVED_CACHE_SIZE:
+                _resolved_cache.popitem(last=False)
+
+        return True, {'hash': config_hash, 'config': config}
+
+    @staticmethod
+    def hash_config(config):
+        """计算配置的规范化哈希"""
+        canonical = json.dumps(config, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get_project_containers(self, file_path):
+        """获取由该compose文件创建的容器"""
+        client = _get_docker_client()
+        label = f'com.docker.compose.project.config_files={os.path.abspath(file_path)}'
+        return client.containers.list(all=True, filters={'label': label})
+
+    def collect_state(self, file_path, config):
+        """收集当前镜像ID和容器状态"""
+        client = _get_docker_client()
+        image_digests = {}
+        container_state = {}
+
+        for name, service in (config.get('services') or {}).items():
+            image = (service or {}).get('image')
+            if image:
+                try:
+                    image_digests[name] = client.images.get(image).id
+                except Exception:
+                    image_digests[name] = None
+
+        for container in self.get_project_containers(file_path):
+            service = container.labels.get('com.docker.compose.service')
+            if not service:
+                continue
+            health = (container.attrs.get('State') or {}).get('Health') or {}
+            container_state.setdefault(service, []).append({
+                'id': container.id,
+                'image': container.attrs.get('Image'),
+                'status': container.status,
+                'health': health.get('Status')
+            })
+
+        return image_digests, container_state
+
+    def check_unchanged(self, file_path, state):
+        """判断已部署的配置、镜像和容器是否与当前文件一致"""
+        if state is None:
+            return False, '没有成功部署记录'
+
+        success, resolved = self.resolve_config(file_path)
+        if not success:
+            return False, f'配置解析失败: {resolved}'
+        if resolved['hash'] != state.config_hash:
+            return False, '配置已变更'
+
+        try:
+            image_digests, container_state = self.collect_state(file_path, resolved['config'])
+        except Exception as e:
+            return False, f'获取容器状态失败: {str(e)}'
+
+        if image_digests != json.loads(state.image_digests or '{}'):
+            return False, '镜像已变更'
+
+        recorded = json.loads(state.container_state or '{}')
+        for service in (resolved['config'].get('services') or {}):
+            containers = container_state.get(service)
+            if not containers:
+                return False, f'服务 {service} 没有容器'
+            recorded_ids = {c['id'] for c in recorded.get(service, [])}
+            for container in containers:
+                if container['id'] not in recorded_ids:
+                    return False, f'服务 {service} 的容器已变更'
+                if container['status'] != 'running' or container['health'] in ('unhealthy', 'starting'):
+                    return False, f'服务 {service} 的容器不健康'
+                expected_image = image_digests.get(service)
+                if expected_image and container['image'] != expected_image:
+                    return False, f'服务 {service} 的容器使用旧镜像'
+
+        return True, '配置和容器状态未变更'
+
+    def changed_services(self, old_content, new_content):
+        """对比两个版本的compose文件，返回需要重新部署的服务，None表示需要完整部署"""
+        import yaml
+        
+        try:
+            old = yaml.safe_load(old_content) or {}
+            new = yaml.safe_load(new_content) or {}
+        except yaml.YAMLError:
+            return None
+        if not isinstance(old, dict) or not isinstance(new, dict):
+            return None
+
+        # 服务以外的顶级配置（网络、卷等）变更时需要完整部署
+        old_top = {k: v for k, v in old.items() if k != 'services'}
+        new_top = {k: v for k, v in new.items() if k != 'services'}
+        if old_top != new_top:
+            return None
+
+        old_services = old.get('services') or {}
+        new_services = new.get('services') or {}
+        if not isinstance(old_services, dict) or not isinstance(new_services, dict):
+            return None
+        # 删除服务需要清理孤立容器，交给完整部署处理
+        if set(old_services) - set(new_services):
+            return None
+
+        changed = {name for name, service in new_services.items() if old_services.get(name) != service}
+        if not changed:
+            return None
+
+        # 通过depends_on找出依赖于变更服务的服务
+        dependents = {}
+        for name, service in new_services.items():
+            # 服务或 depends_on 的写法无效时交给完整部署，由 compose 报告错误
+            if not isinstance(service, dict):
+                return None
+            depends_on = service.get('depends_on') or []
+            if not isinstance(depends_on, (list, dict)):
+                return None
+            for dependency in depends_on:
+                dependents.setdefault(dependency, set()).add(name)
+
+        pending = list(changed)
+        while pending:
+            for dependent in dependents.get(pending.pop(), ()):
+                if dependent not in changed:
+                    changed.add(dependent)
+                    pending.append(dependent)
+
+        return sorted(changed)
+
+    def pull_through_mirror(self, file_path, mirror, services=None, output=None):
+        """通过镜像站拉取本地缺少的 Docker Hub 镜像，拉取后标记回原来的镜像名
+
+        镜像地址在同目录的临时副本中改写（相对路径、.env 和项目名保持不变），compose up 仍使用原文件，
+        容器的配置和标签与直接部署相同。镜像站拉取失败的镜像留给 compose up 从原仓库拉取。
+        返回 (成功, {'mirror', 'pulled', 'fallback', 'bytes', 'duration'} 或错误信息)
+        """
+        import tempfile
+        import time
+        from app.services.yaml_patch import YamlPatcher, YamlPatchError
+
+        emit = output or (lambda line: None)
+        success, resolved = self.resolve_config(file_path)
+        if not success:
+            return False, f'配置解析失败: {resolved}'
+
+        # 只拉取本地缺少的镜像，与 compose up 默认的拉取策略一致；需要构建的服务由 compose up 处理
+        targets = {}
+        for name, service in (resolved['config'].get('services') or {}).items():
+            service = service or {}
+            image = service.get('image')
+            if (services and name not in services) or not isinstance(image, str) or service.get('build'):
+                continue
+            mirror_image = rewrite_image(image, mirror)
+            if mirror_image != image and _image_size(image) is None:
+                targets[name] = (image, mirror_image)
+        report = {'mirror': mirror, 'pulled': [], 'fallback': [], 'bytes': 0, 'duration': 0}
+        if not targets:
+            return True, report
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                patcher = YamlPatcher(f.read())
+            patcher.apply([{'op': 'set', 'path': ['services', name, 'image'], 'value': mirror_image}
+                           for name, (_, mirror_image) in targets.items()])
+            content = patcher.dump()
+        except (OSError, YamlPatchError) as e:
+            return False, str(e)
+
+        directory, filename = os.path.split(os.path.abspath(file_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{filename}.', suffix='.mirror.yml')
+        started = time.perf_counter()
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            process = subprocess.Popen(
+                self.build_command(temp_path, 'pull', '--ignore-pull-failures', *targets),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1
+            )
+            for line in process.stdout:
+                emit(line)
+            process.wait()
+        except Exception as e:
+            return False, str(e)
+        finally:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+        report['duration'] = round(time.perf_counter() - started, 3)
+
+        for name, (image, mirror_image) in targets.items():
+            size = _image_size(mirror_image)
+            if size is not None and _docker('tag', mirror_image, image):
+                # 只删除镜像站地址的标签，镜像本身保留在原来的名字下
+                _docker('image', 'rm', mirror_image)
+                report['pulled'].append(image)
+                report['bytes'] += size
+            else:
+                report['fallback'].append(image)
+        logger.info(f"通过 {mirror} 拉取 {len(report['pulled'])} 个镜像，"
+                    f"{len(report['fallback'])} 个回退到原仓库，耗时 {report['duration']} 秒")
+        return True, report
+
+
+def _docker(*args):
+    """执行 docker 命令，返回是否成功"""
+    try:
+        return subprocess.run(['docker', *args], capture_output=True, text=True, timeout=60).returncode == 0
+    except Exception:
+        return False
+
+
+def _image_size(image):
+    """返回本地镜像的大小（字节），镜像不存在时返回 None"""
+    try:
+        result = subprocess.run(['docker', 'image', 'inspect', '--format', '{{.Size}}', image],
+                                capture_output=True, text=True, timeout=30)
+    except Exception:
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        return int(result.stdout.strip() or 0)
+    except ValueError:
+        return 0
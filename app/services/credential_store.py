@@ -0,0 +1,145 @@
+import os
+import time
+import base64
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 没有保存令牌时使用的环境变量
+ENV_FALLBACKS = {
+    'github': 'GITHUB_TOKEN'
+}
+
+
+def mask_token(token):
+    """返回只显示首尾几位的令牌，用于设置页面展示"""
+    if not token:
+        return ''
+    if len(token) <= 12:
+        return '*' * len(token)
+    return f"{token[:4]}...{token[-4:]}"
+
+
+class CredentialStore:
+    """服务端保存的第三方访问令牌，数据库中以 Fernet 加密存储，所有用户和后台任务共用"""
+
+    def __init__(self):
+        # 解密结果缓存时间（秒）；其他进程修改令牌后最多在此时间后生效
+        self.cache_ttl = float(os.environ.get('CREDENTIAL_CACHE_TTL', 30))
+        self._lock = threading.Lock()
+        # provider -> (缓存过期时间, 令牌或None)
+        self._cache = {}
+        self._fernet = None
+        self._fernet_secret = None
+
+    def _get_fernet(self, secret_key):
+        """由 SECRET_KEY 派生加密密钥"""
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+        with self._lock:
+            if self._fernet is None or self._fernet_secret != secret_key:
+                key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                           info=b'compose-web credential store').derive(secret_key.encode('utf-8'))
+                self._fernet = Fernet(base64.urlsafe_b64encode(key))
+                self._fernet_secret = secret_key
+            return self._fernet
+
+    def get(self, provider):
+        """返回解密后的令牌；没有保存时使用环境变量，都没有时返回 None
+
+        没有应用上下文（后台线程）时返回最近一次读取的结果。
+        """
+        from flask import has_app_context
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(provider)
+        if cached is not None and (cached[0] > now or not has_app_context()):
+            return cached[1]
+        if not has_app_context():
+            return self._env_token(provider)
+
+        token = self._load(provider)
+        with self._lock:
+            self._cache[provider] = (now + self.cache_ttl, token)
+        return token
+
+    def _env_token(self, provider):
+        name = ENV_FALLBACKS.get(provider)
+        if not name:
+            return None
+        return os.environ.get(name, '').strip() or None
+
+    def _load(self, provider):
+        from flask import current_app
+        from cryptography.fernet import InvalidToken
+        from app.models.user import Credential
+
+        record = Credential.query.filter_by(provider=provider).first()
+        if record is None:
+            return self._env_token(provider)
+        try:
+            return self._get_fernet(current_app.config['SECRET_KEY']).decrypt(record.encrypted_token.encode('ascii')).decode('utf-8')
+        except InvalidToken:
+            # SECRET_KEY 更换后旧令牌无法解密，需要重新保存
+            logger.warning(f"无法解密保存的 {provider} 令牌，SECRET_KEY 可能已更换")
+            return self._env_token(provider)
+
+    def set(self, provider, token, user_id=None):
+        """加密保存令牌，返回 Credential 记录"""
+        from flask import current_app
+        from app import db
+        from app.models.user import Credential
+
+        encrypted = self._get_fernet(current_app.config['SECRET_KEY']).encrypt(token.encode('utf-8')).decode('ascii')
+        record = Credential.query.filter_by(provider=provider).first()
+        if record is None:
+            record = Credential(provider=provider)
+            db.session.add(record)
+        record.encrypted_token = encrypted
+        record.hint = mask_token(token)
+        record.updated_by = user_id
+        db.session.commit()
+
+        with self._lock:
+            self._cache[provider] = (time.monotonic() + self.cache_ttl, token)
+        logger.info(f"已保存 {provider} 令牌")
+        return record
+
+    def clear(self, provider):
+        """删除保存的令牌，返回是否存在"""
+        from app import db
+        from app.models.user import Credential
+
+        deleted = Credential.query.filter_by(provider=provider).delete()
+        db.session.commit()
+        with self._lock:
+            self._cache.pop(provider, None)
+        return bool(deleted)
+
+    def describe(self, provider):
+        """设置页面显示的令牌信息，不包含令牌本身"""
+        from app.models.user import Credential
+
+        record = Credential.query.filter_by(provider=provider).first()
+        if record is not None:
+            return {
+                'has_token': True,
+                'source': 'store',
+                'hint': record.hint,
+                'updated_at': record.updated_at.isoformat() if record.updated_at else None
+            }
+        env_token = self._env_token(provider)
+        return {
+            'has_token': bool(env_token),
+            'source': 'env' if env_token else None,
+            'hint': mask_token(env_token),
+            'updated_at': None
+        }
+
+
+# 进程内共享的令牌存储
+credential_store = CredentialStore()
@@ -11,15 +11,30 @@ from pathlib import Path
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 子进程命令的超时时间（秒）
+SUBPROCESS_TIMEOUT = 60
+
+# 单行日志的最大长度，超出部分分段输出，保证内存占用有上限
+LOG_LINE_LIMIT = 16384
+
 class DockerService:
     def __init__(self):
         # 部署状态存储
         self.deployments = {}
+        # Docker SDK 客户端（首次使用时创建）
+        self._client = None
         # 确保路径存在
         self.log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'logs')
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
     
+    def _get_client(self):
+        """获取Docker SDK客户端"""
+        if self._client is None:
+            import docker
+            self._client = docker.from_env()
+        return self._client
+    
     def check_docker_installed(self):
         """检查Docker是否已安装"""
         try:
@@ -27,10 +42,11 @@ class DockerService:
                 ['docker', '--version'],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             return True, result.stdout.strip()
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
             return False, "Docker未安装或不可用"
     
     def check_compose_version(self):
@@ -46,12 +62,13 @@ class DockerService:
                 ['docker', 'compose', 'version'],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             version_info["version"] = "v2"
             version_info["details"] = result.stdout.strip()
             return True, version_info
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
             pass
         
         # 再尝试检查 v1 版本
@@ -60,12 +77,13 @@ class DockerService:
                 ['docker-compose', '--version'],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             version_info["version"] = "v1"
             version_info["details"] = result.stdout.strip()
             return True, version_info
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
             return False, version_info
     
     def upgrade_compose(self):
@@ -83,7 +101,8 @@ class DockerService:
                 ['sh', '-c', install_script],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=300
             )
             
             # 验证安装
@@ -103,7 +122,8 @@ class DockerService:
                 ['docker', 'ps', '-a', '-q'],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             containers_count = len(containers_result.stdout.strip().split('\n')) if containers_result.stdout.strip() else 0
             
@@ -112,7 +132,8 @@ class DockerService:
                 ['docker', 'ps', '-q'],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             running_containers_count = len(running_containers_result.stdout.strip().split('\n')) if running_containers_result.stdout.strip() else 0
             
@@ -121,7 +142,8 @@ class DockerService:
                 ['docker', 'images', '-q'],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             images_count = len(images_result.stdout.strip().split('\n')) if images_result.stdout.strip() else 0
             
@@ -271,7 +293,8 @@ class DockerService:
                 cmd,
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             
             return True, "容器已成功停止"
@@ -285,43 +308,14 @@ class DockerService:
         return self.deploy_with_compose(file_path)
     
     def check_mirror_status(self):
-        """检查镜像源状态"""
-        mirrors = {
-            "docker.1ms.run": "https://docker.1ms.run",
-            "docker.1panel.live": "https://docker.1panel.live"
-        }
-        
-        status = {}
-        
-        for mirror_name, mirror_url in mirrors.items():
-            mirror_status = {
-                "available": False,
-                "response_time": None,
-                "error": None
-            }
-            
-            try:
-                # 使用curl检查URL是否可访问
-                start_time = time.time()
-                result = subprocess.run(
-                    ["curl", "-s", "-I", "--max-time", "3", mirror_url],
-                    capture_output=True,
-                    text=True
-                )
-                end_time = time.time()
-                
-                # 检查返回码
-                if result.returncode == 0:
-                    mirror_status["available"] = True
-                    mirror_status["response_time"] = round((end_time - start_time) * 1000, 2)
-                else:
-                    mirror_status["error"] = "请求失败"
-            except Exception as e:
-                mirror_status["error"] = str(e)
-            
-            status[mirror_name] = mirror_status
+        """检查镜像源状态：并发请求每个镜像站的 /v2/ 接口（不下载数据），返回 {镜像站: 状态}"""
+        from app.services.mirror_service import mirror_service
         
-        return status
+        return {item['mirror']: {
+            "available": item['healthy'],
+            "response_time": item['latency_ms'],
+            "error": item['last_error']
+        } for item in mirror_service.refresh(force=True)}
     
     def clean_old_deployments(self, max_age=86400):
         """清理旧的部署记录"""
@@ -342,10 +336,121 @@ class DockerService:
                 ["docker", "logs", container_name, "--tail", "100"],
                 capture_output=True,
                 text=True,
-                check=True
+                check=True,
+                timeout=SUBPROCESS_TIMEOUT
             )
             return True, result.stdout
         except subprocess.CalledProcessError as e:
             return False, f"获取日志失败: {e.stderr.strip()}"
         except Exception as e:
-            return False, f"操作失败: {str(e)}"
\ No newline at end of file
+            return False, f"操作失败: {str(e)}"
+    
+    def open_log_stream(self, container_id, follow=False, since=None, until=None, tail='all',
+                        stdout=True, stderr=True, timestamps=False):
+        """打开容器日志流，返回 (成功, 日志行生成器或错误信息)"""
+        import docker
+        
+        try:
+            client = self._get_client()
+            container = client.containers.get(container_id)
+        except docker.errors.NotFound:
+            return False, "容器不存在"
+        except Exception as e:
+            return False, f"连接Docker失败: {str(e)}"
+        
+        # container.logs() 把 stdout 和 stderr 合并成一个流，为了区分来源每个流单独打开一个连接；
+        # TTY 容器只有一个输出流，按 stdout 处理
+        if (container.attrs.get('Config') or {}).get('Tty', False):
+            channels = {'stdout': {'stdout': stdout, 'stderr': stderr}}
+        else:
+            channels = {name: {'stdout': name == 'stdout', 'stderr': name == 'stderr'}
+                        for name, enabled in (('stdout', stdout), ('stderr', stderr)) if enabled}
+        
+        streams = {}
+        try:
+            for stream_name, flags in channels.items():
+                streams[stream_name] = container.logs(stream=True, follow=follow, since=since, until=until,
+                                                      tail=tail, timestamps=timestamps, **flags)
+        except Exception as e:
+            for stream in streams.values():
+                stream.close()
+            return False, f"获取日志失败: {str(e)}"
+        
+        return True, self._iter_log_lines(streams)
+    
+    def _iter_log_lines(self, streams):
+        """将各个流的日志数据拆分为 (流名称, 行) ，每个流只缓存一行未完成的数据"""
+        import codecs
+        
+        pending = {name: '' for name in streams}
+        # 每个流使用一个增量解码器，跨块的多字节字符（如中文）不会被解码成替换字符
+        decoders = {name: codecs.getincrementaldecoder('utf-8')(errors='replace') for name in streams}
+        chunks = self._merge_log_streams(streams)
+        try:
+            for stream_name, data in chunks:
+                if not data:
+                    continue
+                buffer = pending[stream_name] + decoders[stream_name].decode(data)
+                lines = buffer.split('\n')
+                buffer = lines.pop()
+                for line in lines:
+                    yield stream_name, line
+                while len(buffer) > LOG_LINE_LIMIT:
+                    yield stream_name, buffer[:LOG_LINE_LIMIT]
+                    buffer = buffer[LOG_LINE_LIMIT:]
+                pending[stream_name] = buffer
+            for stream_name, buffer in pending.items():
+                buffer += decoders[stream_name].decode(b'', final=True)
+                if buffer:
+                    yield stream_name, buffer
+        finally:
+            # 先关闭连接，读取线程阻塞在 socket 上时随之结束
+            for stream in streams.values():
+                stream.close()
+            chunks.close()
+    
+    def _merge_log_streams(self, streams):
+        """按到达顺序产出 (流名称, 数据块)；多个流时每个流由一个线程读取"""
+        if len(streams) == 1:
+            (stream_name, stream), = streams.items()
+            for data in stream:
+                yield stream_name, data
+            return
+        
+        import queue
+        
+        chunks = queue.Queue(maxsize=64)
+        stopped = threading.Event()
+        
+        def put(item):
+            # 队列满时定期检查是否已停止，客户端断开后读取线程不会一直阻塞
+            while not stopped.is_set():
+                try:
+                    chunks.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def read(stream_name, stream):
+            try:
+                for data in stream:
+                    put((stream_name, data))
+                    if stopped.is_set():
+                        break
+            except Exception as e:
+                logger.debug(f"读取容器日志流 {stream_name} 结束: {str(e)}")
+            finally:
+                put((stream_name, None))
+        
+        for stream_name, stream in streams.items():
+            threading.Thread(target=read, args=(stream_name, stream), daemon=True).start()
+        try:
+            remaining = len(streams)
+            while remaining:
+                stream_name, data = chunks.get()
+                if data is None:
+                    remaining -= 1
+                    continue
+                yield stream_name, data
+        finally:
+            stopped.set()
@@ -1,13 +1,99 @@
 import os
 import json
-import yaml
+import hashlib
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+
+def content_hash(content):
+    """返回内容的 SHA-256，用作文件版本（ETag）"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_hash(file_path):
+    """返回文件内容的 SHA-256，文件不存在时返回 None"""
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(file_path):
+    """持有文件的排他锁（跨工作进程），用于“检查版本后写入”这类必须原子完成的操作
+
+    锁加在同目录的 .文件名.lock 上而不是文件本身：write_file_atomic 用新文件替换目标文件，
+    加在旧文件上的锁挡不住之后打开新文件的进程。
+    """
+    import fcntl
+
+    directory = os.path.dirname(file_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, f'.{os.path.basename(file_path)}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # 关闭文件描述符时释放锁
+        os.close(fd)
+
+
+def write_file_atomic(file_path, content):
+    """内容有变化时原子写入文件，返回 (是否写入, 新内容的哈希)
+
+    内容与现有文件相同时不写入，文件的修改时间保持不变；否则写入同目录下的临时文件，
+    fsync 后替换目标文件，读取方不会看到写了一半的文件。
+    """
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    new_hash = content_hash(data)
+
+    try:
+        current = os.stat(file_path)
+    except FileNotFoundError:
+        current = None
+    # 大小不同时内容必然不同，不必读取现有文件
+    if current is not None and current.st_size == len(data) and file_hash(file_path) == new_hash:
+        return False, new_hash
+
+    directory = os.path.dirname(file_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(file_path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, current.st_mode & 0o7777 if current is not None else 0o644)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # 确保目录项（重命名）也落盘
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    return True, new_hash
+
+
 class FileService:
     def __init__(self):
         # 基础文件存储路径
-        self.base_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+        self.base_data_path = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data'))
         self.local_files_path = os.path.join(self.base_data_path, 'local')
         
         # 确保目录存在
@@ -75,23 +161,20 @@ class FileService:
         }
     
     def save_file(self, file_path, content):
-        """保存文件内容"""
+        """保存文件内容，返回 (成功, {'content_hash', 'changed'})；失败时第二项为错误信息
+        
+        内容未变化时不写入文件。
+        """
         try:
-            # 确保目录存在
-            directory = os.path.dirname(file_path)
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            
-            # 写入文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            return True, None
+            changed, new_hash = write_file_atomic(file_path, content)
+            return True, {"content_hash": new_hash, "changed": changed}
         except Exception as e:
             return False, str(e)
     
     def read_file(self, file_path):
         """读取文件内容"""
+        import yaml
+        
         try:
             # 检查文件是否存在
             if not os.path.exists(file_path):
@@ -161,6 +244,8 @@ class FileService:
     
     def validate_yaml_content(self, content):
         """验证YAML内容格式是否正确"""
+        import yaml
+        
         try:
             parsed = yaml.safe_load(content)
             return True, parsed
@@ -169,6 +254,8 @@ class FileService:
     
     def update_yaml_field(self, content, field_path, value):
         """更新YAML中的特定字段"""
+        import yaml
+        
         try:
             # 解析YAML
             data = yaml.safe_load(content)
@@ -191,4 +278,18 @@ class FileService:
             
             return True, updated_content
         except Exception as e:
+            return False, str(e)
+    
+    def patch_yaml(self, content, operations):
+        """一次应用多个修改（set/delete/append），保留注释和格式
+        
+        返回 (成功, {'content', 'changed', 'results'})；失败时第二项为错误信息。
+        """
+        from app.services.yaml_patch import YamlPatcher, YamlPatchError
+        
+        try:
+            patcher = YamlPatcher(content)
+            results = patcher.apply(operations)
+            return True, {"content": patcher.dump(), "changed": patcher.changed, "results": results}
+        except YamlPatchError as e:
             return False, str(e)
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import time
 import requests
 import base64
 import logging
@@ -16,14 +17,29 @@ class GiteeService:
         self.owner = "DoubleStackWorkShop"
         self.repo = "Docker-Compose-File"
         # 数据目录
-        self.base_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+        self.base_data_path = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data'))
         # Gitee Token
         self.token = token
+        # 请求超时（秒），避免慢请求长时间占用工作线程
+        self.timeout = float(os.environ.get('GITEE_REQUEST_TIMEOUT', 15))
         
     def _get_headers(self):
         """构建请求头"""
         return {}
     
+    def _request(self, method, url, **kwargs):
+        """发送请求并记录调用次数、耗时和剩余限额"""
+        from app.services.instrumentation import observe_remote_request
+        
+        kwargs.setdefault('timeout', self.timeout)
+        started_at = time.perf_counter()
+        response = None
+        try:
+            response = requests.request(method, url, **kwargs)
+            return response
+        finally:
+            observe_remote_request('gitee', response, time.perf_counter() - started_at)
+    
     def _get_request_params(self):
         """构建请求参数，包含可选的token"""
         params = {}
@@ -43,7 +59,7 @@ class GiteeService:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/contents/{system_type}"
             
             # 发送请求
-            response = requests.get(url, headers=self._get_headers(), params=self._get_request_params())
+            response = self._request('GET', url, headers=self._get_headers(), params=self._get_request_params())
             
             # 检查响应状态码
             if response.status_code == 404:
@@ -137,7 +153,7 @@ class GiteeService:
             ))
             
             # 发送请求下载文件
-            response = requests.get(new_url, headers=self._get_headers())
+            response = self._request('GET', new_url, headers=self._get_headers())
             response.raise_for_status()
             
             # 确保系统类型目录存在
@@ -174,7 +190,7 @@ class GiteeService:
             
             # 获取文件内容
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/contents/{relative_path}"
-            response = requests.get(url, headers=self._get_headers(), params=self._get_request_params())
+            response = self._request('GET', url, headers=self._get_headers(), params=self._get_request_params())
             
             if response.status_code == 404:
                 return False, None, {"error": "文件不存在"}
@@ -227,7 +243,7 @@ class GiteeService:
         """检查远程文件是否存在"""
         try:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/contents/{system_type}/{filename}"
-            response = requests.get(url, params=self._get_request_params())
+            response = self._request('GET', url, params=self._get_request_params())
             
             if response.status_code == 200:
                 return True, {"exists": True, "file_info": response.json()}
@@ -243,7 +259,7 @@ class GiteeService:
         """获取仓库信息"""
         try:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}"
-            response = requests.get(url, params=self._get_request_params())
+            response = self._request('GET', url, params=self._get_request_params())
             response.raise_for_status()
             
             return True, response.json()
@@ -294,7 +310,7 @@ class GiteeService:
                 return False, "URL不是有效的Gitee链接"
             
             # 发送HEAD请求检查URL
-            response = requests.head(url, allow_redirects=True)
+            response = self._request('HEAD', url, allow_redirects=True)
             if response.status_code == 200:
                 # 检查Content-Type
                 content_type = response.headers.get('Content-Type', '')
@@ -312,7 +328,7 @@ class GiteeService:
         """获取文件的修改历史"""
         try:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/commits?path={system_type}/{filename}"
-            response = requests.get(url, params=self._get_request_params())
+            response = self._request('GET', url, params=self._get_request_params())
             response.raise_for_status()
             
             commits = response.json()
@@ -1,38 +1,170 @@
 import os
-import requests
+import json
+import time
 import base64
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 带 ETag 的 API 响应缓存: 请求键 -> _CachedResponse；条件请求返回 304 时不消耗额度
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+_RESPONSE_CACHE_SIZE = int(os.environ.get('GITHUB_CACHE_SIZE', 256))
+
+# 所有请求共用的连接池，复用 TLS 连接
+_session = None
+_session_lock = threading.Lock()
+
+# 只向这些主机发送 Authorization 头（另外还有 GITHUB_API_URL 的主机）
+_AUTH_HOSTS = {'api.github.com', 'raw.githubusercontent.com'}
+
+def _get_session():
+    """返回共享的 requests.Session，首次调用时创建"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                
+                pool_size = int(os.environ.get('GITHUB_POOL_SIZE', 10))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+class _CachedResponse:
+    """缓存的 API 响应：只保存 ETag 和响应体，不持有连接和原始响应"""
+    
+    __slots__ = ('status_code', 'headers', 'content')
+    
+    def __init__(self, etag, content):
+        self.status_code = 200
+        self.headers = {'ETag': etag}
+        self.content = content
+    
+    def json(self):
+        # 每次解析出新的对象，调用方修改结果不会影响缓存
+        return json.loads(self.content)
+    
+    def raise_for_status(self):
+        pass
+
+def _token_key(token):
+    """缓存键中使用令牌的哈希，换了令牌后不会复用旧令牌的缓存"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest() if token else None
+
 class GithubService:
-    def __init__(self, token=None):
+    def __init__(self, token=None, interactive=True):
         # Github API基础URL
-        self.api_base_url = "https://api.github.com"
-        # 仓库信息
-        self.owner = "waiyanhein96"
-        self.repo = "Docker-Compose-File"
+        self.api_base_url = os.environ.get('GITHUB_API_URL', "https://api.github.com").rstrip('/')
+        # 仓库信息（GITHUB_REPO 可以是 owner/repo，也可以只写仓库名并用 GITHUB_OWNER 指定所有者）
+        repo = os.environ.get('GITHUB_REPO', "waiyanhein96/Docker-Compose-File")
+        if '/' in repo:
+            self.owner, self.repo = repo.split('/', 1)
+        else:
+            self.owner, self.repo = os.environ.get('GITHUB_OWNER', "waiyanhein96"), repo
         # 数据目录
-        self.base_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
-        # Github Token
-        self.token = token
+        self.base_data_path = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data'))
+        # Github Token；未指定时使用服务端保存的令牌（或 GITHUB_TOKEN 环境变量）
+        if token is None:
+            from app.services.credential_store import credential_store
+            token = credential_store.get('github')
+        self.token = token or None
+        # 请求超时（秒），避免慢请求长时间占用工作线程
+        self.timeout = float(os.environ.get('GITHUB_REQUEST_TIMEOUT', 15))
+        # 非交互请求（后台刷新、批量搜索）在额度较低时推迟
+        self.interactive = interactive
+        # 下载：分块大小、单个文件大小上限、批量下载的并发数
+        self.download_chunk_size = int(os.environ.get('GITHUB_DOWNLOAD_CHUNK_SIZE', 64 * 1024))
+        self.download_max_bytes = int(os.environ.get('GITHUB_DOWNLOAD_MAX_BYTES', 10 * 1024 * 1024))
+        self.download_workers = int(os.environ.get('GITHUB_DOWNLOAD_WORKERS', 4))
         
     def _get_headers(self):
         """构建请求头"""
-        return {}
+        return {'Accept': 'application/vnd.github+json'}
     
-    def _get_request_params(self):
-        """构建请求参数，包含可选的token"""
-        params = {}
-        if self.token:
-            params['access_token'] = self.token
-        return params
+    def _auth_headers(self, url):
+        """令牌放在 Authorization 头中（Github 已不再支持 access_token 查询参数），只发送给 Github 的主机"""
+        import urllib.parse
+        
+        if not self.token:
+            return {}
+        host = urllib.parse.urlparse(url).hostname
+        if host not in _AUTH_HOSTS and host != urllib.parse.urlparse(self.api_base_url).hostname:
+            return {}
+        return {'Authorization': f'Bearer {self.token}'}
+    
+    def _request(self, method, url, **kwargs):
+        """发送请求并记录调用次数、耗时和剩余限额
+        
+        API 请求会先检查共享的剩余额度：额度用完（或非交互请求时额度较低）时优先返回缓存的响应，
+        没有缓存则抛出 RateLimitExceeded。GET 请求带上缓存的 ETag，未变化时复用缓存内容。
+        """
+        from app.services.instrumentation import observe_remote_request, count_cache
+        from app.services.rate_limit import rate_limit_store, RateLimitExceeded
+        
+        kwargs.setdefault('timeout', self.timeout)
+        is_api = url.startswith(self.api_base_url)
+        cache_key = None
+        cached = None
+        if is_api and method == 'GET' and not kwargs.get('stream'):
+            params = sorted((kwargs.get('params') or {}).items())
+            cache_key = (url, tuple(params), _token_key(self.token))
+            with _response_cache_lock:
+                cached = _response_cache.get(cache_key)
+                if cached is not None:
+                    _response_cache.move_to_end(cache_key)
+        
+        if is_api:
+            try:
+                rate_limit_store.check('github', self.interactive)
+            except RateLimitExceeded:
+                count_cache('github_response', cached is not None)
+                if cached is not None:
+                    return cached
+                raise
+        
+        headers = dict(kwargs.get('headers') or {}, **self._auth_headers(url))
+        if cached is not None:
+            headers['If-None-Match'] = cached.headers['ETag']
+        kwargs['headers'] = headers
+        
+        started_at = time.perf_counter()
+        response = None
+        try:
+            response = _get_session().request(method, url, **kwargs)
+        finally:
+            observe_remote_request('github', response, time.perf_counter() - started_at)
+        
+        if is_api:
+            rate_limit_store.update('github', response)
+        if cache_key is not None:
+            count_cache('github_response', response.status_code == 304)
+            if response.status_code == 304 and cached is not None:
+                return cached
+            if response.status_code == 200 and response.headers.get('ETag'):
+                entry = _CachedResponse(response.headers['ETag'], response.content)
+                with _response_cache_lock:
+                    _response_cache[cache_key] = entry
+                    _response_cache.move_to_end(cache_key)
+                    while len(_response_cache) > _RESPONSE_CACHE_SIZE:
+                        _response_cache.popitem(last=False)
+        return response
     
     def get_files_list(self, system_type):
         """获取Github仓库中指定系统类型的文件列表"""
+        import requests
+        from app.services.rate_limit import RateLimitExceeded
+        
         try:
             # 验证输入参数
             if not system_type or not isinstance(system_type, str):
@@ -43,7 +175,7 @@ class GithubService:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/contents/{system_type}"
             
             # 发送请求
-            response = requests.get(url, headers=self._get_headers(), params=self._get_request_params())
+            response = self._request('GET', url, headers=self._get_headers())
             
             # 检查响应状态码
             if response.status_code == 404:
@@ -97,6 +229,7 @@ class GithubService:
                             'size': file.get('size', 0),
                             'updated_at': file.get('updated_at', ''),
                             'download_url': file.get('download_url', ''),
+                            'sha': file.get('sha', ''),
                             'exists_locally': exists_locally
                         })
             except ValueError as e:
@@ -106,6 +239,9 @@ class GithubService:
                 return False, {"error": f"获取文件列表失败: {str(e)}"}
             
             return True, {"files": yaml_files}
+        except RateLimitExceeded as e:
+            logger.warning(str(e))
+            return False, {"error": str(e), "rate_limited": True, "reset_at": e.reset_at}
         except requests.exceptions.RequestException as e:
             logger.error(f"获取Github文件列表失败: {str(e)}")
             return False, {"error": f"获取文件列表失败: {str(e)}"}
@@ -113,50 +249,105 @@ class GithubService:
             logger.error(f"获取Github文件列表时发生错误: {str(e)}")
             return False, {"error": f"内部错误: {str(e)}"}
     
-    def download_file(self, download_url, system_type, filename):
-        """从Github下载文件"""
+    def download_file(self, download_url, system_type, filename, expected_size=None, expected_sha=None):
+        """从Github下载文件
+        
+        分块写入同目录下的临时文件，核对大小和 git blob SHA（列表接口返回的 size/sha）后再原子替换目标文件，
+        连接中断或内容不符时保留原文件不变。
+        """
+        import hashlib
+        import tempfile
+        import requests
+        from app.services.rate_limit import RateLimitExceeded
+        
+        if not filename or os.path.basename(filename) != filename or filename in ('.', '..'):
+            return False, {"error": "无效的文件名"}
+        
+        temp_path = None
         try:
-            # 对于下载URL，我们需要手动添加token参数
-            import urllib.parse
-            parsed_url = urllib.parse.urlparse(download_url)
-            query_params = urllib.parse.parse_qs(parsed_url.query)
-            
-            # 如果有token，添加到查询参数
-            if self.token:
-                query_params['access_token'] = [self.token]
-            
-            # 重新构建URL
-            new_query = urllib.parse.urlencode(query_params, doseq=True)
-            new_url = urllib.parse.urlunparse((
-                parsed_url.scheme,
-                parsed_url.netloc,
-                parsed_url.path,
-                parsed_url.params,
-                new_query,
-                parsed_url.fragment
-            ))
-            
-            # 发送请求下载文件
-            response = requests.get(new_url, headers=self._get_headers())
-            response.raise_for_status()
-            
-            # 确保系统类型目录存在
-            system_dir = os.path.join(self.base_data_path, system_type)
-            if not os.path.exists(system_dir):
-                os.makedirs(system_dir)
+            # 发送请求下载文件（令牌由 _request 放在请求头中）
+            response = self._request('GET', download_url, stream=True)
+            try:
+                response.raise_for_status()
+                
+                # 确保系统类型目录存在
+                system_dir = os.path.join(self.base_data_path, system_type)
+                os.makedirs(system_dir, exist_ok=True)
+                
+                # git blob SHA = sha1("blob <大小>\0" + 内容)；大小已知时边下载边计算
+                blob_hash = None
+                if expected_size is not None:
+                    blob_hash = hashlib.sha1(f"blob {int(expected_size)}\0".encode())
+                
+                size = 0
+                fd, temp_path = tempfile.mkstemp(prefix=f'.{filename}.', suffix='.part', dir=system_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                        size += len(chunk)
+                        if size > self.download_max_bytes:
+                            raise ValueError(f"文件超过 {self.download_max_bytes} 字节上限")
+                        if blob_hash is not None:
+                            blob_hash.update(chunk)
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                response.close()
+            
+            if expected_size is not None and size != int(expected_size):
+                raise ValueError(f"文件大小不符: 预期 {expected_size} 字节，实际 {size} 字节")
+            
+            if blob_hash is None:
+                blob_hash = hashlib.sha1(f"blob {size}\0".encode())
+                with open(temp_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(self.download_chunk_size), b''):
+                        blob_hash.update(chunk)
+            sha = blob_hash.hexdigest()
+            if expected_sha and sha != expected_sha:
+                raise ValueError(f"文件校验失败: 预期 SHA {expected_sha}，实际 {sha}")
+            
+            # 校验通过后替换目标文件；内容与本地文件相同时保留原文件，不改变修改时间
+            from app.services.file_service import file_hash
             
-            # 保存文件
             file_path = os.path.join(system_dir, filename)
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            
-            return True, {"file_path": file_path}
-        except requests.exceptions.RequestException as e:
+            changed = not (os.path.exists(file_path) and os.path.getsize(file_path) == size
+                           and file_hash(file_path) == file_hash(temp_path))
+            if changed:
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, file_path)
+                temp_path = None
+            
+            return True, {"file_path": file_path, "size": size, "sha": sha, "changed": changed}
+        except (requests.exceptions.RequestException, RateLimitExceeded) as e:
             logger.error(f"下载Github文件失败: {str(e)}")
             return False, {"error": f"文件下载失败: {str(e)}"}
+        except ValueError as e:
+            logger.error(f"下载Github文件 {filename} 失败: {str(e)}")
+            return False, {"error": str(e)}
         except Exception as e:
             logger.error(f"下载文件时发生错误: {str(e)}")
             return False, {"error": f"内部错误: {str(e)}"}
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def download_files(self, files):
+        """并发下载多个文件
+        
+        files 为 [{'download_url', 'system_type', 'filename', 'size', 'sha'}]，
+        按原顺序返回 [(success, data)]。
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        if not files:
+            return []
+        
+        def download(item):
+            return self.download_file(item['download_url'], item['system_type'], item['filename'],
+                                      item.get('size'), item.get('sha'))
+        
+        with ThreadPoolExecutor(max_workers=min(self.download_workers, len(files))) as executor:
+            return list(executor.map(download, files))
     
     def get_file_content(self, file_path):
         """获取文件内容（支持本地和Github文件）"""
@@ -174,7 +365,7 @@ class GithubService:
             
             # 获取文件内容
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/contents/{relative_path}"
-            response = requests.get(url, headers=self._get_headers(), params=self._get_request_params())
+            response = self._request('GET', url, headers=self._get_headers())
             
             if response.status_code == 404:
                 return False, None, {"error": "文件不存在"}
@@ -193,18 +384,14 @@ class GithubService:
             return False, None, {"error": str(e)}
     
     def update_file(self, file_path, content):
-        """更新本地文件内容"""
+        """更新本地文件内容（内容未变化时不写入）"""
+        from app.services.file_service import write_file_atomic
+        
         try:
             # 只更新本地文件
-            if not os.path.exists(file_path):
-                # 确保目录存在
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            changed, new_hash = write_file_atomic(file_path, content)
             
-            # 写入内容
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            return True, {"file_path": file_path}
+            return True, {"file_path": file_path, "content_hash": new_hash, "changed": changed}
         except Exception as e:
             logger.error(f"更新文件失败: {str(e)}")
             return False, {"error": str(e)}
@@ -223,11 +410,34 @@ class GithubService:
             {"key": "ZimaOS", "name": "Zima系统 (ZimaOS)"}
         ]
     
+    def get_root_directories(self):
+        """获取仓库根目录下的目录名称列表"""
+        from app.services.rate_limit import RateLimitExceeded
+        
+        try:
+            url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/contents/"
+            response = self._request('GET', url, headers=self._get_headers())
+            if response.status_code != 200:
+                return False, {"error": f"API请求失败，状态码: {response.status_code}"}
+            
+            contents = response.json()
+            if not isinstance(contents, list):
+                return False, {"error": "API返回数据格式错误"}
+            
+            return True, {"directories": [item['name'] for item in contents
+                                          if isinstance(item, dict) and item.get('type') == 'dir' and item.get('name')]}
+        except RateLimitExceeded as e:
+            logger.warning(str(e))
+            return False, {"error": str(e), "rate_limited": True, "reset_at": e.reset_at}
+        except Exception as e:
+            logger.error(f"获取仓库目录失败: {str(e)}")
+            return False, {"error": str(e)}
+    
     def check_file_exists_remote(self, system_type, filename):
         """检查远程文件是否存在"""
         try:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/contents/{system_type}/{filename}"
-            response = requests.get(url, params=self._get_request_params())
+            response = self._request('GET', url)
             
             if response.status_code == 200:
                 return True, {"exists": True, "file_info": response.json()}
@@ -243,7 +453,7 @@ class GithubService:
         """获取仓库信息"""
         try:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}"
-            response = requests.get(url, params=self._get_request_params())
+            response = self._request('GET', url)
             response.raise_for_status()
             
             return True, response.json()
@@ -268,10 +478,11 @@ class GithubService:
                         file['system_type'] = system_type
                         results.append(file)
             else:
-                # 否则搜索所有系统类型
+                # 否则搜索所有系统类型；批量请求按非交互请求处理，额度较低时使用缓存或跳过
+                bulk_service = GithubService(token=self.token, interactive=False)
                 system_types = self.get_system_types()
                 for system in system_types:
-                    success, data = self.get_files_list(system['key'])
+                    success, data = bulk_service.get_files_list(system['key'])
                     if not success:
                         logger.error(f"搜索系统 {system['key']} 文件失败: {data.get('error', '未知错误')}")
                         continue  # 继续搜索其他系统类型，不中断整个搜索
@@ -294,7 +505,7 @@ class GithubService:
                 return False, "URL不是有效的Github链接"
             
             # 发送HEAD请求检查URL
-            response = requests.head(url, allow_redirects=True)
+            response = self._request('HEAD', url, allow_redirects=True)
             if response.status_code == 200:
                 # 检查Content-Type
                 content_type = response.headers.get('Content-Type', '')
@@ -312,7 +523,7 @@ class GithubService:
         """获取文件的修改历史"""
         try:
             url = f"{self.api_base_url}/repos/{self.owner}/{self.repo}/commits?path={system_type}/{filename}"
-            response = requests.get(url, params=self._get_request_params())
+            response = self._request('GET', url)
             response.raise_for_status()
             
             commits = response.json()
@@ -338,10 +549,12 @@ class GithubService:
         try:
             all_files = []
             system_types = self.get_system_types()
+            # 批量请求按非交互请求处理，额度较低时使用缓存或跳过
+            bulk_service = GithubService(token=self.token, interactive=False)
             
             # 获取所有系统类型的文件
             for system in system_types:
-                success, data = self.get_files_list(system['key'])
+                success, data = bulk_service.get_files_list(system['key'])
                 if success:
                     for file in data.get('files', []):
                         file['system_type'] = system['key']
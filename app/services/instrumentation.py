@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import bisect
+import threading
+
+# 请求、子进程、部署和远程调用等耗时的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指标基类：按标签值保存样本"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        # 回调函数在导出时读取当前值，返回 {标签值元组: 数值}
+        self._callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self._callback is not None:
+            try:
+                values = self._callback()
+            except Exception:
+                values = {}
+            with self._lock:
+                self._values = dict(values)
+        return super().render()
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 每个桶的计数（最后一个为 +Inf）、总和、数量
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state):
+        with self._lock:
+            counts, total, count = list(state[0]), state[1], state[2]
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def series_count(self):
+        """返回所有指标的标签组合数量"""
+        return sum(len(metric._values) for metric in self._metrics)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by blueprint and route',
+    ('blueprint', 'endpoint', 'method', 'status')))
+subprocess_spawns = registry.register(Counter(
+    'subprocess_spawns_total', 'Subprocesses spawned by command', ('command',)))
+deployment_duration = registry.register(Histogram(
+    'compose_deployment_duration_seconds', 'Duration of compose deployments by outcome', ('outcome',)))
+deployments = registry.register(Counter(
+    'compose_deployments_total', 'Compose deployments by outcome', ('outcome',)))
+remote_requests = registry.register(Counter(
+    'remote_requests_total', 'Requests to remote providers by status code', ('provider', 'status')))
+remote_request_duration = registry.register(Histogram(
+    'remote_request_duration_seconds', 'Latency of requests to remote providers', ('provider',)))
+remote_rate_limit_remaining = registry.register(Gauge(
+    'remote_rate_limit_remaining', 'Remaining API rate limit reported by remote providers', ('provider',)))
+cache_requests = registry.register(Counter(
+    'cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ('cache', 'result')))
+db_query_duration = registry.register(Histogram(
+    'db_query_duration_seconds', 'SQLite query latency by statement type', ('operation',), buckets=DB_BUCKETS))
+
+
+def count_cache(cache, hit):
+    """记录一次缓存查询结果"""
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def observe_remote_request(provider, response, duration):
+    """记录一次远程请求的状态码、耗时和剩余限额"""
+    remote_requests.inc(provider=provider, status=response.status_code if response is not None else 'error')
+    remote_request_duration.observe(duration, provider=provider)
+    if response is not None:
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is not None and remaining.isdigit():
+            remote_rate_limit_remaining.set(int(remaining), provider=provider)
+
+
+def _command_label(args):
+    """将子进程参数转换为低基数的命令标签，如 'docker compose'"""
+    if isinstance(args, (str, bytes)):
+        args = [args]
+    args = [os.fsdecode(a) if isinstance(a, bytes) else str(a) for a in args or []]
+    if not args:
+        return 'unknown'
+    command = os.path.basename(args[0])
+    if command in ('docker', 'sh', 'bash') and len(args) > 1 and not args[1].startswith('-'):
+        command = f'{command} {args[1]}'
+    return command
+
+
+def _audit_hook(event, args):
+    # 审计钩子会收到所有审计事件，这里必须尽快返回
+    if event == 'subprocess.Popen':
+        subprocess_spawns.inc(command=_command_label(args[1]))
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def init_app(app, db):
+    """安装请求、SQL 和子进程的计时钩子"""
+    global _installed
+    from flask import g, request
+    from sqlalchemy import event
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_started_at = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started_at = g.pop('_request_started_at', None)
+        if started_at is not None:
+            http_request_duration.observe(
+                time.perf_counter() - started_at,
+                blueprint=request.blueprint or '',
+                endpoint=request.endpoint or 'unmatched',
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_started_at', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('_query_started_at')
+        if started:
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+            db_query_duration.observe(time.perf_counter() - started.pop(), operation=operation)
+
+    with _install_lock:
+        if not _installed:
+            sys.addaudithook(_audit_hook)
+            _installed = True
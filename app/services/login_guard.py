@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶：容量为 capacity，每秒补充 rate 个令牌"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated_at')
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def take(self):
+        """尝试取一个令牌，返回 (是否成功, 需要等待的秒数)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0
+        return False, (1 - self.tokens) / self.rate
+
+
+class LoginGuard:
+    """登录限流和 bcrypt 并发控制
+
+    每个 IP 一个令牌桶，每个 (IP, 用户名) 一个令牌桶：用户名的桶按来源 IP 区分，
+    其他客户端不断尝试错误密码也不会把管理员锁在外面。
+    bcrypt 在请求线程中直接执行（计算期间释放 GIL），同时执行的数量和排队等待的数量都有上限。
+    """
+
+    def __init__(self):
+        # 每个IP和每个 (IP, 用户名) 的令牌桶参数（次/分钟，突发数量）
+        self.ip_rate = float(os.environ.get('LOGIN_IP_RATE', 10)) / 60
+        self.ip_burst = int(os.environ.get('LOGIN_IP_BURST', 5))
+        self.user_rate = float(os.environ.get('LOGIN_USER_RATE', 5)) / 60
+        self.user_burst = int(os.environ.get('LOGIN_USER_BURST', 5))
+        # 令牌桶数量上限，超出后淘汰最久未使用的桶
+        self.max_buckets = int(os.environ.get('LOGIN_MAX_BUCKETS', 10000))
+
+        self._lock = threading.Lock()
+        self._ip_buckets = OrderedDict()
+        self._user_buckets = OrderedDict()
+
+        # 同时执行的 bcrypt 校验数量，以及可以等待执行的请求数量；再多的请求直接返回繁忙
+        self.bcrypt_workers = int(os.environ.get('LOGIN_BCRYPT_WORKERS', 2))
+        self.bcrypt_queue = int(os.environ.get('LOGIN_BCRYPT_QUEUE', 8))
+        self._running = threading.BoundedSemaphore(self.bcrypt_workers)
+        self._admitted = threading.BoundedSemaphore(self.bcrypt_workers + self.bcrypt_queue)
+
+        self._counters = {
+            'allowed': 0,
+            'rejected_ip': 0,
+            'rejected_username': 0,
+            'rejected_busy': 0,
+            'queued': 0,
+            'verified': 0
+        }
+
+    def _bucket(self, buckets, key, capacity, rate):
+        """获取或创建令牌桶（调用方持有锁）"""
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, rate)
+            buckets[key] = bucket
+            while len(buckets) > self.max_buckets:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        return bucket
+
+    def allow(self, ip, username):
+        """检查IP和 (IP, 用户名) 的登录频率，返回 (是否允许, 需要等待的秒数)"""
+        with self._lock:
+            allowed, retry_after = self._bucket(self._ip_buckets, ip, self.ip_burst, self.ip_rate).take()
+            if not allowed:
+                self._counters['rejected_ip'] += 1
+                return False, retry_after
+            allowed, retry_after = self._bucket(self._user_buckets, (ip, username), self.user_burst,
+                                                self.user_rate).take()
+            if not allowed:
+                self._counters['rejected_username'] += 1
+                return False, retry_after
+            self._counters['allowed'] += 1
+            return True, 0
+
+    def check_password(self, password, hashed):
+        """校验密码，返回 True/False；执行和排队的数量都已满时返回 None"""
+        if not self._admitted.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected_busy'] += 1
+            return None
+
+        try:
+            if not self._running.acquire(blocking=False):
+                with self._lock:
+                    self._counters['queued'] += 1
+                self._running.acquire()
+            try:
+                import bcrypt
+
+                result = bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+            finally:
+                self._running.release()
+        finally:
+            self._admitted.release()
+
+        with self._lock:
+            self._counters['verified'] += 1
+        return result
+
+    def stats(self):
+        """返回登录限流计数"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['tracked_ips'] = len(self._ip_buckets)
+            stats['tracked_usernames'] = len(self._user_buckets)
+        return stats
+
+
+# 进程内共享的登录保护
+login_guard = LoginGuard()
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+
+# 调用栈深度上限：每条分配记录都保存这么多帧，过深会成倍增加跟踪的内存开销
+MAX_FRAMES = 50
+
+
+class MemoryTracker:
+    def __init__(self):
+        # 保留的快照数量上限，快照本身也会占用较多内存
+        self.max_snapshots = int(os.environ.get('MEMORY_MAX_SNAPSHOTS', 5))
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()
+        self._next_id = 1
+
+    def start(self, frames=1):
+        """开始跟踪内存分配，frames 为每次分配记录的调用栈深度（1 到 MAX_FRAMES）"""
+        import tracemalloc
+
+        if tracemalloc.is_tracing():
+            return False
+        frames = min(max(1, int(frames)), MAX_FRAMES)
+        tracemalloc.start(frames)
+        logger.info(f"已开始 tracemalloc 跟踪，调用栈深度 {frames}")
+        return True
+
+    def stop(self):
+        """停止跟踪并丢弃所有快照"""
+        import tracemalloc
+
+        with self._lock:
+            self._snapshots.clear()
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        logger.info("已停止 tracemalloc 跟踪")
+        return True
+
+    def take_snapshot(self):
+        """获取快照，返回快照信息；未开始跟踪时返回 None"""
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            return None
+        # 排除 tracemalloc 自身和导入机制的分配
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>')
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            info = {
+                'id': snapshot_id,
+                'taken_at': time.time(),
+                'traced_current': current,
+                'traced_peak': peak
+            }
+            self._snapshots[snapshot_id] = (info, snapshot)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return info
+
+    def list_snapshots(self):
+        with self._lock:
+            return [info for info, _ in self._snapshots.values()]
+
+    def _get(self, snapshot_id):
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+        return entry[1] if entry else None
+
+    def top(self, snapshot_id, group_by='lineno', limit=20):
+        """返回快照中占用内存最多的分配位置"""
+        snapshot = self._get(snapshot_id)
+        if snapshot is None:
+            return None
+        stats = snapshot.statistics(group_by)
+        return {
+            'total_size': sum(stat.size for stat in stats),
+            'stats': [self._format_stat(stat) for stat in stats[:limit]]
+        }
+
+    def diff(self, old_id, new_id, group_by='lineno', limit=20):
+        """比较两个快照，按内存增长排序返回分配位置"""
+        old, new = self._get(old_id), self._get(new_id)
+        if old is None or new is None:
+            return None
+        stats = new.compare_to(old, group_by)
+        return {
+            'size_diff': sum(stat.size_diff for stat in stats),
+            'stats': [dict(self._format_stat(stat), size_diff=stat.size_diff, count_diff=stat.count_diff)
+                      for stat in stats[:limit]]
+        }
+
+    def _format_stat(self, stat):
+        frame = stat.traceback[0]
+        result = {
+            'file': frame.filename,
+            'line': frame.lineno,
+            'size': stat.size,
+            'count': stat.count
+        }
+        if len(stat.traceback) > 1:
+            result['traceback'] = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+        return result
+
+    def status(self):
+        import tracemalloc
+
+        status = {'tracing': tracemalloc.is_tracing(), 'snapshots': self.list_snapshots()}
+        if status['tracing']:
+            current, peak = tracemalloc.get_traced_memory()
+            status.update({
+                'frames': tracemalloc.get_traceback_limit(),
+                'traced_current': current,
+                'traced_peak': peak,
+                'tracemalloc_overhead': tracemalloc.get_tracemalloc_memory()
+            })
+        return status
+
+
+def process_rss():
+    """返回当前进程的常驻内存（字节），无法获取时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def structure_sizes():
+    """统计应用内存中各数据结构的条目数和大致字节数"""
+    from app.routes import docker as docker_routes
+    from app.services import compose_service, instrumentation
+    from app.services.compose_lint import compose_linter
+    from app.services.token_service import token_service
+    from app.services.login_guard import login_guard
+    from app.services.stats_sampler import stats_sampler
+    from app.services.metrics_store import metrics_store
+
+    processes = list(docker_routes.deployment_processes.values())
+    deployments = list(docker_routes.docker_service.deployments.values())
+    guard_stats = login_guard.stats()
+
+    return {
+        'deployment_processes': {
+            'entries': len(processes),
+            'output_bytes': sum(len(info.get('output') or '') for info in processes)
+        },
+        'docker_service_deployments': {
+            'entries': len(deployments),
+            'bytes': sum(sum(sys.getsizeof(v) for v in info.values()) for info in deployments)
+        },
+        'compose_config_cache': compose_service.resolved_cache_stats(),
+        'compose_lint_cache': compose_linter.stats(),
+        'api_token_cache': token_service.stats(),
+        'login_buckets': {
+            'entries': guard_stats['tracked_ips'] + guard_stats['tracked_usernames'],
+            'limit': login_guard.max_buckets * 2
+        },
+        'stats_sampler': stats_sampler.stats(),
+        'metrics_history': metrics_store.stats(),
+        'prometheus_series': {
+            'entries': instrumentation.registry.series_count()
+        }
+    }
+
+
+# 进程内共享的内存跟踪器
+memory_tracker = MemoryTracker()
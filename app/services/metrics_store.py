@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import base64
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 每个序列记录的指标
+SERIES_FIELDS = ('cpu_percent', 'mem_usage', 'net_rx_rate', 'net_tx_rate')
+
+# (桶宽秒数, 桶数量): 10秒保留1小时, 1分钟保留24小时, 10分钟保留7天
+RESOLUTIONS = ((10, 360), (60, 1440), (600, 1008))
+
+
+class RingBuffer:
+    """固定大小的环形缓冲区，每个桶保存桶内样本的累加值和数量"""
+
+    def __init__(self, step, size):
+        self.step = step
+        self.size = size
+        self.times = array('d', bytes(8 * size))
+        self.counts = array('d', bytes(8 * size))
+        self.sums = {field: array('d', bytes(8 * size)) for field in SERIES_FIELDS}
+
+    def add(self, timestamp, values):
+        """写入一个样本"""
+        bucket_start = timestamp - timestamp % self.step
+        index = int(bucket_start // self.step) % self.size
+        if self.times[index] != bucket_start:
+            # 桶已过期，覆盖旧数据
+            self.times[index] = bucket_start
+            self.counts[index] = 0.0
+            for field in SERIES_FIELDS:
+                self.sums[field][index] = 0.0
+        self.counts[index] += 1
+        for field in SERIES_FIELDS:
+            self.sums[field][index] += values.get(field, 0.0)
+
+    def query(self, start, end):
+        """返回 [start, end] 范围内各桶的平均值（按时间排序，列式）"""
+        indexes = [i for i in range(self.size)
+                   if self.counts[i] and start <= self.times[i] <= end]
+        indexes.sort(key=lambda i: self.times[i])
+        result = {'timestamps': [self.times[i] for i in indexes]}
+        for field in SERIES_FIELDS:
+            column = self.sums[field]
+            result[field] = [round(column[i] / self.counts[i], 3) for i in indexes]
+        return result
+
+    def dump(self):
+        """序列化为可写入JSON的字典"""
+        data = {
+            'times': base64.b64encode(self.times.tobytes()).decode('ascii'),
+            'counts': base64.b64encode(self.counts.tobytes()).decode('ascii')
+        }
+        for field in SERIES_FIELDS:
+            data[field] = base64.b64encode(self.sums[field].tobytes()).decode('ascii')
+        return data
+
+    def load(self, data):
+        """从 dump() 的结果恢复，大小不一致时忽略"""
+        columns = {'times': self.times, 'counts': self.counts}
+        columns.update(self.sums)
+        restored = {}
+        for name, column in columns.items():
+            values = array('d')
+            values.frombytes(base64.b64decode(data[name]))
+            if len(values) != self.size:
+                return False
+            restored[name] = values
+        self.times = restored.pop('times')
+        self.counts = restored.pop('counts')
+        self.sums = restored
+        return True
+
+
+class MetricsStore:
+    def __init__(self, data_dir=None, max_series=None, persist_interval=None):
+        base_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+        self.data_dir = data_dir or os.environ.get('METRICS_DATA_DIR', os.path.join(base_data_path, 'metrics'))
+        self.file_path = os.path.join(self.data_dir, 'history.json')
+        # 序列数量上限，超出后淘汰最久未更新的序列，保证内存有上限
+        self.max_series = int(max_series or os.environ.get('METRICS_MAX_SERIES', 50))
+        # 其他工作进程读取持久化的文件，它们看到的历史最多落后这么多秒
+        self.persist_interval = float(persist_interval or os.environ.get('METRICS_PERSIST_INTERVAL', 30))
+
+        self._lock = threading.Lock()
+        # compose项目的序列；主机指标单独保存，不与项目名称冲突，也不参与淘汰
+        self._series = OrderedDict()
+        self._host = None
+        # 计算网络速率用的上一次计数: 容器ID -> (时间, rx, tx)
+        self._last_counters = {}
+        self._host_cpu = None
+        self._last_persist = time.time()
+        self._loaded = False
+        # 已加载文件的修改时间；只有采样进程写入文件，其他工作进程发现文件更新后重新加载
+        self._loaded_mtime = None
+
+    def _new_series(self):
+        return [RingBuffer(step, size) for step, size in RESOLUTIONS]
+
+    def _ensure_loaded(self):
+        """首次使用或文件被采样进程更新后从磁盘恢复历史数据（调用方持有锁）"""
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._loaded and mtime == self._loaded_mtime:
+            return
+        self._loaded = True
+        self._loaded_mtime = mtime
+        if mtime is None:
+            return
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            loaded = OrderedDict()
+            for name, buffers in data.get('series', {}).items():
+                series = self._load_series(buffers)
+                if series:
+                    loaded[name] = series
+            while len(loaded) > self.max_series:
+                loaded.popitem(last=False)
+            self._series = loaded
+            self._host = self._load_series(data['host']) if data.get('host') else None
+        except Exception as e:
+            logger.warning(f"加载历史指标失败: {str(e)}")
+
+    def _load_series(self, buffers):
+        """从 persist() 写入的数据恢复一个序列，数据不完整时返回 None"""
+        series = self._new_series()
+        if all(str(buffer.step) in buffers and buffer.load(buffers[str(buffer.step)]) for buffer in series):
+            return series
+        return None
+
+    def record(self, name, values, timestamp=None):
+        """向compose项目的序列写入一个样本"""
+        timestamp = timestamp or time.time()
+        with self._lock:
+            self._ensure_loaded()
+            series = self._series.get(name)
+            if series is None:
+                series = self._new_series()
+                self._series[name] = series
+                while len(self._series) > self.max_series:
+                    evicted, _ = self._series.popitem(last=False)
+                    logger.info(f"指标序列数量超过上限，淘汰序列: {evicted}")
+            self._series.move_to_end(name)
+            for buffer in series:
+                buffer.add(timestamp, values)
+
+    def record_host(self, values, timestamp=None):
+        """写入一个主机指标样本"""
+        timestamp = timestamp or time.time()
+        with self._lock:
+            self._ensure_loaded()
+            if self._host is None:
+                self._host = self._new_series()
+            for buffer in self._host:
+                buffer.add(timestamp, values)
+
+    def record_snapshot(self, containers, timestamp=None):
+        """按compose项目汇总容器采样结果，并记录主机指标"""
+        timestamp = timestamp or time.time()
+        projects = {}
+        seen = set()
+
+        for container in containers:
+            seen.add(container['id'])
+            rx_rate = tx_rate = 0.0
+            last = self._last_counters.get(container['id'])
+            if last and timestamp > last[0]:
+                elapsed = timestamp - last[0]
+                rx_rate = max(0.0, (container['net_rx'] - last[1]) / elapsed)
+                tx_rate = max(0.0, (container['net_tx'] - last[2]) / elapsed)
+            self._last_counters[container['id']] = (timestamp, container['net_rx'], container['net_tx'])
+
+            project = projects.setdefault(container.get('project') or container['name'], dict.fromkeys(SERIES_FIELDS, 0.0))
+            project['cpu_percent'] += container['cpu_percent']
+            project['mem_usage'] += container['mem_usage']
+            project['net_rx_rate'] += rx_rate
+            project['net_tx_rate'] += tx_rate
+
+        # 删除已消失容器的计数，避免容器频繁创建销毁时无限增长
+        for container_id in list(self._last_counters):
+            if container_id not in seen:
+                del self._last_counters[container_id]
+
+        for name, values in projects.items():
+            self.record(name, values, timestamp)
+
+        host_values = self._read_host_metrics(timestamp)
+        if host_values:
+            self.record_host(host_values, timestamp)
+
+        if timestamp - self._last_persist >= self.persist_interval:
+            self.persist()
+
+    def _read_host_metrics(self, timestamp):
+        """读取主机CPU、内存和网络指标（仅支持Linux）"""
+        try:
+            with open('/proc/stat', 'r') as f:
+                cpu = [float(v) for v in f.readline().split()[1:]]
+            idle, total = cpu[3] + (cpu[4] if len(cpu) > 4 else 0), sum(cpu)
+
+            meminfo = {}
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    meminfo[key] = float(value.split()[0]) * 1024
+
+            rx = tx = 0.0
+            with open('/proc/net/dev', 'r') as f:
+                for line in f.readlines()[2:]:
+                    interface, _, counters = line.partition(':')
+                    if interface.strip() == 'lo':
+                        continue
+                    counters = counters.split()
+                    rx += float(counters[0])
+                    tx += float(counters[8])
+        except (OSError, ValueError, IndexError):
+            return None
+
+        values = {
+            'cpu_percent': 0.0,
+            'mem_usage': meminfo.get('MemTotal', 0) - meminfo.get('MemAvailable', 0),
+            'net_rx_rate': 0.0,
+            'net_tx_rate': 0.0
+        }
+        if self._host_cpu:
+            last_time, last_idle, last_total, last_rx, last_tx = self._host_cpu
+            if total > last_total:
+                values['cpu_percent'] = round((1 - (idle - last_idle) / (total - last_total)) * 100, 2)
+            if timestamp > last_time:
+                values['net_rx_rate'] = max(0.0, (rx - last_rx) / (timestamp - last_time))
+                values['net_tx_rate'] = max(0.0, (tx - last_tx) / (timestamp - last_time))
+        self._host_cpu = (timestamp, idle, total, rx, tx)
+        return values
+
+    def query(self, name, start=None, end=None, step=None):
+        """按时间范围查询compose项目的序列，未指定分辨率时选择能覆盖起始时间的最细分辨率"""
+        with self._lock:
+            self._ensure_loaded()
+            result = self._query(self._series.get(name), start, end, step)
+        if result is not None:
+            result['series'] = name
+        return result
+
+    def query_host(self, start=None, end=None, step=None):
+        """按时间范围查询主机指标，参数同 query()"""
+        with self._lock:
+            self._ensure_loaded()
+            result = self._query(self._host, start, end, step)
+        if result is not None:
+            result['host'] = True
+        return result
+
+    def _query(self, series, start, end, step):
+        """查询一个序列（调用方持有锁），序列或分辨率不存在时返回 None"""
+        if series is None:
+            return None
+        end = end or time.time()
+        start = start if start is not None else end - 3600
+        if step is not None:
+            buffer = next((b for b in series if b.step == step), None)
+            if buffer is None:
+                return None
+        else:
+            buffer = next((b for b in series if end - b.step * b.size <= start), series[-1])
+        result = buffer.query(start, end)
+        result.update({'step': buffer.step, 'start': start, 'end': end})
+        return result
+
+    def list_series(self):
+        """列出所有compose项目的序列名称"""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._series.keys())
+
+    def has_host(self):
+        """是否已有主机指标"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._host is not None
+
+    def stats(self):
+        """返回序列数量、上限和环形缓冲区占用的字节数"""
+        with self._lock:
+            buffers = [buffer for series in self._series.values() for buffer in series] + list(self._host or [])
+            return {
+                'series': len(self._series),
+                'limit': self.max_series,
+                'bytes': sum(b.times.itemsize * len(b.times) * (2 + len(b.sums)) for b in buffers)
+            }
+
+    def persist(self):
+        """将历史数据写入 data/ 目录（先写临时文件再重命名），只由持有采样锁的进程调用"""
+        with self._lock:
+            self._ensure_loaded()
+            data = {
+                'saved_at': time.time(),
+                'series': {name: {str(b.step): b.dump() for b in series}
+                           for name, series in self._series.items()},
+                'host': {str(b.step): b.dump() for b in self._host} if self._host else None
+            }
+            self._last_persist = time.time()
+        try:
+            os.makedirs(self.data_dir, exist_ok=True)
+            tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.file_path)
+            with self._lock:
+                # 自己写入的文件不需要重新加载
+                self._loaded_mtime = os.stat(self.file_path).st_mtime_ns
+        except Exception as e:
+            logger.warning(f"保存历史指标失败: {str(e)}")
+
+
+# 进程内共享的指标存储
+metrics_store = MetricsStore()
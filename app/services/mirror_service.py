@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import time
+import fcntl
+import logging
+import statistics
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIRRORS = ('https://docker.1ms.run', 'https://docker.1panel.live')
+
+_MANIFEST_TYPES = ', '.join((
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json'
+))
+
+
+class MirrorTestError(Exception):
+    """测速过程中镜像站返回了无法使用的结果"""
+
+
+def configured_mirrors():
+    """返回配置的镜像站 {名称: 地址}，名称是镜像引用中使用的主机名（可带端口）"""
+    value = os.environ.get('REGISTRY_MIRRORS', '')
+    entries = [entry.strip() for entry in value.split(',') if entry.strip()] or list(DEFAULT_MIRRORS)
+    mirrors = OrderedDict()
+    for entry in entries:
+        url = entry if '://' in entry else f'https://{entry}'
+        mirrors[url.split('://', 1)[1].strip('/')] = url.rstrip('/')
+    return mirrors
+
+
+class MirrorService:
+    """记录镜像站的探测和拉取结果，按健康状况、吞吐量和延迟选择部署时使用的镜像站
+
+    记录保存在 data/ 下的文件中，所有工作进程共享。
+    """
+
+    def __init__(self, file_path=None):
+        data_dir = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data'))
+        self.file_path = file_path or os.environ.get('MIRROR_STATS_FILE', os.path.join(data_dir, '.mirror_stats.json'))
+        # 每个镜像站保留的记录条数
+        self.history_size = int(os.environ.get('MIRROR_HISTORY_SIZE', 20))
+        # 最近一条记录早于该时间（秒）的镜像站在选择前重新探测
+        self.probe_ttl = float(os.environ.get('MIRROR_PROBE_TTL', 300))
+        self.probe_timeout = float(os.environ.get('MIRROR_PROBE_TIMEOUT', 3))
+        # 测速使用的镜像（取其中最大的层），每个镜像站最多读取的字节数和时间（秒）
+        self.test_image = os.environ.get('MIRROR_TEST_IMAGE', 'library/debian:stable-slim')
+        self.test_platform = os.environ.get('MIRROR_TEST_PLATFORM', 'linux/amd64')
+        self.test_bytes = int(os.environ.get('MIRROR_TEST_BYTES', 8 * 1024 * 1024))
+        self.test_seconds = float(os.environ.get('MIRROR_TEST_SECONDS', 10))
+        # 后台测速进行时持有该文件的锁，文件内容是测速状态，所有工作进程据此判断是否有测速在进行
+        self.speed_test_path = os.path.join(os.path.dirname(self.file_path), '.mirror_speed_test')
+        self._lock = threading.Lock()
+
+    def history(self):
+        """返回 {镜像站: [记录, ...]}，记录按时间从旧到新"""
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                return json.loads(f.read() or '{}')
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取镜像站记录失败: {str(e)}")
+            return {}
+
+    def record(self, mirror, sample):
+        """追加一条记录 {'kind', 'ok', 'latency_ms', 'throughput', 'error'}，throughput 单位为字节/秒"""
+        sample = dict(sample, at=time.time())
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+                fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o600)
+                with os.fdopen(fd, 'r+', encoding='utf-8') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        try:
+                            current = json.loads(f.read() or '{}')
+                        except ValueError:
+                            current = {}
+                        samples = current.get(mirror, []) + [sample]
+                        current[mirror] = samples[-self.history_size:]
+                        f.seek(0)
+                        f.truncate()
+                        f.write(json.dumps(current))
+                        f.flush()
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            except OSError as e:
+                logger.warning(f"保存镜像站记录失败: {str(e)}")
+
+    def probe(self, mirror, url):
+        """请求镜像站的 /v2/ 接口测量延迟；返回 200 或 401（需要令牌）都表示服务正常"""
+        import requests
+
+        started = time.perf_counter()
+        try:
+            response = requests.get(f'{url}/v2/', timeout=self.probe_timeout, allow_redirects=False)
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            ok = response.status_code in (200, 401)
+            sample = {'kind': 'probe', 'ok': ok, 'latency_ms': latency_ms,
+                      'error': None if ok else f'HTTP {response.status_code}'}
+        except requests.RequestException as e:
+            sample = {'kind': 'probe', 'ok': False, 'latency_ms': None, 'error': str(e)}
+        self.record(mirror, sample)
+        return sample
+
+    def speed_test(self, mirror, url, image=None, max_bytes=None, max_seconds=None):
+        """测量镜像站的实际拉取速度并记录
+
+        依次请求 /v2/（需要时按 WWW-Authenticate 获取拉取令牌）、测试镜像的清单，再下载其中最大的层，
+        最多读取 max_bytes 字节或 max_seconds 秒。记录 /v2/ 延迟、清单耗时、blob 首字节时间和吞吐量。
+        """
+        import requests
+        from app.services.compose_service import split_image
+
+        _, repository, suffix = split_image(image or self.test_image)
+        reference = suffix[1:] if suffix else 'latest'
+        max_bytes = max_bytes or self.test_bytes
+        max_seconds = max_seconds or self.test_seconds
+        timeout = (self.probe_timeout, max_seconds)
+        sample = {'kind': 'speed', 'ok': False, 'latency_ms': None, 'manifest_ms': None, 'ttfb_ms': None,
+                  'throughput': None, 'bytes': 0, 'error': None}
+        session = requests.Session()
+        try:
+            started = time.perf_counter()
+            response = session.get(f'{url}/v2/', timeout=timeout, allow_redirects=False)
+            sample['latency_ms'] = _elapsed_ms(started)
+            if response.status_code not in (200, 401):
+                raise MirrorTestError(f'/v2/ 返回 HTTP {response.status_code}')
+            headers = {}
+            if response.status_code == 401:
+                token = self._pull_token(session, response.headers.get('WWW-Authenticate', ''), repository, timeout)
+                headers['Authorization'] = f'Bearer {token}'
+
+            started = time.perf_counter()
+            digest = self._largest_layer(session, url, repository, reference, headers, timeout)
+            sample['manifest_ms'] = _elapsed_ms(started)
+
+            started = time.perf_counter()
+            with session.get(f'{url}/v2/{repository}/blobs/{digest}', headers=headers, stream=True,
+                             timeout=timeout) as response:
+                if response.status_code != 200:
+                    raise MirrorTestError(f'下载 blob 返回 HTTP {response.status_code}')
+                first_byte = None
+                for chunk in response.iter_content(chunk_size=65536):
+                    if first_byte is None:
+                        first_byte = time.perf_counter()
+                        sample['ttfb_ms'] = _elapsed_ms(started)
+                    sample['bytes'] += len(chunk)
+                    if sample['bytes'] >= max_bytes or time.perf_counter() - first_byte >= max_seconds:
+                        break
+                duration = time.perf_counter() - first_byte if first_byte else 0
+            if not sample['bytes']:
+                raise MirrorTestError('blob 没有返回数据')
+            # 吞吐量不含首字节等待时间，首字节时间单独记录
+            sample['throughput'] = round(sample['bytes'] / duration) if duration > 0 else None
+            sample['ok'] = True
+        except (requests.RequestException, MirrorTestError, ValueError, KeyError, TypeError) as e:
+            sample['error'] = str(e)
+        finally:
+            session.close()
+        self.record(mirror, sample)
+        return sample
+
+    def speed_test_all(self, mirrors=None):
+        """依次测速（并发测速会互相争抢带宽），返回 {镜像站: 记录}"""
+        mirrors = mirrors or configured_mirrors()
+        results = {}
+        for mirror, url in mirrors.items():
+            results[mirror] = self.speed_test(mirror, url)
+            logger.info(f"镜像站 {mirror} 测速: " + (
+                f"{results[mirror]['throughput'] or 0} B/s，首字节 {results[mirror]['ttfb_ms']} ms"
+                if results[mirror]['ok'] else f"失败 {results[mirror]['error']}"))
+        return results
+
+    def start_speed_test(self, mirrors=None):
+        """在后台线程中依次测速，返回 (是否已启动, 测速状态)；任一工作进程已有测速在进行时不再启动"""
+        mirrors = mirrors or configured_mirrors()
+        try:
+            os.makedirs(os.path.dirname(self.speed_test_path), exist_ok=True)
+            fd = os.open(self.speed_test_path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            logger.warning(f"创建测速状态文件失败: {str(e)}")
+            return False, {'running': False, 'error': str(e)}
+        status_file = os.fdopen(fd, 'r+', encoding='utf-8')
+        try:
+            fcntl.flock(status_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            status_file.close()
+            return False, self.speed_test_status()
+
+        status = {'running': True, 'mirrors': list(mirrors), 'started_at': time.time(), 'finished_at': None}
+        self._write_speed_test_status(status_file, status)
+        threading.Thread(target=self._run_speed_test, args=(mirrors, status_file, status),
+                         name='mirror-speed-test', daemon=True).start()
+        return True, status
+
+    def _run_speed_test(self, mirrors, status_file, status):
+        try:
+            self.speed_test_all(mirrors)
+        except Exception as e:
+            logger.error(f"镜像站测速失败: {str(e)}")
+        finally:
+            try:
+                self._write_speed_test_status(status_file, dict(status, running=False, finished_at=time.time()))
+            finally:
+                fcntl.flock(status_file, fcntl.LOCK_UN)
+                status_file.close()
+
+    def _write_speed_test_status(self, status_file, status):
+        try:
+            status_file.seek(0)
+            status_file.truncate()
+            status_file.write(json.dumps(status))
+            status_file.flush()
+        except OSError as e:
+            logger.warning(f"保存测速状态失败: {str(e)}")
+
+    def speed_test_status(self):
+        """返回最近一次后台测速的状态 {'running', 'mirrors', 'started_at', 'finished_at'}"""
+        try:
+            with open(self.speed_test_path, 'r', encoding='utf-8') as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    running = False
+                except OSError:
+                    running = True
+                content = f.read()
+        except FileNotFoundError:
+            return {'running': False, 'mirrors': [], 'started_at': None, 'finished_at': None}
+        except OSError as e:
+            logger.warning(f"读取测速状态失败: {str(e)}")
+            return {'running': False, 'mirrors': [], 'started_at': None, 'finished_at': None}
+        try:
+            status = json.loads(content or '{}')
+        except ValueError:
+            status = {}
+        return {'running': running, 'mirrors': status.get('mirrors', []),
+                'started_at': status.get('started_at'), 'finished_at': status.get('finished_at')}
+
+    def _pull_token(self, session, challenge, repository, timeout):
+        """按 Bearer 认证质询获取匿名拉取令牌"""
+        scheme, _, params = challenge.partition(' ')
+        if scheme.lower() != 'bearer':
+            raise MirrorTestError('镜像站需要认证')
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', params))
+        if 'realm' not in fields:
+            raise MirrorTestError('认证质询缺少 realm')
+        query = {'scope': f'repository:{repository}:pull'}
+        if fields.get('service'):
+            query['service'] = fields['service']
+        response = session.get(fields['realm'], params=query, timeout=timeout)
+        if response.status_code != 200:
+            raise MirrorTestError(f'获取令牌返回 HTTP {response.status_code}')
+        body = response.json()
+        token = body.get('token') or body.get('access_token')
+        if not token:
+            raise MirrorTestError('认证服务没有返回令牌')
+        return token
+
+    def _largest_layer(self, session, url, repository, reference, headers, timeout):
+        """获取清单（多平台清单时选择 test_platform），返回最大的层的摘要"""
+        headers = dict(headers, Accept=_MANIFEST_TYPES)
+        response = session.get(f'{url}/v2/{repository}/manifests/{reference}', headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            raise MirrorTestError(f'获取清单返回 HTTP {response.status_code}')
+        manifest = response.json()
+        if 'manifests' in manifest:
+            os_name, _, architecture = self.test_platform.partition('/')
+            entries = manifest['manifests']
+            entry = next((item for item in entries
+                          if (item.get('platform') or {}).get('os') == os_name and
+                          (item.get('platform') or {}).get('architecture') == architecture), entries[0] if entries else None)
+            if entry is None:
+                raise MirrorTestError('多平台清单为空')
+            response = session.get(f"{url}/v2/{repository}/manifests/{entry['digest']}", headers=headers, timeout=timeout)
+            if response.status_code != 200:
+                raise MirrorTestError(f'获取平台清单返回 HTTP {response.status_code}')
+            manifest = response.json()
+        layers = manifest.get('layers') or []
+        if not layers:
+            raise MirrorTestError('清单中没有层')
+        return max(layers, key=lambda layer: layer.get('size') or 0)['digest']
+
+    def rank(self, mirrors=None):
+        """按健康状况、吞吐量、延迟排序，返回 [{'mirror', 'healthy', 'throughput', 'latency_ms', ...}]
+
+        最近一条记录失败的镜像站视为不健康；有吞吐量记录的排在只有延迟记录的前面。
+        吞吐量优先使用测速结果（纯网络传输），没有测速记录时使用部署拉取的结果。
+        """
+        mirrors = mirrors or configured_mirrors()
+        history = self.history()
+        ranking = []
+        for mirror, url in mirrors.items():
+            samples = history.get(mirror, [])
+            succeeded = [sample for sample in samples if sample.get('ok')]
+            speed_tests = [sample for sample in succeeded if sample.get('kind') == 'speed']
+            throughputs = [sample['throughput'] for sample in speed_tests if sample.get('throughput')] or \
+                [sample['throughput'] for sample in samples if sample.get('kind') == 'pull' and sample.get('throughput')]
+            latencies = [sample['latency_ms'] for sample in succeeded if sample.get('latency_ms') is not None]
+            ttfbs = [sample['ttfb_ms'] for sample in speed_tests if sample.get('ttfb_ms') is not None]
+            last = samples[-1] if samples else None
+            ranking.append({
+                'mirror': mirror,
+                'url': url,
+                'healthy': bool(last and last.get('ok')),
+                'throughput': round(statistics.median(throughputs)) if throughputs else None,
+                'latency_ms': round(statistics.median(latencies), 2) if latencies else None,
+                'ttfb_ms': round(statistics.median(ttfbs), 2) if ttfbs else None,
+                'samples': len(samples),
+                'failures': len(samples) - len(succeeded),
+                'last_error': last.get('error') if last and not last.get('ok') else None,
+                'checked_at': last['at'] if last else None,
+                'tested_at': speed_tests[-1]['at'] if speed_tests else None
+            })
+        ranking.sort(key=lambda item: (not item['healthy'], item['throughput'] is None,
+                                       -(item['throughput'] or 0), item['latency_ms'] is None,
+                                       item['latency_ms'] or 0))
+        return ranking
+
+    def refresh(self, mirrors=None, force=False):
+        """并发探测没有近期记录的镜像站（force 时探测全部）"""
+        mirrors = mirrors or configured_mirrors()
+        history = self.history()
+        now = time.time()
+        stale = [(mirror, url) for mirror, url in mirrors.items()
+                 if force or not history.get(mirror) or now - history[mirror][-1]['at'] > self.probe_ttl]
+        if stale:
+            with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+                list(executor.map(lambda item: self.probe(*item), stale))
+        return self.rank(mirrors)
+
+    def select(self, preferred=None):
+        """返回部署时使用的镜像站名称，没有健康的镜像站时返回 None；preferred 指定镜像站时直接使用"""
+        mirrors = configured_mirrors()
+        if preferred:
+            return preferred if preferred in mirrors else None
+        for item in self.refresh(mirrors):
+            if item['healthy']:
+                return item['mirror']
+        return None
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+# 进程内共享的镜像站记录
+mirror_service = MirrorService()
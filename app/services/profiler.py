@@ -0,0 +1,125 @@
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class RequestProfiler:
+    def __init__(self):
+        # PROFILE_REQUESTS: 为空时关闭；true/all 分析所有请求；也可以是逗号分隔的路径前缀
+        setting = os.environ.get('PROFILE_REQUESTS', '').strip()
+        if setting.lower() in ('', 'false', '0', 'no'):
+            self.path_prefixes = ()
+        elif setting.lower() in ('true', 'all', '1', 'yes'):
+            self.path_prefixes = ('/',)
+        else:
+            self.path_prefixes = tuple(p.strip() for p in setting.split(',') if p.strip())
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = os.environ.get('PROFILE_DIR', os.path.join(base_dir, 'logs', 'profiles'))
+        # 只保留最新的若干个分析文件
+        self.max_files = int(os.environ.get('PROFILE_MAX_FILES', 50))
+        # 是否允许管理员通过 X-Profile 请求头分析单个请求（默认关闭，关闭时不注册请求钩子）
+        self.allow_header = os.environ.get('PROFILE_ALLOW_HEADER', 'false').lower() == 'true'
+        # cProfile 同一时间只能有一个分析器处于活动状态
+        self._lock = threading.Lock()
+
+    def wants(self, request, session):
+        """判断当前请求是否需要分析：路径匹配环境变量，或管理员带有 X-Profile 请求头"""
+        if self.path_prefixes and request.path.startswith(self.path_prefixes):
+            return True
+        return self.allow_header and bool(request.headers.get(PROFILE_HEADER)) and bool(session.get('is_admin'))
+
+    def start(self):
+        """开始分析，已有请求正在分析时返回 None"""
+        import cProfile
+
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except Exception:
+            self._lock.release()
+            raise
+        return profile
+
+    def stop(self, profile):
+        """停止分析并释放锁"""
+        try:
+            profile.disable()
+        finally:
+            self._lock.release()
+
+    def dump(self, profile, request, elapsed):
+        """保存 .prof 文件（可用 snakeviz、flameprof 等工具查看），返回文件名"""
+        os.makedirs(self.directory, exist_ok=True)
+        endpoint = re.sub(r'[^A-Za-z0-9_.-]+', '_', request.endpoint or request.path.strip('/') or 'root')
+        filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint}-{int(elapsed * 1000)}ms.prof"
+        profile.dump_stats(os.path.join(self.directory, filename))
+        self._prune()
+        return filename
+
+    def _prune(self):
+        """删除超出数量上限的旧文件"""
+        try:
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.prof')]
+            files.sort(key=os.path.getmtime, reverse=True)
+            for path in files[self.max_files:]:
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"清理分析文件失败: {str(e)}")
+
+    def list_profiles(self):
+        """列出已保存的分析文件，最新的在前"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.prof'):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            profiles.append({'name': name, 'size': stat.st_size, 'created_at': stat.st_mtime})
+        profiles.sort(key=lambda p: p['created_at'], reverse=True)
+        return profiles
+
+    def init_app(self, app):
+        """注册请求钩子；两种方式都关闭时不注册，没有任何开销"""
+        from flask import g, request, session
+
+        if not self.path_prefixes and not self.allow_header:
+            return
+
+        @app.before_request
+        def _start_profile():
+            if self.wants(request, session):
+                g._profile = self.start()
+                g._profile_started_at = time.perf_counter()
+
+        @app.after_request
+        def _dump_profile(response):
+            profile = g.pop('_profile', None)
+            if profile is not None:
+                self.stop(profile)
+                elapsed = time.perf_counter() - g.pop('_profile_started_at')
+                try:
+                    response.headers['X-Profile-File'] = self.dump(profile, request, elapsed)
+                except OSError as e:
+                    logger.error(f"保存分析文件失败: {str(e)}")
+            return response
+
+        @app.teardown_request
+        def _release_profile(exc):
+            # 视图抛出异常时 after_request 不会执行
+            profile = g.pop('_profile', None)
+            if profile is not None:
+                self.stop(profile)
+
+
+# 进程内共享的请求分析器
+request_profiler = RequestProfiler()
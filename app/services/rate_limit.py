@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(IOError):
+    """剩余请求额度不足，请求未发送
+
+    与 requests 的 RequestException 一样继承 IOError，模块本身不导入 requests。
+    """
+
+    def __init__(self, provider, reset_at, deferred=False):
+        self.provider = provider
+        self.reset_at = reset_at
+        self.deferred = deferred
+        wait = max(0, int(reset_at - time.time())) if reset_at else 0
+        reason = "剩余额度较低，已推迟后台请求" if deferred else "API 请求额度已用完"
+        super().__init__(f"{provider} {reason}，约 {wait} 秒后恢复")
+
+
+class RateLimitStore:
+    """记录各远程服务返回的限额信息，保存在 data/ 下的文件中供所有工作进程共享"""
+
+    def __init__(self, file_path=None):
+        data_dir = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data'))
+        self.file_path = file_path or os.environ.get('RATE_LIMIT_FILE', os.path.join(data_dir, '.rate_limits.json'))
+        # 剩余额度低于该值时推迟非交互请求，为用户操作保留额度
+        self.reserve = int(os.environ.get('RATE_LIMIT_RESERVE', 100))
+        self._lock = threading.Lock()
+        self._state = {}
+        self._mtime = None
+
+    def _reload(self):
+        """文件被其他进程更新后重新读取（调用方持有锁）"""
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                self._state = json.loads(f.read() or '{}')
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取限额记录失败: {str(e)}")
+
+    def get(self, provider):
+        """返回限额信息 {'limit', 'remaining', 'reset_at', 'updated_at'}，没有记录时返回 None"""
+        with self._lock:
+            self._reload()
+            state = self._state.get(provider)
+            return dict(state) if state else None
+
+    def all(self):
+        with self._lock:
+            self._reload()
+            return {provider: dict(state) for provider, state in self._state.items()}
+
+    def update(self, provider, response):
+        """根据响应头更新限额；403/429 且带 Retry-After 时视为额度用完"""
+        headers = response.headers
+        remaining = headers.get('X-RateLimit-Remaining')
+        retry_after = headers.get('Retry-After')
+        if remaining is None and not (retry_after and response.status_code in (403, 429)):
+            return
+
+        now = time.time()
+        state = {'updated_at': now}
+        if remaining is not None:
+            try:
+                state['remaining'] = int(remaining)
+                state['limit'] = int(headers.get('X-RateLimit-Limit', 0)) or None
+                state['reset_at'] = int(headers.get('X-RateLimit-Reset', 0)) or None
+            except ValueError:
+                return
+        if retry_after and response.status_code in (403, 429) and retry_after.isdigit():
+            state['remaining'] = 0
+            state['reset_at'] = max(state.get('reset_at') or 0, now + int(retry_after))
+        self._write(provider, state)
+
+    def _write(self, provider, state):
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+                fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o600)
+                with os.fdopen(fd, 'r+', encoding='utf-8') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        try:
+                            current = json.loads(f.read() or '{}')
+                        except ValueError:
+                            current = {}
+                        previous = current.get(provider, {})
+                        # 并发响应可能乱序到达，同一重置周期内只接受更小的剩余额度
+                        if previous.get('reset_at') == state.get('reset_at') and \
+                                previous.get('remaining') is not None and state.get('remaining') is not None and \
+                                previous['remaining'] < state['remaining']:
+                            return
+                        current[provider] = dict(previous, **state)
+                        f.seek(0)
+                        f.truncate()
+                        f.write(json.dumps(current))
+                        f.flush()
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+                self._state = current
+                self._mtime = os.stat(self.file_path).st_mtime_ns
+            except OSError as e:
+                logger.warning(f"保存限额记录失败: {str(e)}")
+
+    def check(self, provider, interactive=True):
+        """请求前检查额度，额度不足时抛出 RateLimitExceeded"""
+        state = self.get(provider)
+        if not state or state.get('remaining') is None:
+            return
+        reset_at = state.get('reset_at')
+        if reset_at and reset_at <= time.time():
+            return
+        if state['remaining'] <= 0:
+            raise RateLimitExceeded(provider, reset_at)
+        if not interactive and state['remaining'] <= self.reserve:
+            raise RateLimitExceeded(provider, reset_at, deferred=True)
+
+    def summary(self):
+        """系统信息中显示的剩余额度"""
+        now = time.time()
+        summary = {}
+        for provider, state in self.all().items():
+            reset_at = state.get('reset_at')
+            expired = bool(reset_at) and reset_at <= now
+            summary[provider] = {
+                'limit': state.get('limit'),
+                'remaining': state.get('limit') if expired else state.get('remaining'),
+                'reset_at': reset_at,
+                'reset_in': max(0, int(reset_at - now)) if reset_at and not expired else 0,
+                'low': not expired and state.get('remaining') is not None and state['remaining'] <= self.reserve
+            }
+        return summary
+
+
+# 进程内共享的限额记录
+rate_limit_store = RateLimitStore()
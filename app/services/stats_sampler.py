@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from array import array
+
+from app.services.metrics_store import metrics_store
+
+logger = logging.getLogger(__name__)
+
+# 每个容器记录的指标
+STAT_FIELDS = (
+    'cpu_percent',
+    'mem_usage',
+    'mem_limit',
+    'net_rx',
+    'net_tx',
+    'block_read',
+    'block_write',
+    'pids'
+)
+
+
+def parse_stats(stats):
+    """将Docker stats API的返回值转换为指标字典"""
+    cpu_stats = stats.get('cpu_stats') or {}
+    precpu_stats = stats.get('precpu_stats') or {}
+    cpu_usage = cpu_stats.get('cpu_usage') or {}
+    precpu_usage = precpu_stats.get('cpu_usage') or {}
+
+    cpu_percent = 0.0
+    cpu_delta = cpu_usage.get('total_usage', 0) - precpu_usage.get('total_usage', 0)
+    system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+    online_cpus = cpu_stats.get('online_cpus') or len(cpu_usage.get('percpu_usage') or []) or 1
+    if cpu_delta > 0 and system_delta > 0:
+        cpu_percent = cpu_delta / system_delta * online_cpus * 100.0
+
+    memory_stats = stats.get('memory_stats') or {}
+    memory_detail = memory_stats.get('stats') or {}
+    # 与 docker stats 一致：扣除页缓存
+    cache = memory_detail.get('inactive_file', memory_detail.get('cache', 0))
+    mem_usage = max(0, memory_stats.get('usage', 0) - cache)
+
+    net_rx = net_tx = 0
+    for network in (stats.get('networks') or {}).values():
+        net_rx += network.get('rx_bytes', 0)
+        net_tx += network.get('tx_bytes', 0)
+
+    block_read = block_write = 0
+    for entry in (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+        op = (entry.get('op') or '').lower()
+        if op == 'read':
+            block_read += entry.get('value', 0)
+        elif op == 'write':
+            block_write += entry.get('value', 0)
+
+    return {
+        'cpu_percent': round(cpu_percent, 2),
+        'mem_usage': mem_usage,
+        'mem_limit': memory_stats.get('limit', 0),
+        'net_rx': net_rx,
+        'net_tx': net_tx,
+        'block_read': block_read,
+        'block_write': block_write,
+        'pids': (stats.get('pids_stats') or {}).get('current', 0)
+    }
+
+
+class ContainerStatsSampler:
+    """容器资源采样器
+
+    每个 gunicorn 工作进程都会启动采样线程，但只有取得 data/metrics/sampler.lock 文件锁的进程采样、
+    记录历史并把快照写入 data/metrics/snapshot.json；其他进程读取该快照，并定期尝试取得锁，
+    采样进程退出后由其中一个接替。
+    """
+
+    def __init__(self, interval=None, max_streams=None, data_dir=None):
+        # 采样间隔（秒）和最大并发stats流数量
+        self.interval = float(interval or os.environ.get('STATS_SAMPLE_INTERVAL', 5))
+        self.max_streams = int(max_streams or os.environ.get('STATS_MAX_STREAMS', 32))
+        self.data_dir = data_dir or metrics_store.data_dir
+        self.lock_path = os.path.join(self.data_dir, 'sampler.lock')
+        self.snapshot_path = os.path.join(self.data_dir, 'snapshot.json')
+        self._lock_file = None
+        self._shared_snapshot = (None, None)
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+        # 容器ID -> 槽位；每个指标一个紧凑数组，按槽位索引
+        self._slots = {}
+        self._free_slots = []
+        self._slot_info = []
+        self._values = {field: array('d') for field in STAT_FIELDS}
+        self._updated_at = array('d')
+        self._streams = {}
+
+        # 缓存的快照（JSON字符串），每个采样周期重建一次
+        self._snapshot = json.dumps({'containers': [], 'updated_at': None, 'interval': self.interval})
+
+    def _get_client(self):
+        """获取Docker SDK客户端，连接池需要容纳所有stats流"""
+        if self._client is None:
+            import docker
+            self._client = docker.from_env(max_pool_size=self.max_streams + 4)
+        return self._client
+
+    def start(self):
+        """启动后台采样线程（只启动一次）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='stats-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止采样"""
+        self._stopped.set()
+
+    def stats(self):
+        """返回槽位、容器和stats流数量以及快照大小"""
+        with self._lock:
+            return {
+                'slots': len(self._slot_info),
+                'containers': len(self._slots),
+                'streams': len(self._streams),
+                'snapshot_bytes': len(self._snapshot),
+                'leader': self.is_leader()
+            }
+
+    def is_leader(self):
+        """当前进程是否持有采样锁"""
+        return self._lock_file is not None
+
+    def snapshot(self):
+        """返回最近一次的快照（JSON字符串），非采样进程读取采样进程写出的快照"""
+        if self.is_leader():
+            return self._snapshot
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+            if mtime != self._shared_snapshot[0]:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    self._shared_snapshot = (mtime, f.read())
+            return self._shared_snapshot[1]
+        except OSError:
+            return self._snapshot
+
+    def _acquire_leadership(self):
+        """尝试取得采样锁（不阻塞），锁随进程退出自动释放"""
+        try:
+            os.makedirs(self.data_dir, exist_ok=True)
+            lock_file = open(self.lock_path, 'a')
+        except OSError as e:
+            logger.warning(f"打开采样锁失败: {str(e)}")
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info(f"进程 {os.getpid()} 开始采样容器资源")
+        return True
+
+    def _release_leadership(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _run(self):
+        """取得采样锁后监控运行中的容器，为每个容器维持一个stats流"""
+        while not self._stopped.is_set() and not self._acquire_leadership():
+            self._stopped.wait(self.interval)
+        try:
+            self._sample()
+        finally:
+            self._release_leadership()
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            try:
+                containers = self._get_client().containers.list(filters={'status': 'running'})
+                for container in containers:
+                    with self._lock:
+                        if container.id in self._streams or len(self._streams) >= self.max_streams:
+                            continue
+                        slot = self._allocate_slot(container)
+                        thread = threading.Thread(
+                            target=self._stream,
+                            args=(container.id, slot),
+                            name=f'stats-{container.short_id}',
+                            daemon=True
+                        )
+                        self._streams[container.id] = thread
+                    thread.start()
+                self._rebuild_snapshot()
+            except Exception as e:
+                logger.warning(f"容器资源采样失败: {str(e)}")
+            self._stopped.wait(self.interval)
+
+    def _allocate_slot(self, container):
+        """为容器分配槽位，复用已释放的槽位（调用方持有锁）"""
+        info = {
+            'id': container.id,
+            'name': container.name,
+            'project': container.labels.get('com.docker.compose.project'),
+            'service': container.labels.get('com.docker.compose.service')
+        }
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_info[slot] = info
+            for field in STAT_FIELDS:
+                self._values[field][slot] = 0.0
+            self._updated_at[slot] = 0.0
+        else:
+            slot = len(self._slot_info)
+            self._slot_info.append(info)
+            for field in STAT_FIELDS:
+                self._values[field].append(0.0)
+            self._updated_at.append(0.0)
+        self._slots[container.id] = slot
+        return slot
+
+    def _release_slot(self, container_id):
+        """容器停止后释放槽位"""
+        with self._lock:
+            slot = self._slots.pop(container_id, None)
+            self._streams.pop(container_id, None)
+            if slot is not None:
+                self._slot_info[slot] = None
+                self._free_slots.append(slot)
+
+    def _stream(self, container_id, slot):
+        """读取单个容器的stats流，每个采样间隔最多记录一次"""
+        try:
+            stream = self._get_client().api.stats(container_id, stream=True, decode=True)
+            for stats in stream:
+                if self._stopped.is_set():
+                    break
+                now = time.time()
+                if now - self._updated_at[slot] < self.interval:
+                    continue
+                # 第一条数据没有上一周期的CPU计数，无法计算CPU占用
+                if not (stats.get('precpu_stats') or {}).get('system_cpu_usage'):
+                    continue
+                values = parse_stats(stats)
+                with self._lock:
+                    for field in STAT_FIELDS:
+                        self._values[field][slot] = values[field]
+                    self._updated_at[slot] = now
+        except Exception as e:
+            logger.debug(f"容器 {container_id[:12]} stats流结束: {str(e)}")
+        finally:
+            self._release_slot(container_id)
+
+    def _rebuild_snapshot(self):
+        """根据数组中的最新值生成快照"""
+        containers = []
+        with self._lock:
+            for slot, info in enumerate(self._slot_info):
+                if info is None or not self._updated_at[slot]:
+                    continue
+                entry = dict(info)
+                for field in STAT_FIELDS:
+                    entry[field] = self._values[field][slot]
+                entry['sampled_at'] = self._updated_at[slot]
+                containers.append(entry)
+            active_streams = len(self._streams)
+
+        containers.sort(key=lambda c: (c['project'] or '', c['name']))
+        metrics_store.record_snapshot(containers)
+        self._snapshot = json.dumps({
+            'containers': containers,
+            'updated_at': time.time(),
+            'interval': self.interval,
+            'active_streams': active_streams,
+            'max_streams': self.max_streams
+        })
+        # 写出快照供其他工作进程读取（先写临时文件再重命名）
+        try:
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self._snapshot)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"保存容器资源快照失败: {str(e)}")
+
+
+# 进程内共享的采样器
+stats_sampler = ContainerStatsSampler()
@@ -0,0 +1,141 @@
+import os
+import time
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface
+
+from app.services.instrumentation import count_cache
+
+logger = logging.getLogger(__name__)
+
+JWT_ALGORITHM = 'HS256'
+
+
+class TokenService:
+    def __init__(self):
+        # 校验结果缓存时间（秒）；吊销后其他进程最多在此时间后失效
+        self.cache_ttl = float(os.environ.get('API_TOKEN_CACHE_TTL', 60))
+        self.cache_size = int(os.environ.get('API_TOKEN_CACHE_SIZE', 1024))
+        self._lock = threading.Lock()
+        # token -> (缓存过期时间, 身份信息或None)
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def issue(self, secret_key, user, name, expires_in_days=None):
+        """签发API令牌，返回 (令牌字符串, ApiToken记录)"""
+        import jwt
+        from app import db
+        from app.models.user import ApiToken
+
+        now = datetime.utcnow()
+        record = ApiToken(
+            user_id=user.id,
+            name=name,
+            jti=secrets.token_hex(16),
+            expires_at=now + timedelta(days=expires_in_days) if expires_in_days else None
+        )
+        db.session.add(record)
+        db.session.commit()
+
+        payload = {'sub': str(user.id), 'jti': record.jti, 'iat': int(now.timestamp()), 'typ': 'api'}
+        if record.expires_at:
+            payload['exp'] = int(record.expires_at.timestamp())
+        token = jwt.encode(payload, secret_key, algorithm=JWT_ALGORITHM)
+        return token, record
+
+    def verify(self, secret_key, token):
+        """校验API令牌，返回身份信息字典，无效时返回None"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached is not None and cached[0] > now:
+                self._cache.move_to_end(token)
+                self.hits += 1
+                count_cache('api_token', True)
+                return cached[1]
+            self.misses += 1
+        count_cache('api_token', False)
+
+        identity = self._verify_uncached(secret_key, token)
+
+        with self._lock:
+            self._cache[token] = (now + self.cache_ttl, identity)
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return identity
+
+    def _verify_uncached(self, secret_key, token):
+        """校验签名并检查数据库中的吊销状态"""
+        import jwt
+        from app import db
+        from app.models.user import ApiToken
+
+        try:
+            payload = jwt.decode(token, secret_key, algorithms=[JWT_ALGORITHM])
+        except jwt.InvalidTokenError:
+            return None
+        if payload.get('typ') != 'api' or not payload.get('jti'):
+            return None
+
+        record = ApiToken.query.filter_by(jti=payload['jti']).first()
+        if not record or record.revoked or not record.user:
+            return None
+        if record.expires_at and record.expires_at < datetime.utcnow():
+            return None
+
+        # 只在缓存未命中时记录使用时间，避免每个请求都写数据库
+        record.last_used_at = datetime.utcnow()
+        db.session.commit()
+
+        return {
+            'user_id': record.user.id,
+            'username': record.user.username,
+            'is_admin': record.user.is_admin,
+            'api_token_id': record.id
+        }
+
+    def revoke(self, record):
+        """吊销令牌，并清除本进程中该令牌的缓存"""
+        from app import db
+
+        record.revoked = True
+        db.session.commit()
+        with self._lock:
+            for token, (_, identity) in list(self._cache.items()):
+                if identity and identity.get('api_token_id') == record.id:
+                    del self._cache[token]
+
+    def stats(self):
+        """返回验证结果缓存的条目数和上限"""
+        with self._lock:
+            return {'entries': len(self._cache), 'limit': self.cache_size}
+
+
+class ApiTokenSession(SecureCookieSession):
+    """通过API令牌认证的请求会话，不会写回Cookie"""
+
+
+class ApiTokenSessionInterface(SecureCookieSessionInterface):
+    """带有 Authorization: Bearer 令牌的请求使用令牌身份，其他请求使用Cookie会话"""
+
+    def open_session(self, app, request):
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            identity = token_service.verify(app.secret_key, authorization[7:].strip())
+            return ApiTokenSession(identity or {})
+        return super().open_session(app, request)
+
+    def save_session(self, app, session, response):
+        if isinstance(session, ApiTokenSession):
+            return
+        return super().save_session(app, session, response)
+
+
+# 进程内共享的令牌服务
+token_service = TokenService()
@@ -0,0 +1,523 @@
+import io
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ('set', 'delete', 'append', 'set_env', 'rewrite_registry')
+
+# 路径中的通配符，匹配映射的所有键或列表的所有元素
+WILDCARD = '*'
+
+# 路径片段：普通键、["带.的键"]、['带.的键'] 或 [序号]
+_SEGMENT = re.compile(r'\.?(?:\[(?:"([^"]*)"|\'([^\']*)\'|(-?\d+))\]|([^.\[\]]+))')
+
+_MISSING = object()
+
+
+class YamlPatchError(ValueError):
+    """补丁操作无效或无法应用"""
+
+
+def parse_path(path):
+    """把 'services.web.ports' 或 'services.web.labels["traefik.enable"]' 解析为键列表
+
+    也可以直接传入键列表。方括号中的数字是列表序号；普通片段遇到列表时也按序号处理。
+    """
+    if isinstance(path, (list, tuple)):
+        parts = list(path)
+    elif isinstance(path, str):
+        parts = []
+        position = 0
+        while position < len(path):
+            match = _SEGMENT.match(path, position)
+            if not match or (position == 0 and path.startswith('.')):
+                raise YamlPatchError(f"无效的路径: {path}")
+            double_quoted, single_quoted, index, plain = match.groups()
+            if index is not None:
+                parts.append(int(index))
+            else:
+                parts.append(next(p for p in (double_quoted, single_quoted, plain) if p is not None))
+            position = match.end()
+    else:
+        raise YamlPatchError(f"无效的路径: {path!r}")
+    if not parts:
+        raise YamlPatchError("路径不能为空")
+    return parts
+
+
+def format_path(parts):
+    """键列表转换回路径字符串，用于结果和错误信息"""
+    text = ''
+    for part in parts:
+        if isinstance(part, int):
+            text += f'[{part}]'
+        elif re.fullmatch(r'[^.\[\]]+', str(part)):
+            text += f'.{part}' if text else str(part)
+        else:
+            text += f'["{part}"]'
+    return text
+
+
+class YamlPatcher:
+    """一次解析、批量修改、一次输出的 YAML 补丁引擎
+
+    使用 ruamel.yaml 的往返模式，保留注释、键顺序、引号和原文件的缩进风格。
+    """
+
+    def __init__(self, content):
+        from ruamel.yaml import YAML
+        from ruamel.yaml.error import YAMLError
+
+        self.original = content
+        self.changed = False
+        self._yaml = YAML()
+        self._yaml.preserve_quotes = True
+        self._yaml.width = 4096
+        try:
+            mapping, sequence, offset = guess_indent(content)
+            self._yaml.indent(mapping=mapping, sequence=sequence, offset=offset)
+            self.data = self._yaml.load(content)
+        except YAMLError as e:
+            raise YamlPatchError(f"YAML 解析失败: {str(e)}")
+
+    def apply(self, operations):
+        """依次应用操作，返回每个操作的结果 [{'op', 'path', 'changed'}]"""
+        if not isinstance(operations, list):
+            raise YamlPatchError("operations 必须是列表")
+        results = []
+        for index, operation in enumerate(operations):
+            try:
+                results.append(self.apply_one(operation))
+            except YamlPatchError as e:
+                raise YamlPatchError(f"第 {index + 1} 个操作: {str(e)}")
+        return results
+
+    def apply_one(self, operation):
+        """应用一个操作
+
+        set/delete/append 的路径可以包含 *，作用于所有匹配的位置（* 之后缺失的映射会被创建）；
+        set_env 和 rewrite_registry 作用于 service 匹配的服务（默认 *）。
+        """
+        op = validate_operation(operation)
+        if op == 'set_env':
+            return self._set_env(operation)
+        if op == 'rewrite_registry':
+            return self._rewrite_registry(operation)
+
+        pattern = parse_path(operation.get('path'))
+        targets = self._expand(pattern) if WILDCARD in pattern else [pattern]
+        changed = False
+        # 从后往前删除，避免删除列表元素后后面的序号错位
+        for parts in (reversed(targets) if op == 'delete' else targets):
+            if op == 'set':
+                changed = self._set(parts, operation['value']) or changed
+            elif op == 'delete':
+                changed = self._delete(parts) or changed
+            else:
+                changed = self._append(parts, operation['value'], operation.get('unique', False)) or changed
+        self.changed = self.changed or changed
+        result = {'op': op, 'path': format_path(pattern), 'changed': changed}
+        if WILDCARD in pattern:
+            result['matches'] = len(targets)
+        return result
+
+    def _expand(self, pattern):
+        """把含通配符的路径展开为已存在位置的具体路径；最后一个 * 之后的部分原样保留"""
+        last = max(i for i, part in enumerate(pattern) if part == WILDCARD)
+        prefixes = [([], self._root())]
+        for part in pattern[:last + 1]:
+            expanded = []
+            for parts, node in prefixes:
+                if part == WILDCARD:
+                    if isinstance(node, dict):
+                        expanded.extend((parts + [key], node[key]) for key in node)
+                    elif isinstance(node, list):
+                        expanded.extend((parts + [index], item) for index, item in enumerate(node))
+                elif isinstance(node, (dict, list)):
+                    child = _get(node, part, parts + [part])
+                    if child is not _MISSING:
+                        expanded.append((parts + [part], child))
+            prefixes = expanded
+        suffix = pattern[last + 1:]
+        if suffix:
+            # 后面还有路径时只能继续进入映射或列表
+            return [parts + suffix for parts, node in prefixes if isinstance(node, (dict, list))]
+        return [parts for parts, _ in prefixes]
+
+    def _services(self, operation):
+        """返回 service 匹配的 [(服务名, 服务配置)]"""
+        import fnmatch
+
+        services = self._root().get('services') if isinstance(self._root(), dict) else None
+        if not isinstance(services, dict):
+            return []
+        pattern = operation.get('service', WILDCARD)
+        return [(name, config) for name, config in services.items()
+                if isinstance(config, dict) and fnmatch.fnmatchcase(str(name), pattern)]
+
+    def _set_env(self, operation):
+        """设置服务的环境变量，兼容列表（KEY=value）和映射两种写法"""
+        from ruamel.yaml.comments import CommentedMap
+
+        name, value = operation['name'], operation['value']
+        text = '' if value is None else str(value).lower() if isinstance(value, bool) else str(value)
+        changed = False
+        services = self._services(operation)
+        for _, config in services:
+            environment = config.get('environment')
+            if isinstance(environment, list):
+                entry = f'{name}={text}'
+                index = next((i for i, item in enumerate(environment)
+                              if str(item).split('=', 1)[0] == name), None)
+                if index is None:
+                    environment.append(to_yaml(entry))
+                    _follow_comments(environment, len(environment) - 1)
+                elif environment[index] != entry:
+                    environment[index] = to_yaml(entry)
+                else:
+                    continue
+            else:
+                created = None
+                if not isinstance(environment, dict):
+                    environment = CommentedMap()
+                    created = (config, 'environment')
+                    _replace(config, 'environment', environment)
+                elif name in environment and str(environment[name]) == text:
+                    continue
+                elif name not in environment:
+                    created = (environment, name)
+                environment[name] = to_yaml(text)
+                if created:
+                    _follow_comments(*created)
+            changed = True
+        self.changed = self.changed or changed
+        return {'op': 'set_env', 'path': f"services.{operation.get('service', WILDCARD)}.environment.{name}",
+                'changed': changed, 'matches': len(services)}
+
+    def _rewrite_registry(self, operation):
+        """把服务镜像改为从镜像站拉取，只改写 registries 中的仓库（默认 Docker Hub）"""
+        from app.services.compose_service import rewrite_image
+
+        registries = operation.get('registries') or ['docker.io']
+        changed = False
+        services = self._services(operation)
+        rewritten = {}
+        for name, config in services:
+            image = config.get('image')
+            if not isinstance(image, str):
+                continue
+            new_image = rewrite_image(image, operation['mirror'], registries)
+            if new_image != image:
+                config['image'] = to_yaml(new_image)
+                rewritten[str(name)] = new_image
+                changed = True
+        self.changed = self.changed or changed
+        return {'op': 'rewrite_registry', 'path': f"services.{operation.get('service', WILDCARD)}.image",
+                'changed': changed, 'matches': len(services), 'images': rewritten}
+
+    def dump(self):
+        """输出修改后的内容；没有任何修改时原样返回"""
+        if not self.changed:
+            return self.original
+        stream = io.StringIO()
+        self._yaml.dump(self.data, stream)
+        return stream.getvalue()
+
+    def _root(self):
+        from ruamel.yaml.comments import CommentedMap
+
+        if self.data is None:
+            self.data = CommentedMap()
+        return self.data
+
+    def _walk(self, parts, create):
+        """返回 (路径父节点, 新建的第一个键)
+
+        create 为 True 时创建缺失的映射，新建的第一个键以 (所在映射, 键) 返回，调用方写入值后用
+        _follow_comments 整理注释；create 为 False 时路径缺失返回 (None, None)。
+        """
+        from ruamel.yaml.comments import CommentedMap
+
+        node = self._root()
+        created = None
+        for depth, part in enumerate(parts[:-1]):
+            child = _get(node, part, parts[:depth + 1])
+            if child is _MISSING or child is None:
+                if not create:
+                    return None, None
+                if isinstance(node, list):
+                    raise YamlPatchError(f"{format_path(parts[:depth + 1])} 超出列表范围")
+                child = CommentedMap()
+                if created is None and part not in node:
+                    created = (node, part)
+                _replace(node, part, child)
+            elif not isinstance(child, (dict, list)):
+                raise YamlPatchError(f"{format_path(parts[:depth + 1])} 不是映射或列表")
+            node = child
+        return node, created
+
+    def _set(self, parts, value):
+        parent, created = self._walk(parts, create=True)
+        current = _get(parent, parts[-1], parts)
+        if current is not _MISSING and current == value:
+            return False
+        if isinstance(parent, list):
+            if current is _MISSING:
+                raise YamlPatchError(f"{format_path(parts)} 超出列表范围")
+            _replace(parent, _index(parent, parts[-1], parts), to_yaml(value))
+        elif current is _MISSING:
+            parent[parts[-1]] = to_yaml(value)
+            created = created or (parent, parts[-1])
+        else:
+            _replace(parent, parts[-1], to_yaml(value))
+        if created:
+            _follow_comments(*created)
+        return True
+
+    def _delete(self, parts):
+        parent, _ = self._walk(parts, create=False)
+        if parent is None or _get(parent, parts[-1], parts) is _MISSING:
+            return False
+        if isinstance(parent, list):
+            del parent[_index(parent, parts[-1], parts)]
+        else:
+            _delete_key(parent, parts[-1])
+        return True
+
+    def _append(self, parts, value, unique=False):
+        from ruamel.yaml.comments import CommentedSeq
+
+        parent, created = self._walk(parts, create=True)
+        target = _get(parent, parts[-1], parts)
+        if target is _MISSING or target is None:
+            if isinstance(parent, list):
+                raise YamlPatchError(f"{format_path(parts)} 超出列表范围")
+            if target is _MISSING:
+                created = created or (parent, parts[-1])
+            target = CommentedSeq()
+            _replace(parent, parts[-1], target)
+        elif not isinstance(target, list):
+            raise YamlPatchError(f"{format_path(parts)} 不是列表")
+        if unique and value in target:
+            return False
+        target.append(to_yaml(value))
+        _follow_comments(*(created or (target, len(target) - 1)))
+        return True
+
+
+def validate_operation(operation):
+    """检查操作格式，返回操作类型；无效时抛出 YamlPatchError"""
+    if not isinstance(operation, dict):
+        raise YamlPatchError("操作必须是对象")
+    op = operation.get('op')
+    if op not in OPERATIONS:
+        raise YamlPatchError(f"op 必须是 {', '.join(OPERATIONS)} 之一")
+    if op in ('set', 'delete', 'append'):
+        parse_path(operation.get('path'))
+        if op != 'delete' and 'value' not in operation:
+            raise YamlPatchError(f"{op} 操作需要 value")
+    elif op == 'set_env':
+        if not isinstance(operation.get('name'), str) or not operation['name'] or '=' in operation['name']:
+            raise YamlPatchError("set_env 操作需要有效的 name")
+        if 'value' not in operation or isinstance(operation['value'], (dict, list)):
+            raise YamlPatchError("set_env 操作需要标量 value")
+    if op in ('set_env', 'rewrite_registry') and not isinstance(operation.get('service', WILDCARD), str):
+        raise YamlPatchError("service 必须是字符串")
+    if op == 'rewrite_registry':
+        if not isinstance(operation.get('mirror'), str) or not operation['mirror'].strip('/'):
+            raise YamlPatchError("rewrite_registry 操作需要 mirror")
+        if not isinstance(operation.get('registries', []), list):
+            raise YamlPatchError("registries 必须是列表")
+    return op
+
+
+def validate_operations(operations):
+    """检查一组操作，无效时抛出 YamlPatchError"""
+    if not isinstance(operations, list) or not operations:
+        raise YamlPatchError("operations 必须是非空列表")
+    for index, operation in enumerate(operations):
+        try:
+            validate_operation(operation)
+        except YamlPatchError as e:
+            raise YamlPatchError(f"第 {index + 1} 个操作: {str(e)}")
+
+
+def _delete_key(mapping, key):
+    """删除映射中的键，保留其后面的整行注释
+
+    ruamel 把键后面的注释挂在该键（或其值中最后一个元素）上，直接删除会连同下一个键前的注释一起丢失，
+    这里把这些注释移到下一个键之前（没有下一个键时接在上一个键后面）。
+    """
+    from ruamel.yaml.error import CommentMark
+    from ruamel.yaml.tokens import CommentToken
+
+    keys = list(mapping.keys())
+    position = keys.index(key)
+    node, leaf = _last_leaf(mapping, key)
+    token = _comment_token(node, leaf)
+    del mapping[key]
+    if token is None or not hasattr(mapping, 'ca'):
+        return
+    # 第一行是被删除那一行的行尾注释，只保留后面的整行注释
+    lines = token.value.split('\n', 1)[1] if '\n' in token.value else ''
+    if not lines.strip():
+        return
+    if position + 1 < len(keys):
+        entry = mapping.ca.items.setdefault(keys[position + 1], [None, None, None, None])
+        entry[1] = [CommentToken(lines, CommentMark(0), None)] + (entry[1] or [])
+    elif position > 0:
+        _attach_trailing_comment(mapping, keys[position - 1], lines)
+
+
+def _replace(node, key, value):
+    """替换映射的值或列表元素，旧值后面的整行注释移到新值后面（旧值是映射或列表时这些注释挂在它的内部）"""
+    lines = _take_trailing_comment(node, key) if _get(node, key, [key]) is not _MISSING else ''
+    node[key] = value
+    if lines:
+        _attach_trailing_comment(node, key, lines)
+
+
+def _follow_comments(node, key):
+    """key 刚加在映射或列表的末尾：把前一个元素后面的整行注释移到 key 后面
+
+    ruamel 把一个块之后、下一个兄弟键之前的整行注释挂在块中最后一个叶子上，末尾新加的元素会被输出在
+    这些注释之后，注释看起来就属于下一个兄弟键的块。
+    """
+    keys = list(node.keys()) if isinstance(node, dict) else list(range(len(node)))
+    position = keys.index(key)
+    if position == 0:
+        return
+    lines = _take_trailing_comment(node, keys[position - 1])
+    if lines:
+        _attach_trailing_comment(node, key, lines)
+
+
+def _take_trailing_comment(node, key):
+    """取出 node[key]（值为映射或列表时是其中最后一个叶子）后面的整行注释，行尾注释保留在原处"""
+    leaf_node, leaf = _last_leaf(node, key)
+    token = _comment_token(leaf_node, leaf)
+    if token is None or '\n' not in token.value:
+        return ''
+    eol, lines = token.value.split('\n', 1)
+    if not lines.strip():
+        return ''
+    if eol.strip():
+        token.value = eol + '\n'
+    else:
+        leaf_node.ca.items[leaf][0 if isinstance(leaf_node, list) else 2] = None
+    return lines
+
+
+def _attach_trailing_comment(node, key, lines):
+    """把整行注释接在 node[key]（值为映射或列表时是其中最后一个叶子）后面"""
+    from ruamel.yaml.error import CommentMark
+    from ruamel.yaml.tokens import CommentToken
+
+    leaf_node, leaf = _last_leaf(node, key)
+    if not hasattr(leaf_node, 'ca'):
+        return
+    token = _comment_token(leaf_node, leaf)
+    if token is not None:
+        token.value = token.value + lines if token.value.endswith('\n') else token.value + '\n' + lines
+    else:
+        entry = leaf_node.ca.items.setdefault(leaf, [None, None, None, None])
+        entry[0 if isinstance(leaf_node, list) else 2] = CommentToken('\n' + lines, CommentMark(0), None)
+
+
+def _last_leaf(node, key):
+    """返回 (所在节点, 键或序号)：键的值是非空映射或列表时取其中最后一个元素，递归到标量"""
+    value = node[key]
+    if isinstance(value, dict) and value:
+        return _last_leaf(value, list(value.keys())[-1])
+    if isinstance(value, list) and value:
+        return _last_leaf(value, len(value) - 1)
+    return node, key
+
+
+def _comment_token(node, key):
+    """键（或列表项）后面的注释 token"""
+    if not hasattr(node, 'ca'):
+        return None
+    entry = node.ca.items.get(key)
+    if not entry:
+        return None
+    return entry[0] if isinstance(node, list) else entry[2]
+
+
+def _index(node, part, parts):
+    try:
+        index = int(part)
+    except (TypeError, ValueError):
+        raise YamlPatchError(f"{format_path(parts)}: 列表序号必须是整数")
+    if not -len(node) <= index < len(node):
+        return None
+    return index
+
+
+def _get(node, part, parts):
+    """取子节点，不存在时返回 _MISSING"""
+    if isinstance(node, list):
+        index = _index(node, part, parts)
+        return _MISSING if index is None else node[index]
+    if isinstance(node, dict):
+        return node.get(part, _MISSING)
+    raise YamlPatchError(f"{format_path(parts[:-1])} 不是映射或列表")
+
+
+def to_yaml(value):
+    """把 JSON 值转换为 ruamel 节点；会被 YAML 1.1 解析成其他类型的字符串（如 "22:22"、"yes"）加上引号"""
+    import yaml
+    from ruamel.yaml.comments import CommentedMap, CommentedSeq
+    from ruamel.yaml.scalarstring import DoubleQuotedScalarString
+
+    if isinstance(value, dict):
+        node = CommentedMap()
+        for key, item in value.items():
+            node[key] = to_yaml(item)
+        return node
+    if isinstance(value, list):
+        return CommentedSeq(to_yaml(item) for item in value)
+    if isinstance(value, str) and not hasattr(value, 'style'):
+        try:
+            plain = yaml.safe_load(value)
+        except yaml.YAMLError:
+            plain = None
+        if plain != value or '\n' in value:
+            return DoubleQuotedScalarString(value)
+    return value
+
+
+def guess_indent(content):
+    """从文本推测缩进风格，返回 ruamel 的 (mapping, sequence, offset)
+
+    只看第一个嵌套映射和第一个块列表相对其父键的缩进，避免为此再完整解析一遍文件。
+    """
+    mapping = offset = None
+    parent_indent = None
+    for line in content.splitlines():
+        stripped = line.lstrip(' ')
+        if not stripped or stripped.startswith('#'):
+            continue
+        indent = len(line) - len(stripped)
+        if parent_indent is not None and indent > parent_indent:
+            if stripped.startswith('- ') or stripped == '-':
+                if offset is None:
+                    offset = indent - parent_indent
+            elif mapping is None:
+                mapping = indent - parent_indent
+            if mapping is not None and offset is not None:
+                break
+        # 以冒号结尾的键，下一行是它的子节点
+        key = stripped[2:].lstrip() if stripped.startswith('- ') else stripped
+        parent_indent = indent if key.split(' #')[0].rstrip().endswith(':') else None
+    mapping = mapping or 2
+    offset = offset if offset is not None else 0
+    return mapping, offset + 2, offset
+
+
+def apply_patch(content, operations):
+    """对 YAML 文本应用一组操作，返回 (新内容, 每个操作的结果)；操作无效时抛出 YamlPatchError"""
+    patcher = YamlPatcher(content)
+    results = patcher.apply(operations)
+    return patcher.dump(), results
@@ -47,9 +47,12 @@ document.addEventListener('DOMContentLoaded', function() {
     const githubSettingsForm = document.getElementById('github-settings-form');
     const githubTokenInput = document.getElementById('github-token');
     const clearGithubTokenBtn = document.getElementById('clear-github-token');
+    const mirrorList = document.getElementById('mirror-list');
+    const mirrorSpeedTestBtn = document.getElementById('mirror-speed-test');
     
     // 当前状态
     let currentEditingFile = null;
+    let currentEditingHash = null;
     let currentDeploymentId = null;
     let statusCheckInterval = null;
     
@@ -102,17 +105,7 @@ document.addEventListener('DOMContentLoaded', function() {
         loadLocalFiles();
         loadSystemTypes();
         
-        // 加载Github Token
-        loadGithubToken();
-        
-        // 添加返回按钮
-        addBackButtons();
-        
-        // 事件监听器
-        setupEventListeners();
-    }
-    
-    // 加载Github Token
+        // 加载Github Token状态（服务器只返回打码后的Token）
     async function loadGithubToken() {
         if (!githubTokenInput) return;
         
@@ -120,30 +113,74 @@ document.addEventListener('DOMContentLoaded', function() {
             const response = await fetch('/api/settings/github-token');
             if (response.ok) {
                 const data = await response.json();
-                if (data.token) {
-                    githubTokenInput.value = data.token;
-                }
+                updateGithubTokenStatus(data);
             }
         } catch (error) {
             console.error('加载Github Token失败:', error);
         }
     }
     
-    // 获取Github Token
-    function getGithubToken() {
-        return githubTokenInput ? githubTokenInput.value.trim() : '';
+    // 显示当前Token状态
+    function updateGithubTokenStatus(data) {
+        const status = document.getElementById('github-token-status');
+        githubTokenInput.value = '';
+        githubTokenInput.placeholder = data.has_token ? `已设置: ${data.token}` : '输入您的GitHub Access Token';
+        if (status) {
+            if (!data.has_token) {
+                status.textContent = '未设置Token，使用匿名访问（每小时60次请求）';
+            } else if (data.source === 'env') {
+                status.textContent = '当前使用 GITHUB_TOKEN 环境变量中的Token';
+            } else {
+                status.textContent = data.updated_at ? `Token已保存，更新时间: ${formatDate(data.updated_at)}` : 'Token已保存';
+            }
+        }
+        if (data.can_edit === false) {
+            githubTokenInput.disabled = true;
+            if (clearGithubTokenBtn) clearGithubTokenBtn.disabled = true;
+        }
     }
     
-    // 创建带Github Token的headers
+    // 加载镜像站排名
+    async function loadMirrors() {
+        if (!mirrorList) return;
+        
+        try {
+            const response = await fetch('/api/mirrors');
+            if (response.ok) {
+                renderMirrors((await response.json()).mirrors);
+            }
+        } catch (error) {
+            console.error('加载镜像站失败:', error);
+        }
+    }
+    
+    // 显示镜像站排名
+    function renderMirrors(mirrors) {
+        mirrorList.innerHTML = '';
+        mirrors.forEach(mirror => {
+            const row = document.createElement('tr');
+            const status = mirror.checked_at === null
+                ? '<span class="text-gray-500">未检测</span>'
+                : mirror.healthy
+                    ? '<span class="text-green-600"><i class="fa fa-check-circle"></i> 正常</span>'
+                    : `<span class="text-red-600" title="${escapeHTML(mirror.last_error || '').replace(/"/g, '&quot;')}"><i class="fa fa-times-circle"></i> 异常</span>`;
+            row.innerHTML = `
+                <td class="px-4 py-2 font-mono">${escapeHTML(mirror.mirror)}</td>
+                <td class="px-4 py-2">${status}</td>
+                <td class="px-4 py-2">${mirror.throughput ? formatFileSize(mirror.throughput) + '/s' : '-'}</td>
+                <td class="px-4 py-2">${mirror.ttfb_ms !== null ? mirror.ttfb_ms + ' ms' : '-'}</td>
+                <td class="px-4 py-2">${mirror.latency_ms !== null ? mirror.latency_ms + ' ms' : '-'}</td>
+                <td class="px-4 py-2">${mirror.tested_at ? formatDate(mirror.tested_at) : '-'}</td>
+            `;
+            mirrorList.appendChild(row);
+        });
+    }
+    
+    // 创建请求headers（Token保存在服务器上，不再由浏览器发送）
     function createGithubHeaders() {
-        const headers = {
+        return {
             'Content-Type': 'application/json'
         };
-        const token = getGithubToken();
-        if (token) {
-            headers['X-Github-Token'] = token;
-        }
-        return headers;
     }
     
     // 设置事件监听器
@@ -249,7 +286,7 @@ document.addEventListener('DOMContentLoaded', function() {
                             `<button class="text-blue-600 hover:text-blue-900 edit-file-btn ml-2" data-system="${escapeHTML(currentGithubSystemType)}" data-filename="${escapeHTML(file.name)}">
                                 <i class="fa fa-edit"></i> 编辑
                             </button>` : 
-                            `<button class="text-green-600 hover:text-green-900 download-file-btn ml-2" data-url="${escapeHTML(file.download_url)}" data-system="${escapeHTML(currentGithubSystemType)}" data-filename="${escapeHTML(file.name)}">
+                            `<button class="text-green-600 hover:text-green-900 download-file-btn ml-2" data-url="${escapeHTML(file.download_url)}" data-system="${escapeHTML(currentGithubSystemType)}" data-filename="${escapeHTML(file.name)}" data-size="${escapeHTML(String(file.size ?? ''))}" data-sha="${escapeHTML(file.sha || '')}">
                                 <i class="fa fa-download"></i> 下载
                             </button>`;
                         
@@ -286,7 +323,7 @@ document.addEventListener('DOMContentLoaded', function() {
                             const url = this.getAttribute('data-url');
                             const system = this.getAttribute('data-system');
                             const filename = this.getAttribute('data-filename');
-                            downloadGithubFile(url, system, filename);
+                            downloadGithubFile(url, system, filename, this.getAttribute('data-size'), this.getAttribute('data-sha'));
                         });
                     });
                     
@@ -346,6 +383,10 @@ document.addEventListener('DOMContentLoaded', function() {
             githubSettingsForm.addEventListener('submit', async function(e) {
                 e.preventDefault();
                 const token = githubTokenInput.value.trim();
+                if (!token) {
+                    showNotification('error', '设置失败', '请输入Github Token');
+                    return;
+                }
                 
                 try {
                     const response = await fetch('/api/settings/github-token', {
@@ -357,10 +398,12 @@ document.addEventListener('DOMContentLoaded', function() {
                     });
                     
                     if (response.ok) {
-                        showNotification('success', '设置成功', 'Github Token已保存');
+                        const data = await response.json();
+                        updateGithubTokenStatus(data);
+                        showNotification('success', '设置成功', 'Github Token已加密保存');
                     } else {
                         const errorData = await response.json();
-                        showNotification('error', '设置失败', errorData.message || '保存失败');
+                        showNotification('error', '设置失败', errorData.error || errorData.message || '保存失败');
                     }
                 } catch (error) {
                     console.error('Save Github token error:', error);
@@ -369,6 +412,40 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
         
+        // 镜像站测速
+        if (mirrorSpeedTestBtn) {
+            mirrorSpeedTestBtn.addEventListener('click', async function() {
+                mirrorSpeedTestBtn.disabled = true;
+                mirrorSpeedTestBtn.innerHTML = '<i class="fa fa-spinner fa-spin mr-1"></i> 测速中...';
+                try {
+                    const response = await fetch('/api/mirrors/speed-test', { method: 'POST' });
+                    const data = await response.json();
+                    // 测速在后台进行（已有测速在进行时返回 409），轮询镜像站列表直到测速结束
+                    if (response.ok || response.status === 409) {
+                        let mirrorsData;
+                        do {
+                            await new Promise(resolve => setTimeout(resolve, 2000));
+                            const pollResponse = await fetch('/api/mirrors');
+                            if (!pollResponse.ok) {
+                                throw new Error(`HTTP ${pollResponse.status}`);
+                            }
+                            mirrorsData = await pollResponse.json();
+                            renderMirrors(mirrorsData.mirrors);
+                        } while (mirrorsData.speed_test && mirrorsData.speed_test.running);
+                        showNotification('success', '测速完成', '镜像站排名已更新');
+                    } else {
+                        showNotification('error', '测速失败', data.error || '测速失败');
+                    }
+                } catch (error) {
+                    console.error('Mirror speed test error:', error);
+                    showNotification('error', '测速失败', '网络错误，请稍后重试');
+                } finally {
+                    mirrorSpeedTestBtn.disabled = false;
+                    mirrorSpeedTestBtn.innerHTML = '<i class="fa fa-bolt mr-1"></i> 测速';
+                }
+            });
+        }
+        
         // 清除Github Token
         if (clearGithubTokenBtn) {
             clearGithubTokenBtn.addEventListener('click', async function() {
@@ -379,10 +456,11 @@ document.addEventListener('DOMContentLoaded', function() {
                         });
                         
                         if (response.ok) {
-                            githubTokenInput.value = '';
+                            updateGithubTokenStatus(await response.json());
                             showNotification('success', '操作成功', 'Github Token已清除');
                         } else {
-                            showNotification('error', '操作失败', '清除失败');
+                            const errorData = await response.json();
+                            showNotification('error', '操作失败', errorData.error || '清除失败');
                         }
                     } catch (error) {
                         console.error('Clear Github token error:', error);
@@ -398,6 +476,13 @@ document.addEventListener('DOMContentLoaded', function() {
         deployFileBtn.addEventListener('click', saveAndDeployFile);
         closeProgressModalBtn.addEventListener('click', closeProgressModal);
         
+        // 编辑时停顿后重新检查内容
+        let lintTimer = null;
+        fileContentText.addEventListener('input', function() {
+            clearTimeout(lintTimer);
+            lintTimer = setTimeout(lintEditingContent, 600);
+        });
+        
 
         
         // 密码修改表单
@@ -471,6 +556,8 @@ document.addEventListener('DOMContentLoaded', function() {
             loadLocalFiles();
         } else if (pageId === 'deployments') {
             loadDeployments();
+        } else if (pageId === 'settings') {
+            loadMirrors();
         }
     }
     
@@ -578,7 +665,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 // 更新镜像源状态
                 const mirrorStatusEl = document.getElementById('mirror-status');
-                if (data.mirrors_status) {
+                if (mirrorStatusEl && data.mirrors_status) {
                     let statusHTML = '';
                     for (const [mirror, status] of Object.entries(data.mirrors_status)) {
                         const shortName = mirror.split('.')[1];
@@ -593,6 +680,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (document.getElementById('app-version-detail')) {
                     document.getElementById('app-version-detail').textContent = `v${data.app_version}`;
                 }
+                
+                // 更新Github API剩余额度
+                const rateLimitEl = document.getElementById('github-rate-limit');
+                const githubLimit = data.rate_limits && data.rate_limits.github;
+                if (rateLimitEl && githubLimit && githubLimit.remaining !== null) {
+                    let text = githubLimit.limit ? `${githubLimit.remaining} / ${githubLimit.limit}` : `${githubLimit.remaining}`;
+                    if (githubLimit.reset_in) {
+                        text += ` (${Math.ceil(githubLimit.reset_in / 60)} 分钟后重置)`;
+                    }
+                    rateLimitEl.textContent = text;
+                    rateLimitEl.className = githubLimit.low ? 'text-red-600' : '';
+                }
             }
         } catch (error) {
             console.error('Load system info failed:', error);
@@ -718,6 +817,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     option.textContent = system.name;
                     systemTypeSelect.appendChild(option);
                 });
+                
+                // 因额度不足使用默认列表时提示用户
+                if (data.warning) {
+                    showNotification('warning', 'Github API 额度不足', data.warning);
+                }
             }
         } catch (error) {
             console.error('Load system types failed:', error);
@@ -792,7 +896,7 @@ document.addEventListener('DOMContentLoaded', function() {
                             `<button class="text-blue-600 hover:text-blue-900 edit-file-btn ml-2" data-system="${escapeHTML(type)}" data-filename="${escapeHTML(file.name)}">
                                 <i class="fa fa-edit"></i> 编辑
                             </button>` : 
-                            `<button class="text-green-600 hover:text-green-900 download-file-btn ml-2" data-url="${escapeHTML(file.download_url)}" data-system="${escapeHTML(type)}" data-filename="${escapeHTML(file.name)}">
+                            `<button class="text-green-600 hover:text-green-900 download-file-btn ml-2" data-url="${escapeHTML(file.download_url)}" data-system="${escapeHTML(type)}" data-filename="${escapeHTML(file.name)}" data-size="${escapeHTML(String(file.size ?? ''))}" data-sha="${escapeHTML(file.sha || '')}">
                                 <i class="fa fa-download"></i> 下载
                             </button>`;
                         
@@ -829,7 +933,7 @@ document.addEventListener('DOMContentLoaded', function() {
                             const url = this.getAttribute('data-url');
                             const system = this.getAttribute('data-system');
                             const filename = this.getAttribute('data-filename');
-                            downloadGithubFile(url, system, filename);
+                            downloadGithubFile(url, system, filename, this.getAttribute('data-size'), this.getAttribute('data-sha'));
                         });
                     });
                     
@@ -1051,7 +1155,7 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // 下载Github文件
-    async function downloadGithubFile(url, systemType, filename) {
+    async function downloadGithubFile(url, systemType, filename, size, sha) {
         try {
             const response = await fetch('/api/github/download', {
                 method: 'POST',
@@ -1059,7 +1163,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify({
                     download_url: url,
                     system_type: systemType,
-                    filename: filename
+                    filename: filename,
+                    // 服务器按列表中的大小和SHA校验下载内容
+                    size: size ? Number(size) : null,
+                    sha: sha || null
                 })
             });
             
@@ -1090,15 +1197,12 @@ document.addEventListener('DOMContentLoaded', function() {
             
             if (response.ok && data.success) {
                 currentEditingFile = filePath;
+                currentEditingHash = data.content_hash || null;
                 editModalTitle.textContent = `编辑文件: ${filename}`;
                 fileContentText.value = data.content;
                 
-                // 显示文件格式警告
-                if (!data.parsed && data.error) {
-                    document.getElementById('file-preview-warning').classList.remove('hidden');
-                } else {
-                    document.getElementById('file-preview-warning').classList.add('hidden');
-                }
+                // 显示文件格式、变量和 compose 规范检查结果
+                lintEditingContent();
                 
                 // 显示模态框
                 fileEditModal.classList.remove('hidden');
@@ -1117,6 +1221,7 @@ document.addEventListener('DOMContentLoaded', function() {
     function closeEditModal() {
         fileEditModal.classList.add('hidden');
         currentEditingFile = null;
+        currentEditingHash = null;
         fileContentText.value = '';
         document.getElementById('file-preview-warning').classList.add('hidden');
     }
@@ -1133,14 +1238,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 headers: createGithubHeaders(),
                 body: JSON.stringify({
                     file_path: currentEditingFile,
-                    content: content
+                    content: content,
+                    base_hash: currentEditingHash
                 })
             });
             
             const data = await response.json();
             
-            if (response.ok && data.success) {
-                showNotification('success', '保存成功', '文件已成功保存');
+            if (response.status === 412) {
+                showNotification('error', '保存失败', '文件已被其他人修改，请重新打开后再编辑');
+            } else if (response.ok && data.success) {
+                currentEditingHash = data.content_hash;
+                showNotification('success', '保存成功', data.changed === false ? '文件内容未变化' : '文件已成功保存');
                 closeEditModal();
                 // 刷新文件列表
                 loadLocalFiles();
@@ -1166,16 +1275,21 @@ document.addEventListener('DOMContentLoaded', function() {
                 headers: createGithubHeaders(),
                 body: JSON.stringify({
                     file_path: currentEditingFile,
-                    content: content
+                    content: content,
+                    base_hash: currentEditingHash
                 })
             });
             
             const saveData = await saveResponse.json();
             
-            if (saveResponse.ok && saveData.success) {
+            if (saveResponse.status === 412) {
+                showNotification('error', '保存失败', '文件已被其他人修改，请重新打开后再编辑');
+            } else if (saveResponse.ok && saveData.success) {
+                const filePath = currentEditingFile;
+                const useMirror = document.getElementById('deploy-use-mirror').checked;
                 closeEditModal();
                 // 然后部署
-                deployFile(currentEditingFile);
+                deployFile(filePath, { mirror: useMirror });
             } else {
                 showNotification('error', '保存失败', saveData.error || '文件保存失败');
             }
@@ -1185,15 +1299,38 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // 检查编辑中的内容（服务器按内容哈希缓存结果，未修改的内容不会重复检查）
+    async function lintEditingContent() {
+        const warning = document.getElementById('file-preview-warning');
+        const messages = document.getElementById('file-lint-messages');
+        try {
+            const response = await fetch('/api/github/lint-file', {
+                method: 'POST',
+                headers: createGithubHeaders(),
+                body: JSON.stringify({ file_path: currentEditingFile, content: fileContentText.value })
+            });
+            const data = await response.json();
+            if (!response.ok) return;
+            
+            const items = data.errors.concat(data.warnings);
+            messages.innerHTML = items.slice(0, 10)
+                .map(item => `<li>${escapeHTML(item.path)}: ${escapeHTML(item.message)}</li>`)
+                .join('');
+            warning.classList.toggle('hidden', items.length === 0);
+        } catch (error) {
+            console.error('Lint file failed:', error);
+        }
+    }
+    
     // 部署文件
-    async function deployFile(filePath) {
+    async function deployFile(filePath, options = {}) {
         try {
             const response = await fetch('/api/docker/deploy', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ file_path: filePath })
+                body: JSON.stringify({ file_path: filePath, ...options })
             });
             
             const data = await response.json();
@@ -1280,6 +1417,9 @@ document.addEventListener('DOMContentLoaded', function() {
                             showNotification('success', '部署成功', '容器已成功部署');
                             // 刷新Docker统计信息
                             loadDockerStats();
+                        } else if (data.status === 'unchanged') {
+                            progressIcon.className = 'fa fa-check-circle text-green-600 text-2xl';
+                            showNotification('success', '无需部署', '配置和容器均未变更');
                         } else {
                             progressIcon.className = 'fa fa-times-circle text-red-600 text-2xl';
                             showNotification('error', '部署失败', '容器部署失败，请查看日志');
@@ -1298,6 +1438,7 @@ document.addEventListener('DOMContentLoaded', function() {
             'pending': '等待中...',
             'deploying': '部署中...',
             'success': '部署成功',
+            'unchanged': '未变更',
             'failed': '部署失败'
         };
         return statusMap[status] || status;
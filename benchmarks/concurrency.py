@@ -0,0 +1,180 @@
+"""Concurrency load test for the gunicorn configuration.
+
+Starts the app under gunicorn against a temporary database and a local
+stand-in for the GitHub API that answers slowly, then, for increasing
+levels of concurrency, fires that many slow requests at once while a probe
+measures the latency of a cheap endpoint. Under the old single sync worker
+the slow requests are served one after another and the probe waits behind
+them; with gthread workers they overlap.
+
+    python benchmarks/concurrency.py
+    python benchmarks/concurrency.py --worker-class sync --workers 1 --threads 1
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'benchmark-password'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_slow_github(delay):
+    """Serve a GitHub contents listing after `delay` seconds."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps([{'name': 'fnOS', 'type': 'dir'}]).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bootstrap_database(env):
+    """Create the schema and an admin user with a known password."""
+    code = (
+        "import bcrypt\n"
+        "from app import create_app, db\n"
+        "from app.models.user import User\n"
+        "app = create_app()\n"
+        "with app.app_context():\n"
+        f"    user = User.query.filter_by(username={ADMIN_USERNAME!r}).first()\n"
+        f"    user.password = bcrypt.hashpw({ADMIN_PASSWORD!r}.encode(), bcrypt.gensalt(4)).decode()\n"
+        "    db.session.commit()\n"
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'{url} did not become ready')
+
+
+def run_level(base_url, cookies, concurrency):
+    """Fire `concurrency` slow requests at once and probe a cheap endpoint meanwhile."""
+    probe_latencies = []
+    done = threading.Event()
+
+    def slow_request(_):
+        start = time.perf_counter()
+        response = requests.get(f'{base_url}/api/github/system-types', cookies=cookies, timeout=120)
+        return response.status_code, time.perf_counter() - start
+
+    def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                requests.get(f'{base_url}/health', timeout=120)
+                probe_latencies.append(time.perf_counter() - start)
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(slow_request, range(concurrency)))
+    wall = time.perf_counter() - start
+    done.set()
+    probe_thread.join()
+
+    return {
+        'concurrency': concurrency,
+        'wall_s': round(wall, 2),
+        'errors': sum(1 for status, _ in results if status != 200),
+        'slow_max_s': round(max(latency for _, latency in results), 2),
+        'probe_p50_ms': round(statistics.median(probe_latencies) * 1000, 1) if probe_latencies else None,
+        'probe_max_ms': round(max(probe_latencies) * 1000, 1) if probe_latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker-class', default=None, help='override GUNICORN_WORKER_CLASS')
+    parser.add_argument('--workers', default=None, help='override GUNICORN_WORKERS')
+    parser.add_argument('--threads', default=None, help='override GUNICORN_THREADS')
+    parser.add_argument('--delay', type=float, default=1.0, help='seconds the GitHub stand-in waits per request')
+    parser.add_argument('--levels', default='1,4,8,16,32', help='comma separated concurrency levels')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='compose-bench-')
+    github = start_slow_github(args.delay)
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "bench.db")}',
+        'SECRET_KEY': 'benchmark-secret',
+        'GITHUB_API_URL': f'http://127.0.0.1:{github.server_port}',
+        'STATS_SAMPLER_AUTOSTART': 'false',
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_LOGLEVEL': 'warning'
+    })
+    for name, value in (('GUNICORN_WORKER_CLASS', args.worker_class),
+                        ('GUNICORN_WORKERS', args.workers),
+                        ('GUNICORN_THREADS', args.threads)):
+        if value is not None:
+            env[name] = value
+
+    bootstrap_database(env)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'run:app'],
+                              cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_for(f'{base_url}/health')
+        login = requests.post(f'{base_url}/api/login',
+                              json={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}, timeout=30)
+        login.raise_for_status()
+
+        print(f"worker_class={env.get('GUNICORN_WORKER_CLASS', 'config default')} "
+              f"workers={env.get('GUNICORN_WORKERS', 'config default')} "
+              f"threads={env.get('GUNICORN_THREADS', 'config default')} slow_delay={args.delay}s")
+        print(f"{'concurrency':>11} {'wall_s':>7} {'errors':>6} {'slow_max_s':>10} {'probe_p50_ms':>12} {'probe_max_ms':>12}")
+        for level in [int(v) for v in args.levels.split(',')]:
+            row = run_level(base_url, login.cookies, level)
+            print(f"{row['concurrency']:>11} {row['wall_s']:>7} {row['errors']:>6} {row['slow_max_s']:>10} "
+                  f"{str(row['probe_p50_ms']):>12} {str(row['probe_max_ms']):>12}")
+    finally:
+        server.terminate()
+        server.wait()
+        github.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""Hot path microbenchmarks.
+
+Runs offline against a temporary data directory, database and stubs:
+
+* `FileService.get_local_files` and `/api/local/files` over 10k synthetic
+  compose files spread across the system type directories;
+* YAML parse/validate and `update_yaml_field` on a compose file with 1,000
+  services, and the same set of field edits applied by calling
+  `update_yaml_field` once per field versus one `patch_yaml` batch;
+* `/api/github/files/<type>` against a local stub of the GitHub contents
+  API returning 1,000 entries;
+* compose-spec validation of the 1,000 service file, with an empty result
+  cache and with the result cached by content hash;
+* `execute_deployment` with a fake `docker` binary whose `compose up`
+  prints 50k lines.
+
+Results are compared with `benchmarks/baseline.json`; cases whose fastest
+run is slower than the baseline's by more than the tolerance are reported as regressions (and make
+`--check` exit non-zero). Record a new baseline with `--save-baseline`.
+
+    python benchmarks/hot_paths.py
+    python benchmarks/hot_paths.py --only deploy --repeat 3
+    python benchmarks/hot_paths.py --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import stat
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+SYSTEM_TYPES = ('fnOS', 'QNAP', 'Synology', 'TrueNAS', 'UgreenNew', 'Ugreen', 'ZSpace', 'ZimaOS', 'local')
+
+FAKE_DOCKER = """#!/bin/sh
+case "$*" in
+  *version*) echo "Docker Compose version v2.20.3" ;;
+  *" up "*|*" up") awk -v n="$BENCH_COMPOSE_LINES" 'BEGIN { for (i = 1; i <= n; i++) printf " Container bench-%d  Started\\n", i }' ;;
+  *) exit 1 ;;
+esac
+"""
+
+
+def compose_file(services):
+    lines = ['version: "3.8"', 'services:']
+    for i in range(services):
+        lines += [
+            f'  svc{i}:',
+            f'    image: registry.example.com/team/app{i}:1.{i}',
+            f'    container_name: svc{i}',
+            '    restart: unless-stopped',
+            '    ports:',
+            f'      - "{10000 + i}:80"',
+            '    environment:',
+            f'      - SERVICE_INDEX={i}',
+            '      - TZ=Asia/Shanghai',
+            '    volumes:',
+            f'      - ./data/svc{i}:/data'
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def make_data_dir(data_dir, files):
+    for index in range(files):
+        directory = os.path.join(data_dir, SYSTEM_TYPES[index % len(SYSTEM_TYPES)])
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'app-{index}.yml'), 'w') as f:
+            f.write(f'services:\n  app{index}:\n    image: nginx:1.{index % 30}\n')
+
+
+def start_github_stub(entries):
+    listing = json.dumps([{
+        'type': 'file',
+        'name': f'app-{i}.yml' if i % 10 else f'README-{i}.md',
+        'size': 200 + i,
+        'download_url': f'https://raw.example.com/app-{i}.yml'
+    } for i in range(entries)]).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = listing if '/contents/' in self.path else b'{"message": "Not Found"}'
+            self.send_response(200 if '/contents/' in self.path else 404)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('X-RateLimit-Remaining', '4999')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def setup(workdir, args):
+    data_dir = os.path.join(workdir, 'data')
+    make_data_dir(data_dir, args.files)
+
+    bin_dir = os.path.join(workdir, 'bin')
+    os.makedirs(bin_dir)
+    docker_path = os.path.join(bin_dir, 'docker')
+    with open(docker_path, 'w') as f:
+        f.write(FAKE_DOCKER)
+    os.chmod(docker_path, os.stat(docker_path).st_mode | stat.S_IEXEC)
+
+    server = start_github_stub(args.github_entries)
+    os.environ.update({
+        'DATA_DIR': data_dir,
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "bench.db")}',
+        'SECRET_KEY': 'benchmark-secret',
+        'STATS_SAMPLER_AUTOSTART': 'false',
+        'GITHUB_API_URL': f'http://127.0.0.1:{server.server_address[1]}',
+        'GITHUB_REPO': 'bench/compose',
+        'BENCH_COMPOSE_LINES': str(args.compose_lines),
+        'PATH': bin_dir + os.pathsep + os.environ.get('PATH', '')
+    })
+    return data_dir
+
+
+def build_cases(data_dir, args):
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.models.user import DeploymentLog
+    from app.routes import docker as docker_routes
+    from app.services.file_service import FileService
+    from app.services.compose_lint import ComposeLinter, compose_linter
+
+    app = create_app()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+
+    file_service = FileService()
+    large_compose = compose_file(args.services)
+    deploy_file = os.path.join(data_dir, 'local', 'deploy-bench.yml')
+    with open(deploy_file, 'w') as f:
+        f.write(compose_file(3))
+
+    # The same edits spread over the file, for per-field updates versus one batched patch
+    fields = [(f'services.svc{i}.image', f'nginx:1.{i}')
+              for i in range(0, args.services, max(1, args.services // args.patch_fields))][:args.patch_fields]
+    operations = [{'op': 'set', 'path': path, 'value': value} for path, value in fields]
+    
+    def update_each():
+        content = large_compose
+        for path, value in fields:
+            success, content = file_service.update_yaml_field(content, path, value)
+            assert success, content
+    
+    def patch_batch():
+        success, result = file_service.patch_yaml(large_compose, operations)
+        assert success and result['changed'], result
+    
+    def lint_cold():
+        result = ComposeLinter().lint(large_compose, data_dir)
+        assert result['valid'] and not result['cached'], result['errors'][:3]
+
+    def lint_cached():
+        result = compose_linter.lint(large_compose, data_dir)
+        assert result['valid'], result['errors'][:3]
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code, response.get_data(as_text=True)[:200])
+
+    def deploy():
+        with app.app_context():
+            log = DeploymentLog(file_id=1, status='pending', command='docker compose up -d')
+            db.session.add(log)
+            db.session.commit()
+            log_id = log.id
+        deployment_id = docker_routes.make_deployment_id(log_id)
+        docker_routes.deployment_processes[deployment_id] = {
+            'log_id': log_id, 'thread': None, 'status': 'pending', 'progress': 0, 'output': ''
+        }
+        # execute_deployment keeps its record for an hour after finishing, so poll the log entry
+        threading.Thread(target=docker_routes.execute_deployment,
+                         args=(app, deploy_file, 'v2', log_id, deployment_id), daemon=True).start()
+        status = 'pending'
+        while status in ('pending', 'deploying'):
+            time.sleep(0.005)
+            with app.app_context():
+                status = db.session.execute(select(DeploymentLog.status).filter_by(id=log_id)).scalar()
+        assert status == 'success', docker_routes.deployment_processes[deployment_id]['output'][-200:]
+
+    return {
+        'file_service.get_local_files': lambda: file_service.get_local_files(),
+        'api.local_files': lambda: get('/api/local/files'),
+        'yaml.validate_large': lambda: file_service.validate_yaml_content(large_compose),
+        'yaml.update_field': lambda: file_service.update_yaml_field(large_compose, 'services.svc500.image', 'nginx:latest'),
+        'yaml.update_field_each': update_each,
+        'yaml.patch_batch': patch_batch,
+        'compose.lint': lint_cold,
+        'compose.lint_cached': lint_cached,
+        'api.github_files': lambda: get('/api/github/files/fnOS'),
+        'deploy.output': deploy
+    }
+
+
+def measure(func, repeat):
+    func()  # warm up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': round(statistics.median(timings), 2), 'min_ms': round(min(timings), 2), 'runs': repeat}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='run cases whose name contains this text')
+    parser.add_argument('--files', type=int, default=10000, help='synthetic compose files in the data directory')
+    parser.add_argument('--services', type=int, default=1000, help='services in the large compose file')
+    parser.add_argument('--patch-fields', type=int, default=20, help='fields edited by the yaml.update_field_each/patch_batch cases')
+    parser.add_argument('--github-entries', type=int, default=1000)
+    parser.add_argument('--compose-lines', type=int, default=50000)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before a case counts as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 when a case regressed')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='compose-bench-')
+    try:
+        run(workdir, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(workdir, args):
+    data_dir = setup(workdir, args)
+    cases = build_cases(data_dir, args)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+
+    results = {}
+    regressions = []
+    print(f"{'case':<30} {'median ms':>10} {'min ms':>10} {'base min':>10} {'ratio':>7}")
+    for name, func in cases.items():
+        if args.only and args.only not in name:
+            continue
+        results[name] = measure(func, args.repeat)
+        # Compare the fastest run, which is less sensitive to noise from other processes than the median
+        reference = baseline.get(name, {}).get('min_ms')
+        ratio = results[name]['min_ms'] / reference if reference else None
+        flag = ''
+        if ratio is not None and ratio > 1 + args.tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<30} {results[name]['median_ms']:>10.2f} {results[name]['min_ms']:>10.2f} "
+              f"{reference if reference is not None else '-':>10} {f'{ratio:.2f}' if ratio else '-':>7}{flag}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'cpus': os.cpu_count(),
+                'parameters': {'files': args.files, 'services': args.services, 'patch_fields': args.patch_fields,
+                               'github_entries': args.github_entries, 'compose_lines': args.compose_lines},
+                'results': dict(baseline, **results)
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nbaseline written to {args.baseline}')
+
+    if regressions and args.check:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""End-to-end load test.
+
+Starts the app under gunicorn against a temporary database and data
+directory, with stand-in `docker` / `docker compose` executables and a
+local stub of the GitHub contents API, then drives a mix of logins, file
+listings, deployments and deployment status polling at a target request
+rate. Requests are scheduled open-loop: latency is measured from the time a
+request was due, so a server that falls behind shows it in the tail.
+
+Reports p50/p95/p99 latency and the error rate per endpoint.
+
+    python benchmarks/load_test.py --rps 50 --duration 30
+    python benchmarks/load_test.py --rps 20 --compose-delay 5 --compose-lines 2000 --mix deploy=10,status=40,local_files=50
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.concurrency import ADMIN_USERNAME, ADMIN_PASSWORD, bootstrap_database, free_port, wait_for  # noqa: E402
+from benchmarks.hot_paths import SYSTEM_TYPES, compose_file, make_data_dir, start_github_stub  # noqa: E402
+
+DEFAULT_MIX = 'login=2,local_files=25,github_files=15,deployments=10,deploy=8,status=40'
+
+FAKE_DOCKER = """#!/bin/sh
+case "$*" in
+  *version*) echo "Docker Compose version v2.20.3" ;;
+  *" config"*) echo "services: {}" ;;
+  *" up "*|*" up")
+    sleep "$FAKE_COMPOSE_DELAY"
+    awk -v n="$FAKE_COMPOSE_LINES" 'BEGIN { for (i = 1; i <= n; i++) printf " Container load-%d  Started\\n", i }' ;;
+  *) exit 0 ;;
+esac
+"""
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(ACTIONS)
+    if unknown:
+        raise SystemExit(f"unknown actions in --mix: {', '.join(sorted(unknown))} (available: {', '.join(ACTIONS)})")
+    return mix
+
+
+class LoadClient:
+    """Per-thread HTTP sessions sharing the cookies of the logged-in users."""
+
+    def __init__(self, base_url, cookies, deploy_files):
+        self.base_url = base_url
+        self.cookies = cookies
+        self.deploy_files = deploy_files
+        self.deployments = []
+        self.deployments_lock = threading.Lock()
+        self.local = threading.local()
+        self.user_index = itertools.count()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+            self.local.session.cookies.update(self.cookies[next(self.user_index) % len(self.cookies)])
+        return self.local.session
+
+
+def action_login(client):
+    return requests.post(f'{client.base_url}/api/login',
+                         json={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}, timeout=60)
+
+
+def action_local_files(client):
+    return client.session().get(f'{client.base_url}/api/local/files', timeout=60)
+
+
+def action_github_files(client):
+    return client.session().get(f'{client.base_url}/api/github/files/{random.choice(SYSTEM_TYPES[:-1])}', timeout=60)
+
+
+def action_deployments(client):
+    return client.session().get(f'{client.base_url}/api/docker/deployments', timeout=60)
+
+
+def action_deploy(client):
+    response = client.session().post(f'{client.base_url}/api/docker/deploy',
+                                     json={'file_path': random.choice(client.deploy_files), 'force': True}, timeout=60)
+    if response.status_code == 200:
+        with client.deployments_lock:
+            client.deployments.append(response.json()['deployment_id'])
+            del client.deployments[:-50]
+    return response
+
+
+def action_status(client):
+    with client.deployments_lock:
+        deployment_id = random.choice(client.deployments) if client.deployments else None
+    if deployment_id is None:
+        return action_deployments(client)
+    return client.session().get(f'{client.base_url}/api/docker/deployment/status/{deployment_id}', timeout=60)
+
+
+ACTIONS = {
+    'login': action_login,
+    'local_files': action_local_files,
+    'github_files': action_github_files,
+    'deployments': action_deployments,
+    'deploy': action_deploy,
+    'status': action_status
+}
+
+
+def run_load(client, mix, rps, duration, max_in_flight):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = defaultdict(lambda: {'latency': [], 'errors': 0, 'statuses': defaultdict(int)})
+    lock = threading.Lock()
+    dropped = 0
+
+    def execute(name, due):
+        try:
+            response = ACTIONS[name](client)
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        latency = time.perf_counter() - due
+        with lock:
+            result = results[name]
+            result['latency'].append(latency)
+            result['statuses'][status] += 1
+            if not isinstance(status, int) or status >= 400:
+                result['errors'] += 1
+
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for index in range(int(rps * duration)):
+            due = started + index / rps
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not in_flight.acquire(blocking=False):
+                # Client side limit reached; count it instead of queueing without bound
+                dropped += 1
+                continue
+            future = pool.submit(execute, random.choices(names, weights)[0], due)
+            future.add_done_callback(lambda _: in_flight.release())
+    elapsed = time.perf_counter() - started
+    return results, elapsed, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rps', type=float, default=20, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to generate load for')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='comma separated action=weight pairs')
+    parser.add_argument('--users', type=int, default=10, help='logged-in sessions shared by the load threads')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='client side cap on concurrent requests')
+    parser.add_argument('--compose-delay', type=float, default=2.0, help='seconds fake `compose up` takes')
+    parser.add_argument('--compose-lines', type=int, default=200, help='lines of output fake `compose up` prints')
+    parser.add_argument('--files', type=int, default=500, help='compose files in the data directory')
+    parser.add_argument('--github-entries', type=int, default=200)
+    parser.add_argument('--workers', default=None, help='override GUNICORN_WORKERS')
+    parser.add_argument('--threads', default=None, help='override GUNICORN_THREADS')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    workdir = tempfile.mkdtemp(prefix='compose-load-')
+    data_dir = os.path.join(workdir, 'data')
+    make_data_dir(data_dir, args.files)
+    deploy_files = []
+    for index in range(5):
+        path = os.path.join(data_dir, 'local', f'load-{index}.yml')
+        with open(path, 'w') as f:
+            f.write(compose_file(3))
+        deploy_files.append(path)
+
+    bin_dir = os.path.join(workdir, 'bin')
+    os.makedirs(bin_dir)
+    docker_path = os.path.join(bin_dir, 'docker')
+    with open(docker_path, 'w') as f:
+        f.write(FAKE_DOCKER)
+    os.chmod(docker_path, os.stat(docker_path).st_mode | stat.S_IEXEC)
+
+    github = start_github_stub(args.github_entries)
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'DATA_DIR': data_dir,
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "load.db")}',
+        'SECRET_KEY': 'benchmark-secret',
+        'GITHUB_API_URL': f'http://127.0.0.1:{github.server_address[1]}',
+        'GITHUB_REPO': 'bench/compose',
+        'STATS_SAMPLER_AUTOSTART': 'false',
+        'PATH': bin_dir + os.pathsep + env.get('PATH', ''),
+        'FAKE_COMPOSE_DELAY': str(args.compose_delay),
+        'FAKE_COMPOSE_LINES': str(args.compose_lines),
+        # The load generator logs in from one address far faster than a person would
+        'LOGIN_IP_RATE': '100000',
+        'LOGIN_IP_BURST': '100000',
+        'LOGIN_USER_RATE': '100000',
+        'LOGIN_USER_BURST': '100000',
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_LOGLEVEL': 'warning'
+    })
+    for name, value in (('GUNICORN_WORKERS', args.workers), ('GUNICORN_THREADS', args.threads)):
+        if value is not None:
+            env[name] = value
+
+    bootstrap_database(env)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'run:app'],
+                              cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_for(f'{base_url}/health')
+        cookies = []
+        for _ in range(args.users):
+            login = action_login(LoadClient(base_url, [], deploy_files))
+            login.raise_for_status()
+            cookies.append(login.cookies)
+        client = LoadClient(base_url, cookies, deploy_files)
+
+        print(f"target {args.rps} req/s for {args.duration}s, mix {args.mix}, "
+              f"compose up {args.compose_delay}s / {args.compose_lines} lines")
+        results, elapsed, dropped = run_load(client, mix, args.rps, args.duration, args.max_in_flight)
+    finally:
+        server.terminate()
+        server.wait()
+        github.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'target_rps': args.rps, 'duration_s': round(elapsed, 2), 'dropped': dropped, 'endpoints': {}}
+    total = sum(len(r['latency']) for r in results.values())
+    print(f"\ncompleted {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), {dropped} dropped at the client")
+    print(f"{'endpoint':<14} {'count':>6} {'errors':>7} {'err %':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name in mix:
+        result = results.get(name)
+        if not result or not result['latency']:
+            continue
+        latency = result['latency']
+        row = {
+            'count': len(latency),
+            'errors': result['errors'],
+            'error_rate': round(result['errors'] / len(latency), 4),
+            'p50_ms': round(percentile(latency, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latency, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latency, 0.99) * 1000, 1),
+            'max_ms': round(max(latency) * 1000, 1),
+            'statuses': {str(k): v for k, v in result['statuses'].items()}
+        }
+        report['endpoints'][name] = row
+        print(f"{name:<14} {row['count']:>6} {row['errors']:>7} {row['error_rate'] * 100:>6.1f} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Registry mirror speed test.
+
+Runs `MirrorService.speed_test` (the same code behind
+`/api/mirrors/speed-test`) against local stand-ins of a Docker registry
+and prints the measured time to first byte and throughput next to the
+configured ones, followed by the ranking the deploy-time mirror selection
+would use. The stand-ins implement what the speed test touches: `/v2/`
+with optional Bearer token auth, a multi-platform manifest index, a
+platform manifest and a blob that redirects to a throttled "CDN" URL.
+
+    python benchmarks/registry_speed.py
+    python benchmarks/registry_speed.py --rates 4M,1M --ttfb 0.05,0.3 --bytes 2M
+    python benchmarks/registry_speed.py --mirror https://docker.1ms.run --mirror https://docker.1panel.live
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+INDEX_TYPE = 'application/vnd.oci.image.index.v1+json'
+MANIFEST_TYPE = 'application/vnd.oci.image.manifest.v1+json'
+
+
+def parse_size(text):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def start_registry_stub(rate, ttfb=0.0, auth=False, layer_size=64 * 1024 * 1024, broken=False):
+    """Start a registry stand-in serving one image; blobs are sent at `rate` bytes/s after `ttfb` seconds."""
+    layers = {
+        'sha256:' + hashlib.sha256(b'small').hexdigest(): 1024,
+        'sha256:' + hashlib.sha256(b'large').hexdigest(): layer_size
+    }
+    manifest = json.dumps({
+        'schemaVersion': 2,
+        'mediaType': MANIFEST_TYPE,
+        'layers': [{'mediaType': 'application/vnd.oci.image.layer.v1.tar+gzip', 'digest': digest, 'size': size}
+                   for digest, size in layers.items()]
+    }).encode()
+    manifest_digest = 'sha256:' + hashlib.sha256(manifest).hexdigest()
+    index = json.dumps({
+        'schemaVersion': 2,
+        'mediaType': INDEX_TYPE,
+        'manifests': [
+            {'mediaType': MANIFEST_TYPE, 'digest': 'sha256:' + '0' * 64, 'size': 1,
+             'platform': {'os': 'linux', 'architecture': 'arm64'}},
+            {'mediaType': MANIFEST_TYPE, 'digest': manifest_digest, 'size': len(manifest),
+             'platform': {'os': 'linux', 'architecture': 'amd64'}}
+        ]
+    }).encode()
+    token = 'stub-token'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            host = f'http://{self.headers["Host"]}'
+            if self.path.startswith('/token'):
+                return self.reply(200, json.dumps({'token': token}).encode(), 'application/json')
+            if self.path.startswith('/cdn/'):
+                return self.stream_blob(self.path[len('/cdn/'):])
+            if auth and self.headers.get('Authorization') != f'Bearer {token}':
+                self.send_response(401)
+                self.send_header('WWW-Authenticate', f'Bearer realm="{host}/token",service="registry.stub"')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if self.path == '/v2/':
+                return self.reply(200, b'{}', 'application/json')
+            match = re.match(r'^/v2/(.+)/(manifests|blobs)/([^/]+)$', self.path)
+            if not match:
+                return self.reply(404, b'{}', 'application/json')
+            kind, reference = match.group(2), match.group(3)
+            if kind == 'manifests':
+                if broken:
+                    return self.reply(500, b'{}', 'application/json')
+                if reference == manifest_digest:
+                    return self.reply(200, manifest, MANIFEST_TYPE)
+                if reference.startswith('sha256:'):
+                    return self.reply(404, b'{}', 'application/json')
+                return self.reply(200, index, INDEX_TYPE)
+            if reference not in layers:
+                return self.reply(404, b'{}', 'application/json')
+            # Registries usually redirect blob downloads to a CDN
+            self.send_response(307)
+            self.send_header('Location', f'{host}/cdn/{reference}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def reply(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def stream_blob(self, digest):
+            size = layers.get(digest)
+            if size is None:
+                return self.reply(404, b'{}', 'application/json')
+            time.sleep(ttfb)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+            chunk = b'\0' * 65536
+            started = time.perf_counter()
+            sent = 0
+            try:
+                while sent < size:
+                    data = chunk[:size - sent]
+                    self.wfile.write(data)
+                    sent += len(data)
+                    delay = started + sent / rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+            except (BrokenPipeError, ConnectionResetError):
+                # The speed test stops reading after its byte budget
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', default='8M,2M', help='comma separated blob rates (bytes/s) of the local stand-ins')
+    parser.add_argument('--ttfb', default='0.02,0.2', help='comma separated seconds before each stand-in sends the blob')
+    parser.add_argument('--bytes', default='4M', help='bytes read from each mirror')
+    parser.add_argument('--seconds', type=float, default=10, help='longest time spent reading from each mirror')
+    parser.add_argument('--no-broken', action='store_true', help='leave out the stand-in whose manifests return 500')
+    parser.add_argument('--mirror', action='append', help='test these real mirrors instead of local stand-ins')
+    parser.add_argument('--image', default=None, help='image whose largest layer is downloaded (default MIRROR_TEST_IMAGE)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='registry-speed-')
+    os.environ['MIRROR_STATS_FILE'] = os.path.join(workdir, 'mirror_stats.json')
+    servers = []
+    expected = {}
+    if args.mirror:
+        urls = args.mirror
+    else:
+        rates = [parse_size(rate) for rate in args.rates.split(',')]
+        delays = [float(delay) for delay in args.ttfb.split(',')]
+        urls = []
+        for index, rate in enumerate(rates):
+            server = start_registry_stub(rate, delays[min(index, len(delays) - 1)], auth=index % 2 == 1)
+            servers.append(server)
+            urls.append(f'http://127.0.0.1:{server.server_address[1]}')
+            expected[f'127.0.0.1:{server.server_address[1]}'] = (rate, delays[min(index, len(delays) - 1)])
+        if not args.no_broken:
+            server = start_registry_stub(rates[0], broken=True)
+            servers.append(server)
+            urls.append(f'http://127.0.0.1:{server.server_address[1]}')
+    os.environ['REGISTRY_MIRRORS'] = ','.join(urls)
+
+    from app.services.mirror_service import MirrorService, configured_mirrors
+
+    service = MirrorService()
+    mirrors = configured_mirrors()
+    print(f"{'mirror':<28} {'ok':>3} {'v2 ms':>8} {'manifest ms':>12} {'ttfb ms':>8} {'MB/s':>8} {'MB read':>8}  expected")
+    try:
+        for mirror, url in mirrors.items():
+            sample = service.speed_test(mirror, url, image=args.image, max_bytes=parse_size(args.bytes),
+                                        max_seconds=args.seconds)
+            throughput = f"{sample['throughput'] / 1024 ** 2:.2f}" if sample['throughput'] else '-'
+            note = ''
+            if mirror in expected:
+                rate, delay = expected[mirror]
+                note = f'{rate / 1024 ** 2:.2f} MB/s, ttfb {delay * 1000:.0f} ms'
+            print(f"{mirror:<28} {'yes' if sample['ok'] else 'no':>3} {sample['latency_ms'] or '-':>8} "
+                  f"{sample['manifest_ms'] or '-':>12} {sample['ttfb_ms'] or '-':>8} {throughput:>8} "
+                  f"{sample['bytes'] / 1024 ** 2:>8.2f}  {note or sample['error'] or ''}")
+
+        print('\nranking:')
+        for position, item in enumerate(service.rank(mirrors), 1):
+            print(f"{position}. {item['mirror']} healthy={item['healthy']} throughput={item['throughput']} "
+                  f"ttfb_ms={item['ttfb_ms']} latency_ms={item['latency_ms']}")
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
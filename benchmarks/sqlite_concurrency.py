@@ -0,0 +1,164 @@
+"""SQLite concurrency benchmark.
+
+Runs N deployment writer threads and M reader threads against a temporary
+SQLite database for a fixed time, once with SQLAlchemy's default engine
+(rollback journal, the app's previous behaviour) and once with the engine
+options and connection PRAGMAs from `app.sqlite_engine_options` /
+`app.configure_sqlite_connection` (WAL, synchronous=NORMAL, busy_timeout,
+pool sizing).
+
+Writers follow `execute_deployment`: insert a pending DeploymentLog, mark
+it deploying, wait for the fake compose run, store the output and upsert
+the DeploymentState. Readers poll deployment status and list deployments
+like the UI does. Both runs start from the same number of completed
+deployments (--seed), so readers load the same rows in each mode; without
+it the mode that completes more writes also makes every "latest 50" read
+larger, which shows up as slower reads rather than lock waits.
+
+    python benchmarks/sqlite_concurrency.py --writers 8 --readers 16 --duration 10 --seed 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import db, sqlite_engine_options, configure_sqlite_connection  # noqa: E402
+from app.models.user import DeploymentLog, DeploymentState  # noqa: E402
+
+OUTPUT = 'Container web  Started\n' * 500
+
+
+def make_engine(path, tuned):
+    url = f'sqlite:///{path}'
+    if not tuned:
+        return create_engine(url)
+    engine = create_engine(url, **sqlite_engine_options(url))
+    event.listen(engine, 'connect', configure_sqlite_connection)
+    return engine
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seed(engine, count):
+    """Insert completed deployments so readers start from a table of realistic size"""
+    with Session(engine) as session:
+        session.add_all(DeploymentLog(file_id=1, status='success', command='docker compose up -d', output=OUTPUT,
+                                      completed_at=db.func.current_timestamp()) for _ in range(count))
+        session.commit()
+
+
+def run(tuned, writers, readers, duration, deploy_time, seed_count=0):
+    workdir = tempfile.mkdtemp(prefix='compose-sqlite-')
+    engine = make_engine(os.path.join(workdir, 'bench.db'), tuned)
+    db.metadata.create_all(engine)
+    seed(engine, seed_count)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'write_ops': 0, 'read_ops': 0, 'errors': 0, 'locked': 0, 'write_latency': [], 'read_latency': []}
+
+    def record(kind, started, error=None):
+        with lock:
+            if error is None:
+                results[f'{kind}_ops'] += 1
+                results[f'{kind}_latency'].append(time.perf_counter() - started)
+            else:
+                results['errors'] += 1
+                if 'locked' in str(error):
+                    results['locked'] += 1
+
+    def writer(index):
+        file_path = f'/app/data/local/bench-{index}.yml'
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with Session(engine) as session:
+                    log = DeploymentLog(file_id=1, status='pending', command=f'docker compose -f {file_path} up -d')
+                    session.add(log)
+                    session.commit()
+                    log.status = 'deploying'
+                    session.commit()
+                    time.sleep(deploy_time)
+                    log.status = 'success'
+                    log.output = OUTPUT
+                    log.completed_at = db.func.current_timestamp()
+                    state = session.scalars(select(DeploymentState).filter_by(file_path=file_path)).first()
+                    if not state:
+                        state = DeploymentState(file_path=file_path, config_hash='0' * 64)
+                        session.add(state)
+                    state.container_state = '{}'
+                    session.commit()
+                record('write', started)
+            except Exception as e:
+                record('write', started, e)
+
+    def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with Session(engine) as session:
+                    latest = session.scalars(
+                        select(DeploymentLog).order_by(DeploymentLog.created_at.desc()).limit(50)
+                    ).all()
+                    if latest:
+                        session.get(DeploymentLog, latest[0].id)
+                    session.scalars(select(DeploymentState)).all()
+                record('read', started)
+            except Exception as e:
+                record('read', started, e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        'mode': 'tuned (WAL)' if tuned else 'default',
+        'deploys_per_s': round(results['write_ops'] / duration, 1),
+        'reads_per_s': round(results['read_ops'] / duration, 1),
+        'errors': results['errors'],
+        'locked': results['locked'],
+        'write_p95_ms': round(percentile(results['write_latency'], 0.95) * 1000, 1) if results['write_latency'] else None,
+        'read_p50_ms': round(statistics.median(results['read_latency']) * 1000, 1) if results['read_latency'] else None,
+        'read_p95_ms': round(percentile(results['read_latency'], 0.95) * 1000, 1) if results['read_latency'] else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--deploy-time', type=float, default=0.01, help='seconds each fake compose run takes')
+    parser.add_argument('--seed', type=int, default=200, help='completed deployments inserted before each run')
+    args = parser.parse_args()
+
+    print(f'writers={args.writers} readers={args.readers} duration={args.duration}s seed={args.seed}')
+    columns = ('mode', 'deploys_per_s', 'reads_per_s', 'errors', 'locked', 'write_p95_ms', 'read_p50_ms', 'read_p95_ms')
+    print(' '.join(f'{c:>13}' for c in columns))
+    for tuned in (False, True):
+        row = run(tuned, args.writers, args.readers, args.duration, args.deploy_time, args.seed)
+        print(' '.join(f'{str(row[c]):>13}' for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Startup benchmark.
+
+Measures, in fresh interpreter processes against a temporary database:
+
+* import time of `run` (which builds the app) from `python -X importtime`,
+  with the cumulative time of the heavy third-party packages;
+* time to first request: interpreter start to the first `/health`
+  response through the test client, for a cold start (new database) and a
+  warm start (schema already bootstrapped).
+
+    python benchmarks/startup.py
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_PACKAGES = ('docker', 'yaml', 'requests', 'bcrypt', 'jwt', 'sqlalchemy', 'flask')
+
+FIRST_REQUEST = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import run\n"
+    "imported = time.perf_counter()\n"
+    "response = run.app.test_client().get('/health')\n"
+    "assert response.status_code == 200\n"
+    "done = time.perf_counter()\n"
+    "print(f'{(imported - start) * 1000:.1f} {(done - start) * 1000:.1f}')\n"
+)
+
+
+def make_env(workdir):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "startup.db")}',
+        'SECRET_KEY': 'benchmark-secret',
+        'STATS_SAMPLER_AUTOSTART': 'false'
+    })
+    return env
+
+
+def import_times(env):
+    """Return (total import time of run, {package: cumulative us}) from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import run'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    packages = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if name == 'run':
+            total = cumulative
+        # Top-level imports of a package are the least indented entries for it
+        if name in HEAVY_PACKAGES and (name not in packages or indent <= packages[name][1]):
+            packages[name] = (cumulative, indent)
+    return total, {name: value for name, (value, _) in packages.items()}
+
+
+def first_request(env):
+    result = subprocess.run([sys.executable, '-c', FIRST_REQUEST],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    imported, done = (float(v) for v in result.stdout.split())
+    return imported, done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='warm start runs to take the median of')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='compose-startup-')
+    env = make_env(workdir)
+
+    cold_import, cold_first = first_request(env)
+    warm = [first_request(env) for _ in range(args.runs)]
+    total, packages = import_times(env)
+
+    print(f'cold start (new database):  import run {cold_import:8.1f} ms   first request {cold_first:8.1f} ms')
+    print(f'warm start (median of {args.runs}):  import run {statistics.median(w[0] for w in warm):8.1f} ms   '
+          f'first request {statistics.median(w[1] for w in warm):8.1f} ms')
+    print(f'\n-X importtime: run {total / 1000:.1f} ms cumulative')
+    for name in HEAVY_PACKAGES:
+        value = packages.get(name)
+        print(f'  {name:<12} {"not imported" if value is None else f"{value / 1000:8.1f} ms"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# Gunicorn configuration
+#
+# The default gthread worker serves each request on a thread, so slow
+# GitHub calls, deployment status polling and streaming responses (SSE logs)
+# do not block other requests. Set GUNICORN_WORKER_CLASS=gevent to use
+# greenlets instead (requires the gevent package); gunicorn monkey-patches
+# sockets, threads and subprocess in that mode.
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# The session key (data/.secret_key), the stats sampler, metric history,
+# GitHub rate limits, mirror records and file saves are shared between
+# processes through files under data/, and API token revocations reach other
+# workers within API_TOKEN_CACHE_TTL, so run one worker per CPU (up to 4) and
+# scale further with threads. Some state is still kept per
+# worker process: live deployment progress (other workers fall back to the
+# DeploymentLog row), the login throttle buckets (each worker allows the full
+# LOGIN_*_RATE), the /metrics registry (a scrape sees one worker), the log
+# stream limit and the in-memory config/lint caches. Set GUNICORN_WORKERS=1
+# to keep all of these in a single process.
+workers = int(os.environ.get('GUNICORN_WORKERS', min(cpu_count, 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', min(32, max(8, cpu_count * 4))))
+
+# gevent workers: concurrent greenlets per worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Long enough for docker compose version checks and slow remote calls
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
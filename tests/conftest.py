@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Services pick their data directories when they are imported; keep them out of the working tree
+DATA_DIR = tempfile.mkdtemp(prefix='composeweb-tests-')
+os.environ['DATA_DIR'] = DATA_DIR
+os.environ['METRICS_DATA_DIR'] = os.path.join(DATA_DIR, 'metrics')
+os.environ['STATS_SAMPLER_AUTOSTART'] = 'false'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "app.db"}')
+    monkeypatch.setenv('SECRET_KEY', 'test-secret-' + 'x' * 32)
+    from app import create_app
+
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as the bootstrap admin"""
+    from app.models.user import User
+
+    client = app.test_client()
+    with app.app_context():
+        user = User.query.first()
+        user_id, username = user.id, user.username
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = username
+        session['is_admin'] = True
+    return client
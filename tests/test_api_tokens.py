@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models.user import ApiToken
+from app.services.token_service import TokenService, token_service
+
+
+@pytest.fixture
+def issue(client):
+    def issue(**data):
+        response = client.post('/api/tokens', json=dict({'name': 'ci'}, **data))
+        assert response.status_code == 201
+        body = response.get_json()
+        return body['token'], body['token_info']['id']
+
+    return issue
+
+
+def _bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_token_authenticates_without_a_cookie(app, issue):
+    token, token_id = issue()
+    response = app.test_client().get('/api/tokens', headers=_bearer(token))
+    assert response.status_code == 200
+    assert [item['id'] for item in response.get_json()['tokens']] == [token_id]
+    assert 'Set-Cookie' not in response.headers
+    with app.app_context():
+        assert db.session.get(ApiToken, token_id).last_used_at is not None
+
+
+def test_invalid_tokens_are_rejected(app, issue):
+    token, _ = issue()
+    client = app.test_client()
+    assert client.get('/api/tokens', headers=_bearer(token + 'x')).status_code == 401
+    assert client.get('/api/tokens', headers=_bearer('not-a-jwt')).status_code == 401
+    with app.app_context():
+        assert TokenService().verify('another-secret-' + 'x' * 32, token) is None
+
+
+def test_tokens_cannot_issue_tokens(app, issue):
+    token, _ = issue()
+    response = app.test_client().post('/api/tokens', json={'name': 'nested'}, headers=_bearer(token))
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize('data', [{'name': ' '}, {'expires_in_days': 0}, {'expires_in_days': '7'}])
+def test_issue_validates_input(client, data):
+    assert client.post('/api/tokens', json=dict({'name': 'ci'}, **data)).status_code == 400
+
+
+def test_revoked_token_stops_working(app, client, issue):
+    token, token_id = issue()
+    api = app.test_client()
+    assert api.get('/api/tokens', headers=_bearer(token)).status_code == 200
+    assert client.delete(f'/api/tokens/{token_id}').status_code == 200
+    # The revoking process drops its cached verification right away
+    assert api.get('/api/tokens', headers=_bearer(token)).status_code == 401
+    assert client.delete('/api/tokens/9999').status_code == 404
+
+
+def test_other_workers_see_revocation_after_cache_ttl(app, issue):
+    token, token_id = issue()
+    other = TokenService()
+    other.cache_ttl = 0
+    with app.app_context():
+        assert other.verify(app.secret_key, token)['api_token_id'] == token_id
+        token_service.revoke(db.session.get(ApiToken, token_id))
+        assert other.verify(app.secret_key, token) is None
+
+
+def test_expired_token_is_rejected(app, issue):
+    token, token_id = issue(expires_in_days=1)
+    with app.app_context():
+        record = db.session.get(ApiToken, token_id)
+        record.expires_at = datetime.utcnow() - timedelta(minutes=1)
+        db.session.commit()
+        assert TokenService().verify(app.secret_key, token) is None
+
+
+def test_verification_is_cached(app, issue):
+    token, _ = issue()
+    service = TokenService()
+    with app.app_context():
+        first = service.verify(app.secret_key, token)
+        assert service.verify(app.secret_key, token) == first
+    assert (service.hits, service.misses) == (1, 1)
+    assert service.stats()['entries'] == 1
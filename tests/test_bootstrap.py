@@ -0,0 +1,61 @@
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import app as app_package
+from app import SCHEMA_VERSION, create_app, db
+from tests.conftest import ROOT
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = tmp_path / 'app.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{path}')
+    monkeypatch.setenv('SECRET_KEY', 'test-secret')
+    return str(path)
+
+
+def _users(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT username, is_admin FROM user').fetchall()
+
+
+def test_bootstrap_sets_schema_version_and_admin(database):
+    create_app()
+    with sqlite3.connect(database) as connection:
+        assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert _users(database) == [('admin', 1)]
+
+
+def test_bootstrap_is_skipped_at_current_version(database, monkeypatch):
+    create_app()
+    # A new process only reads user_version and does not touch the schema
+    monkeypatch.setattr(app_package, '_bootstrapped_databases', set())
+    monkeypatch.setattr(db, 'create_all', lambda: pytest.fail('create_all called again'))
+    create_app()
+    assert _users(database) == [('admin', 1)]
+
+
+def test_bootstrap_adds_missing_columns(database):
+    with sqlite3.connect(database) as connection:
+        connection.execute('CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(100) NOT NULL UNIQUE, '
+                           'password VARCHAR(255) NOT NULL, is_admin BOOLEAN, created_at DATETIME)')
+        connection.execute("INSERT INTO user (username, password, is_admin) VALUES ('admin', 'x', 1)")
+    create_app()
+    with sqlite3.connect(database) as connection:
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(user)')}
+        assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert 'last_login' in columns
+    assert _users(database) == [('admin', 1)]
+
+
+def test_workers_starting_together_bootstrap_once(database):
+    # Each gunicorn worker calls create_app on the same fresh database
+    workers = [subprocess.Popen([sys.executable, '-c', 'from app import create_app; create_app()'], cwd=ROOT,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT) for _ in range(4)]
+    for worker in workers:
+        output = worker.communicate(timeout=60)[0].decode('utf-8', 'replace')
+        assert worker.returncode == 0, output
+    assert _users(database) == [('admin', 1)]
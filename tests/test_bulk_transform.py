@@ -0,0 +1,99 @@
+from app.services.bulk_transform import BulkTransformService
+
+COMMENTED = """\
+services:
+  web:
+    image: nginx:1.25
+    environment:
+      - A=1
+  # cache
+  redis:
+    image: redis:7
+"""
+
+OPERATIONS = [
+    {'op': 'rewrite_registry', 'mirror': 'docker.1ms.run'},
+    {'op': 'set', 'path': 'services.*.restart', 'value': 'unless-stopped'},
+    {'op': 'set_env', 'name': 'TZ', 'value': 'Asia/Shanghai'}
+]
+
+
+def _data_dir(tmp_path):
+    (tmp_path / 'local').mkdir()
+    (tmp_path / 'local' / 'app.yml').write_text(COMMENTED, encoding='utf-8')
+    (tmp_path / 'local' / 'notes.txt').write_text('not compose', encoding='utf-8')
+    return tmp_path
+
+
+def test_dry_run_diff_keeps_comment_before_next_service(tmp_path):
+    data_dir = _data_dir(tmp_path)
+    success, report = BulkTransformService(str(data_dir)).run(OPERATIONS)
+    assert success
+    assert (report['total_files'], report['changed'], report['failed']) == (1, 1, 0)
+    assert report['files'][0]['diff'] == """\
+--- a/local/app.yml
++++ b/local/app.yml
+@@ -1,8 +1,13 @@
+ services:
+   web:
+-    image: nginx:1.25
++    image: docker.1ms.run/library/nginx:1.25
+     environment:
+       - A=1
++      - TZ=Asia/Shanghai
++    restart: unless-stopped
+   # cache
+   redis:
+-    image: redis:7
++    image: docker.1ms.run/library/redis:7
++    restart: unless-stopped
++    environment:
++      TZ: Asia/Shanghai
+"""
+    assert (data_dir / 'local' / 'app.yml').read_text(encoding='utf-8') == COMMENTED
+
+
+def test_write_then_rerun_is_unchanged(tmp_path):
+    data_dir = _data_dir(tmp_path)
+    service = BulkTransformService(str(data_dir))
+    success, report = service.run(OPERATIONS, dry_run=False)
+    assert success and report['changed'] == 1
+    assert '    restart: unless-stopped\n  # cache\n  redis:\n' in (data_dir / 'local' / 'app.yml').read_text(encoding='utf-8')
+
+    success, report = service.run(OPERATIONS, dry_run=False)
+    assert success and (report['changed'], report['unchanged']) == (0, 1)
+
+
+def test_invalid_operations_are_rejected(tmp_path):
+    success, error = BulkTransformService(str(_data_dir(tmp_path))).run([{'op': 'rename'}])
+    assert not success
+    assert 'op' in error
+
+
+def test_missing_data_dir_matches_nothing(tmp_path):
+    success, report = BulkTransformService(str(tmp_path / 'missing')).run(OPERATIONS)
+    assert success
+    assert (report['total_files'], report['files']) == (0, [])
+
+
+def test_workers_are_capped_by_configuration(tmp_path, monkeypatch):
+    monkeypatch.setenv('BULK_TRANSFORM_WORKERS', '2')
+    monkeypatch.setenv('BULK_TRANSFORM_MIN_PARALLEL', '1000')
+    data_dir = _data_dir(tmp_path)
+    for index in range(5):
+        (data_dir / 'local' / f'app{index}.yml').write_text(COMMENTED, encoding='utf-8')
+    service = BulkTransformService(str(data_dir))
+    assert service.run(OPERATIONS, workers=500)[1]['workers'] == 1
+
+    # Below the parallel threshold everything runs in-process; above it the pool is capped
+    service.min_parallel_files = 1
+    calls = []
+    monkeypatch.setattr(service, '_run_parallel', lambda files, operations, dry_run, workers:
+                        calls.append(workers) or [])
+    service.run(OPERATIONS, workers=500)
+    assert calls == [2]
+
+
+def test_route_rejects_invalid_workers(client):
+    response = client.post('/api/files/bulk-transform', json={'operations': OPERATIONS, 'workers': 0})
+    assert response.status_code == 400
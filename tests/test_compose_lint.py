@@ -0,0 +1,181 @@
+import pytest
+
+from app.services.compose_lint import ComposeLinter, _Interpolation, load_env_file
+
+
+def interpolate(text, **variables):
+    interpolation = _Interpolation(variables)
+    return interpolation.interpolate(text, ['services', 'web', 'image']), interpolation
+
+
+@pytest.mark.parametrize('text, variables, expected', [
+    ('$TAG', {'TAG': '1.25'}, '1.25'),
+    ('${TAG}', {'TAG': '1.25'}, '1.25'),
+    ('nginx:${TAG}-alpine', {'TAG': '1.25'}, 'nginx:1.25-alpine'),
+    ('$$HOME', {'HOME': '/root'}, '$HOME'),
+    ('$${TAG}', {'TAG': '1.25'}, '${TAG}'),
+    ('price $5', {}, 'price $5'),
+    ('end $', {}, 'end $'),
+    ('${TAG:-latest}', {}, 'latest'),
+    ('${TAG:-latest}', {'TAG': ''}, 'latest'),
+    ('${TAG-latest}', {'TAG': ''}, ''),
+    ('${TAG-latest}', {}, 'latest'),
+    ('${TAG:+set}', {'TAG': '1'}, 'set'),
+    ('${TAG:+set}', {'TAG': ''}, ''),
+    ('${TAG+set}', {'TAG': ''}, 'set'),
+    ('${TAG+set}', {}, ''),
+    ('${TAG:-${FALLBACK:-stable}}', {}, 'stable'),
+    ('${TAG:-${FALLBACK}}', {'FALLBACK': '2'}, '2'),
+])
+def test_interpolate(text, variables, expected):
+    value, interpolation = interpolate(text, **variables)
+    assert value == expected
+    assert interpolation.errors == []
+
+
+def test_unset_variable_is_a_warning():
+    value, interpolation = interpolate('nginx:${TAG}')
+    assert value == 'nginx:'
+    assert interpolation.errors == []
+    assert interpolation.missing == {'TAG'}
+    assert interpolation.warnings == [{'path': 'services.web.image', 'variable': 'TAG',
+                                       'message': '变量 TAG 未设置，将使用空字符串'}]
+
+
+@pytest.mark.parametrize('text, variables', [
+    ('${TAG:?tag is required}', {}),
+    ('${TAG:?tag is required}', {'TAG': ''}),
+    ('${TAG?tag is required}', {}),
+])
+def test_required_variable_is_an_error(text, variables):
+    value, interpolation = interpolate(text, **variables)
+    assert value == ''
+    assert interpolation.missing == {'TAG'}
+    assert interpolation.errors == [{'path': 'services.web.image', 'variable': 'TAG',
+                                     'message': '必需的变量 TAG 没有值: tag is required'}]
+
+
+def test_required_variable_allows_empty_without_colon():
+    value, interpolation = interpolate('${TAG?tag is required}', TAG='')
+    assert value == ''
+    assert interpolation.errors == []
+
+
+@pytest.mark.parametrize('text', ['${TAG', '${}', '${TAG/x}', '${1TAG}'])
+def test_invalid_interpolation(text):
+    _, interpolation = interpolate(text)
+    assert len(interpolation.errors) == 1
+    assert interpolation.errors[0]['message'].startswith('插值格式无效')
+
+
+def test_walk_keeps_non_string_values():
+    interpolation = _Interpolation({'PORT': '8080'})
+    document = {'services': {'web': {'ports': ['${PORT}:80'], 'tty': True, 'cpus': 0.5}}}
+    assert interpolation.walk(document, []) == {'services': {'web': {'ports': ['8080:80'], 'tty': True,
+                                                                     'cpus': 0.5}}}
+
+
+def test_load_env_file(tmp_path):
+    env = tmp_path / '.env'
+    env.write_text('# comment\n'
+                   '\n'
+                   'export TAG=1.25\n'
+                   'PLAIN=value # trailing\n'
+                   'HASH=a#b\n'
+                   'DOUBLE="line\\nbreak # kept"\n'
+                   "SINGLE='$raw\\n'\n"
+                   'EMPTY=\n'
+                   'not a variable\n'
+                   '1BAD=x\n', encoding='utf-8')
+    assert load_env_file(str(env)) == {'TAG': '1.25', 'PLAIN': 'value', 'HASH': 'a#b',
+                                       'DOUBLE': 'line\nbreak # kept', 'SINGLE': '$raw\\n', 'EMPTY': ''}
+
+
+def test_load_env_file_missing(tmp_path):
+    assert load_env_file(str(tmp_path / '.env')) == {}
+
+
+def test_lint_uses_project_env_file(tmp_path, monkeypatch):
+    monkeypatch.delenv('LINT_TEST_TAG', raising=False)
+    (tmp_path / '.env').write_text('LINT_TEST_TAG=1.25\n', encoding='utf-8')
+    content = 'services:\n  web:\n    image: nginx:${LINT_TEST_TAG}\n'
+
+    result = ComposeLinter().lint(content, str(tmp_path))
+    assert result['valid'] is True
+    assert result['warnings'] == []
+
+    result = ComposeLinter().lint(content)
+    assert result['valid'] is True
+    assert result['missing_variables'] == ['LINT_TEST_TAG']
+
+
+def test_lint_caches_by_content_and_variables(tmp_path, monkeypatch):
+    monkeypatch.delenv('LINT_TEST_TAG', raising=False)
+    linter = ComposeLinter()
+    content = 'services:\n  web:\n    image: nginx:${LINT_TEST_TAG:-1.25}\n'
+
+    assert linter.lint(content)['cached'] is False
+    assert linter.lint(content)['cached'] is True
+    monkeypatch.setenv('LINT_TEST_TAG', '1.27')
+    assert linter.lint(content)['cached'] is False
+    assert linter.stats() == {'entries': 2, 'limit': linter.cache_size}
+
+
+def test_lint_cache_ignores_unreferenced_variables(tmp_path, monkeypatch):
+    linter = ComposeLinter()
+    content = 'services:\n  web:\n    image: nginx:${LINT_TEST_TAG:-1.25}\n'
+    (tmp_path / '.env').write_text('LINT_TEST_TAG=1.26\n', encoding='utf-8')
+
+    assert linter.lint(content, str(tmp_path))['cached'] is False
+    monkeypatch.setenv('LINT_TEST_UNRELATED', 'x')
+    (tmp_path / '.env').write_text('LINT_TEST_TAG=1.26\nOTHER=1\n', encoding='utf-8')
+    assert linter.lint(content, str(tmp_path))['cached'] is True
+    (tmp_path / '.env').write_text('LINT_TEST_TAG=\n', encoding='utf-8')
+    assert linter.lint(content, str(tmp_path))['cached'] is False
+
+
+def test_lint_cache_tracks_variables_of_nested_defaults(monkeypatch):
+    monkeypatch.setenv('LINT_TEST_A', 'a')
+    monkeypatch.delenv('LINT_TEST_B', raising=False)
+    linter = ComposeLinter()
+    content = 'services:\n  web:\n    image: ${LINT_TEST_A:-${LINT_TEST_B}}\n'
+
+    assert linter.lint(content)['warnings'] == []
+    monkeypatch.setenv('LINT_TEST_A', '')
+    assert linter.lint(content)['missing_variables'] == ['LINT_TEST_B']
+    monkeypatch.setenv('LINT_TEST_B', 'b')
+    result = linter.lint(content)
+    assert result['cached'] is False and result['missing_variables'] == []
+
+
+def test_lint_service_errors():
+    result = ComposeLinter().lint('services:\n'
+                                  '  web:\n'
+                                  '    image: nginx\n'
+                                  '    depends_on:\n'
+                                  '      - db\n'
+                                  '  worker:\n'
+                                  '    command: run\n')
+    assert result['valid'] is False
+    assert {'path': 'services.web.depends_on', 'message': '服务 web 依赖的服务 db 不存在'} in result['errors']
+    assert {'path': 'services.worker', 'message': '服务 worker 没有指定 image 或 build'} in result['errors']
+
+
+@pytest.mark.parametrize('content, path', [
+    ('services:\n  web:\n    image: nginx\n    ports: 80\n', 'services.web.ports'),
+    ('services:\n  web:\n    image: nginx\n    restart_policy: always\n', 'services.web'),
+])
+def test_lint_schema_errors(content, path):
+    result = ComposeLinter().lint(content)
+    assert result['valid'] is False
+    assert [error['path'] for error in result['errors']] == [path]
+
+
+@pytest.mark.parametrize('content, message', [
+    ('services: [', 'YAML 格式错误'),
+    ('- web', 'compose 文件的顶层必须是映射'),
+])
+def test_lint_rejects_non_compose_documents(content, message):
+    result = ComposeLinter().lint(content)
+    assert result['valid'] is False
+    assert result['errors'][0]['message'].startswith(message)
@@ -0,0 +1,100 @@
+import pytest
+
+from app.services.compose_service import ComposeService, rewrite_image, split_image
+
+BASE = """
+services:
+  db:
+    image: postgres:16
+  web:
+    image: nginx:1.25
+    depends_on:
+      - db
+  worker:
+    image: app:1
+    depends_on:
+      db:
+        condition: service_healthy
+"""
+
+
+@pytest.fixture
+def service():
+    return ComposeService('v2')
+
+
+def test_changed_services_only_changed(service):
+    new = BASE.replace('nginx:1.25', 'nginx:1.27')
+    assert service.changed_services(BASE, new) == ['web']
+
+
+def test_changed_services_includes_dependents(service):
+    new = BASE.replace('postgres:16', 'postgres:17')
+    assert service.changed_services(BASE, new) == ['db', 'web', 'worker']
+
+
+def test_changed_services_added_service(service):
+    new = BASE + "  cache:\n    image: redis:7\n"
+    assert service.changed_services(BASE, new) == ['cache']
+
+
+def test_changed_services_nothing_changed(service):
+    assert service.changed_services(BASE, BASE) is None
+
+
+def test_changed_services_removed_service_needs_full_deploy(service):
+    new = BASE.split('  worker:')[0]
+    assert service.changed_services(BASE, new) is None
+
+
+def test_changed_services_top_level_change_needs_full_deploy(service):
+    new = BASE + "networks:\n  default:\n    name: other\n"
+    assert service.changed_services(BASE, new) is None
+
+
+@pytest.mark.parametrize('definition', ['"just a string"', '[a, b]'])
+def test_changed_services_invalid_service_needs_full_deploy(service, definition):
+    new = BASE + f"  broken: {definition}\n"
+    assert service.changed_services(BASE, new) is None
+
+
+def test_changed_services_invalid_depends_on_needs_full_deploy(service):
+    new = BASE.replace('      - db\n', '').replace('    depends_on:\n  worker', '    depends_on: db\n  worker')
+    assert 'depends_on: db' in new
+    assert service.changed_services(BASE, new) is None
+
+
+def test_changed_services_invalid_yaml(service):
+    assert service.changed_services(BASE, 'services: [') is None
+
+
+@pytest.mark.parametrize('image, expected', [
+    ('nginx', ('docker.io', 'library/nginx', '')),
+    ('nginx:1.25', ('docker.io', 'library/nginx', ':1.25')),
+    ('bitnami/redis:7', ('docker.io', 'bitnami/redis', ':7')),
+    ('docker.io/nginx', ('docker.io', 'library/nginx', '')),
+    ('index.docker.io/library/nginx:1.25', ('docker.io', 'library/nginx', ':1.25')),
+    ('ghcr.io/org/app@sha256:abc', ('ghcr.io', 'org/app', '@sha256:abc')),
+    ('localhost/app:dev', ('localhost', 'app', ':dev')),
+    ('registry.local:5000/team/app:1', ('registry.local:5000', 'team/app', ':1')),
+    ('nginx:1.25@sha256:abc', ('docker.io', 'library/nginx', ':1.25@sha256:abc')),
+])
+def test_split_image(image, expected):
+    assert split_image(image) == expected
+
+
+@pytest.mark.parametrize('image, expected', [
+    ('nginx:1.25', 'docker.1ms.run/library/nginx:1.25'),
+    ('docker.io/bitnami/redis', 'docker.1ms.run/bitnami/redis'),
+    ('ghcr.io/org/app:1', 'ghcr.io/org/app:1'),
+    ('docker.1ms.run/library/nginx:1.25', 'docker.1ms.run/library/nginx:1.25'),
+    ('${IMAGE:-nginx}', '${IMAGE:-nginx}'),
+    ('', ''),
+])
+def test_rewrite_image(image, expected):
+    assert rewrite_image(image, 'https://docker.1ms.run/') == expected
+
+
+def test_rewrite_image_other_registries():
+    assert rewrite_image('ghcr.io/org/app:1', 'mirror.local', registries=('ghcr.io',)) == 'mirror.local/org/app:1'
+    assert rewrite_image('nginx', 'mirror.local', registries=('ghcr.io',)) == 'nginx'
@@ -0,0 +1,104 @@
+import threading
+
+from app.services.docker_service import DockerService
+
+
+class _Stream:
+    def __init__(self, chunks, wait=None):
+        self.chunks = chunks
+        self.wait = wait
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.wait:
+                self.wait.wait(5)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def _lines(**streams):
+    lines = list(DockerService()._iter_log_lines(streams))
+    assert all(stream.closed for stream in streams.values())
+    return lines
+
+
+def test_iter_log_lines_joins_chunks_into_lines():
+    assert _lines(stdout=_Stream([b'one\ntw', b'o\n'])) == [('stdout', 'one'), ('stdout', 'two')]
+
+
+def test_iter_log_lines_keeps_streams_apart():
+    lines = _lines(stdout=_Stream([b'one\ntw', b'o\n']), stderr=_Stream([b'err', b'or\n']))
+    assert [line for name, line in lines if name == 'stdout'] == ['one', 'two']
+    assert [line for name, line in lines if name == 'stderr'] == ['error']
+
+
+def test_iter_log_lines_keeps_multibyte_characters_split_across_chunks():
+    data = '部署完成\n'.encode('utf-8')
+    assert _lines(stdout=_Stream([data[:4], data[4:]])) == [('stdout', '部署完成')]
+
+
+def test_iter_log_lines_flushes_last_partial_line():
+    data = '日志'.encode('utf-8')
+    assert _lines(stderr=_Stream([data[:2], data[2:]])) == [('stderr', '日志')]
+
+
+def test_iter_log_lines_closes_streams_when_client_goes_away():
+    release = threading.Event()
+    streams = {'stdout': _Stream([b'first\n'] + [b'more\n'] * 100), 'stderr': _Stream([b'late\n'], wait=release)}
+    lines = DockerService()._iter_log_lines(streams)
+    assert next(lines) == ('stdout', 'first')
+    lines.close()
+    release.set()
+    assert all(stream.closed for stream in streams.values())
+
+
+class _Container:
+    id = 'abc'
+
+    def __init__(self, tty=False):
+        self.attrs = {'Config': {'Tty': tty}}
+        self.calls = []
+
+    def logs(self, **kwargs):
+        self.calls.append(kwargs)
+        return _Stream([b'x\n'])
+
+
+def _open(container, **kwargs):
+    service = DockerService()
+
+    class Containers:
+        @staticmethod
+        def get(container_id):
+            return container
+
+    class Client:
+        containers = Containers
+
+    service._client = Client()
+    return service.open_log_stream('abc', **kwargs)
+
+
+def test_open_log_stream_opens_one_public_stream_per_channel():
+    container = _Container()
+    success, lines = _open(container, follow=True, since=10, tail=5, timestamps=True)
+    assert success
+    assert sorted(list(lines)) == [('stderr', 'x'), ('stdout', 'x')]
+    assert container.calls == [
+        {'stream': True, 'follow': True, 'since': 10, 'until': None, 'tail': 5, 'timestamps': True,
+         'stdout': True, 'stderr': False},
+        {'stream': True, 'follow': True, 'since': 10, 'until': None, 'tail': 5, 'timestamps': True,
+         'stdout': False, 'stderr': True},
+    ]
+
+
+def test_open_log_stream_reads_tty_containers_once():
+    container = _Container(tty=True)
+    success, lines = _open(container)
+    assert success
+    assert list(lines) == [('stdout', 'x')]
+    assert len(container.calls) == 1
+    assert container.calls[0]['stdout'] is True and container.calls[0]['stderr'] is True
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.routes import github as github_routes
+from app.services.file_service import content_hash, file_hash, file_lock, write_file_atomic
+
+
+def test_write_file_atomic_skips_unchanged_content(tmp_path):
+    path = tmp_path / 'app.yml'
+    assert write_file_atomic(str(path), 'a: 1\n') == (True, content_hash('a: 1\n'))
+    os.utime(path, (1000, 1000))
+    assert write_file_atomic(str(path), 'a: 1\n') == (False, content_hash('a: 1\n'))
+    assert os.stat(path).st_mtime == 1000
+
+
+def test_write_file_atomic_replaces_content_and_keeps_mode(tmp_path):
+    path = tmp_path / 'local' / 'app.yml'
+    write_file_atomic(str(path), 'a: 1\n')
+    os.chmod(path, 0o600)
+    assert write_file_atomic(str(path), 'a: 2\n')[0] is True
+    assert path.read_text(encoding='utf-8') == 'a: 2\n'
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.listdir(path.parent) == ['app.yml']
+
+
+def test_file_hash(tmp_path):
+    path = tmp_path / 'app.yml'
+    assert file_hash(str(path)) is None
+    path.write_bytes('名称: 1\n'.encode('utf-8'))
+    assert file_hash(str(path)) == content_hash('名称: 1\n')
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / 'app.yml')
+    events = []
+
+    def hold(name):
+        with file_lock(path):
+            events.append(f'{name} in')
+            time.sleep(0.05)
+            events.append(f'{name} out')
+
+    threads = [threading.Thread(target=hold, args=(name,)) for name in 'ab']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert events in (['a in', 'a out', 'b in', 'b out'], ['b in', 'b out', 'a in', 'a out'])
+    assert os.path.exists(tmp_path / '.app.yml.lock')
+
+
+@pytest.fixture
+def compose_file(tmp_path):
+    path = tmp_path / 'app.yml'
+    path.write_text('services: {}\n', encoding='utf-8')
+    return str(path)
+
+
+def test_update_file_rejects_stale_version(client, compose_file):
+    current = content_hash('services: {}\n')
+    response = client.post('/api/github/update-file', json={'file_path': compose_file, 'content': 'a: 1\n',
+                                                            'base_hash': content_hash('old')})
+    assert response.status_code == 412
+    assert response.get_json()['content_hash'] == current
+    assert response.headers['ETag'] == f'"{current}"'
+
+    response = client.post('/api/github/update-file', json={'file_path': compose_file, 'content': 'a: 1\n'},
+                           headers={'If-Match': f'"{content_hash("old")}"'})
+    assert response.status_code == 412
+
+
+def test_update_file_with_current_version(client, compose_file):
+    response = client.post('/api/github/update-file', json={'file_path': compose_file, 'content': 'a: 1\n',
+                                                            'base_hash': content_hash('services: {}\n')})
+    assert response.status_code == 200
+    assert response.get_json()['changed'] is True
+    assert open(compose_file, encoding='utf-8').read() == 'a: 1\n'
+
+
+def test_concurrent_saves_of_the_same_version_do_not_both_win(app, compose_file, monkeypatch):
+    write = github_routes.write_file_atomic
+
+    def slow_write(file_path, content):
+        time.sleep(0.2)
+        return write(file_path, content)
+
+    monkeypatch.setattr(github_routes, 'write_file_atomic', slow_write)
+    base_hash = content_hash('services: {}\n')
+    statuses = []
+
+    def save(content):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+        response = client.post('/api/github/update-file', json={'file_path': compose_file, 'content': content,
+                                                                'base_hash': base_hash})
+        statuses.append((response.status_code, content))
+
+    threads = [threading.Thread(target=save, args=(f'a: {index}\n',)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert sorted(status for status, _ in statuses) == [200, 412]
+    winner = next(content for status, content in statuses if status == 200)
+    assert open(compose_file, encoding='utf-8').read() == winner
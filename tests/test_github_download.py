@@ -0,0 +1,137 @@
+import hashlib
+import os
+
+import pytest
+import requests
+
+from app.services import github_service, rate_limit
+from app.services.github_service import GithubService
+from app.services.rate_limit import RateLimitStore
+
+CONTENT = b'services:\n  web:\n    image: nginx\n' * 100
+
+
+def _blob_sha(content):
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+
+class _Response:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {}
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} Error')
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class _Session:
+    def __init__(self):
+        self.files = {}
+
+    def request(self, method, url, **kwargs):
+        assert kwargs['stream'] is True
+        content = self.files.get(url)
+        return _Response(content) if content is not None else _Response(b'Not Found', 404)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = _Session()
+    session.files['https://raw.example.com/app.yml'] = CONTENT
+    monkeypatch.setattr(github_service, '_get_session', lambda: session)
+    return session
+
+
+@pytest.fixture
+def service(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'rate_limit_store', RateLimitStore(str(tmp_path / 'limits.json')))
+    monkeypatch.setenv('DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setenv('GITHUB_DOWNLOAD_CHUNK_SIZE', '256')
+    return GithubService(token='')
+
+
+def _download(service, **kwargs):
+    return service.download_file('https://raw.example.com/app.yml', 'fnOS', 'app.yml', **kwargs)
+
+
+def _directory(service):
+    return os.path.join(service.base_data_path, 'fnOS')
+
+
+def test_verified_download_replaces_the_file(service):
+    success, result = _download(service, expected_size=len(CONTENT), expected_sha=_blob_sha(CONTENT))
+    assert success, result
+    assert result == {'file_path': os.path.join(_directory(service), 'app.yml'), 'size': len(CONTENT),
+                      'sha': _blob_sha(CONTENT), 'changed': True}
+    with open(result['file_path'], 'rb') as f:
+        assert f.read() == CONTENT
+    assert os.stat(result['file_path']).st_mode & 0o777 == 0o644
+    assert os.listdir(_directory(service)) == ['app.yml']
+
+
+def test_sha_is_computed_without_an_expected_size(service):
+    success, result = _download(service)
+    assert success and result['sha'] == _blob_sha(CONTENT)
+
+
+def test_unchanged_file_is_left_alone(service):
+    path = os.path.join(_directory(service), 'app.yml')
+    os.makedirs(_directory(service))
+    with open(path, 'wb') as f:
+        f.write(CONTENT)
+    os.utime(path, (1000, 1000))
+    success, result = _download(service, expected_size=len(CONTENT))
+    assert success and result['changed'] is False
+    assert os.stat(path).st_mtime == 1000 and os.listdir(_directory(service)) == ['app.yml']
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'expected_sha': '0' * 40}, '文件校验失败'),
+    ({'expected_size': len(CONTENT) + 1}, '文件大小不符'),
+])
+def test_mismatched_download_keeps_the_original(service, kwargs, message):
+    path = os.path.join(_directory(service), 'app.yml')
+    os.makedirs(_directory(service))
+    with open(path, 'wb') as f:
+        f.write(b'original')
+    success, result = _download(service, **kwargs)
+    assert not success and result['error'].startswith(message)
+    with open(path, 'rb') as f:
+        assert f.read() == b'original'
+    assert os.listdir(_directory(service)) == ['app.yml']
+
+
+def test_oversized_download_is_aborted(service):
+    service.download_max_bytes = 1024
+    success, result = _download(service)
+    assert not success and '1024' in result['error']
+    assert os.listdir(_directory(service)) == []
+
+
+@pytest.mark.parametrize('filename', ['', '..', '../app.yml', 'fnOS/app.yml'])
+def test_invalid_filenames_are_rejected(service, filename):
+    assert service.download_file('https://raw.example.com/app.yml', 'fnOS', filename) == (False, {'error': '无效的文件名'})
+
+
+def test_download_files_keeps_order(service, session):
+    session.files['https://raw.example.com/b.yml'] = b'b: 1\n'
+    results = service.download_files([
+        {'download_url': 'https://raw.example.com/b.yml', 'system_type': 'fnOS', 'filename': 'b.yml', 'size': 5},
+        {'download_url': 'https://raw.example.com/missing.yml', 'system_type': 'fnOS', 'filename': 'missing.yml'},
+        {'download_url': 'https://raw.example.com/app.yml', 'system_type': 'fnOS', 'filename': 'app.yml',
+         'sha': _blob_sha(CONTENT)},
+    ])
+    assert [success for success, _ in results] == [True, False, True]
+    assert results[0][1]['sha'] == _blob_sha(b'b: 1\n')
+    assert results[1][1]['error'].startswith('文件下载失败')
+    assert sorted(os.listdir(_directory(service))) == ['app.yml', 'b.yml']
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from app.services import github_service, rate_limit
+from app.services.github_service import GithubService
+from app.services.rate_limit import RateLimitExceeded, RateLimitStore
+
+API = 'https://api.github.com'
+
+
+class _Response:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.headers = headers or {}
+        self.closed = False
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        self.closed = True
+
+
+class _Session:
+    def __init__(self):
+        self.replies = []
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        return self.replies.pop(0)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    session = _Session()
+    monkeypatch.setattr(github_service, '_get_session', lambda: session)
+    monkeypatch.setattr(github_service, '_response_cache', github_service.OrderedDict())
+    monkeypatch.setattr(rate_limit, 'rate_limit_store', RateLimitStore(str(tmp_path / 'limits.json')))
+    monkeypatch.setenv('GITHUB_API_URL', API)
+    return session
+
+
+def test_not_modified_reuses_cached_body(session):
+    service = GithubService(token='t1')
+    url = f'{API}/repos/o/r/contents'
+    first = _Response(200, [{'name': 'a.yml'}], {'ETag': '"v1"', 'X-RateLimit-Remaining': '10'})
+    session.replies = [first, _Response(304, headers={'X-RateLimit-Remaining': '10'})]
+
+    assert service._request('GET', url).json() == [{'name': 'a.yml'}]
+    cached = service._request('GET', url)
+    assert session.requests[1][2]['headers']['If-None-Match'] == '"v1"'
+    assert session.requests[1][2]['headers']['Authorization'] == 'Bearer t1'
+    assert cached.status_code == 200 and cached.json() == [{'name': 'a.yml'}]
+    # Only the ETag and the body are kept, not the response and its connection
+    entry, = github_service._response_cache.values()
+    assert entry is not first and not hasattr(entry, 'raw')
+    cached.json()[0]['name'] = 'changed'
+    assert cached.json() == [{'name': 'a.yml'}]
+
+
+def test_cache_is_keyed_on_the_token(session):
+    url = f'{API}/repos/o/r/contents'
+    session.replies = [_Response(200, ['t1'], {'ETag': '"v1"'}), _Response(200, ['t2'], {'ETag': '"v2"'})]
+    GithubService(token='t1')._request('GET', url)
+    assert GithubService(token='t2')._request('GET', url).json() == ['t2']
+    assert 'If-None-Match' not in session.requests[1][2]['headers']
+    assert all('t1' not in str(key) for key in github_service._response_cache)
+
+
+def test_exhausted_budget_serves_cache_or_raises(session):
+    url = f'{API}/repos/o/r/contents'
+    session.replies = [_Response(200, ['a'], {'ETag': '"v1"', 'X-RateLimit-Remaining': '0',
+                                              'X-RateLimit-Limit': '60', 'X-RateLimit-Reset': '9999999999'})]
+    service = GithubService(token='t1')
+    service._request('GET', url)
+    assert service._request('GET', url).json() == ['a']
+    with pytest.raises(RateLimitExceeded):
+        service._request('GET', f'{API}/repos/o/r/commits')
+    assert len(session.requests) == 1
+
+
+def test_token_is_only_sent_to_github_hosts(session):
+    service = GithubService(token='t1')
+    assert service._auth_headers('https://raw.githubusercontent.com/o/r/main/a.yml') == {'Authorization': 'Bearer t1'}
+    assert service._auth_headers('https://example.com/a.yml') == {}
+    assert GithubService(token='')._auth_headers(f'{API}/repos') == {}
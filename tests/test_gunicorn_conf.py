@@ -0,0 +1,38 @@
+import os
+import runpy
+
+import pytest
+
+from tests.conftest import ROOT
+
+CONFIG = os.path.join(ROOT, 'gunicorn.conf.py')
+
+
+@pytest.fixture
+def load(monkeypatch):
+    for name in list(os.environ):
+        if name.startswith('GUNICORN_'):
+            monkeypatch.delenv(name)
+
+    def load(cpu_count, **env):
+        monkeypatch.setattr('multiprocessing.cpu_count', lambda: cpu_count)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return runpy.run_path(CONFIG)
+
+    return load
+
+
+@pytest.mark.parametrize('cpu_count, workers, threads', [(1, 1, 8), (2, 2, 8), (4, 4, 16), (16, 4, 32)])
+def test_defaults_scale_with_cpu_count(load, cpu_count, workers, threads):
+    config = load(cpu_count)
+    assert (config['workers'], config['threads']) == (workers, threads)
+    assert config['worker_class'] == 'gthread'
+    assert config['bind'] == '0.0.0.0:5000'
+
+
+def test_environment_overrides(load):
+    config = load(8, GUNICORN_WORKERS='1', GUNICORN_THREADS='4', GUNICORN_WORKER_CLASS='gevent',
+                  GUNICORN_TIMEOUT='30', GUNICORN_ACCESSLOG='-')
+    assert (config['workers'], config['threads'], config['worker_class']) == (1, 4, 'gevent')
+    assert config['timeout'] == 30 and config['accesslog'] == '-'
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+import yaml
+
+from benchmarks.hot_paths import SYSTEM_TYPES, compose_file, make_data_dir
+from tests.conftest import ROOT
+
+CASES = ['api.github_files', 'api.local_files', 'compose.lint', 'compose.lint_cached', 'deploy.output',
+         'file_service.get_local_files', 'yaml.patch_batch', 'yaml.update_field', 'yaml.update_field_each',
+         'yaml.validate_large']
+
+
+def _run(*args):
+    command = [sys.executable, 'benchmarks/hot_paths.py', '--files', '20', '--services', '20', '--github-entries', '10',
+               '--compose-lines', '10', '--patch-fields', '3', '--repeat', '1', *args]
+    return subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=120)
+
+
+def test_synthetic_data():
+    services = yaml.safe_load(compose_file(3))['services']
+    assert list(services) == ['svc0', 'svc1', 'svc2']
+    assert services['svc2']['ports'] == ['10002:80']
+
+
+def test_make_data_dir_spreads_files_over_system_types(tmp_path):
+    make_data_dir(str(tmp_path), len(SYSTEM_TYPES) * 2)
+    assert sorted(os.listdir(tmp_path)) == sorted(SYSTEM_TYPES)
+    assert all(len(os.listdir(tmp_path / name)) == 2 for name in SYSTEM_TYPES)
+
+
+def test_save_baseline_and_check_for_regressions(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    result = _run('--baseline', str(baseline), '--save-baseline')
+    assert result.returncode == 0, result.stderr
+    saved = json.loads(baseline.read_text())
+    assert sorted(saved['results']) == CASES
+    assert saved['parameters']['services'] == 20
+
+    # Pretend every case used to be much faster
+    saved['results'] = {name: {'min_ms': 0.0001} for name in saved['results']}
+    baseline.write_text(json.dumps(saved))
+    result = _run('--baseline', str(baseline), '--only', 'yaml.validate', '--check')
+    assert result.returncode == 1
+    assert 'REGRESSION' in result.stdout and 'compose.lint' not in result.stdout
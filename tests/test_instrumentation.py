@@ -0,0 +1,68 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.routes import metrics as metrics_routes
+from app.services import instrumentation
+from app.services.instrumentation import Counter, Gauge, Histogram, Registry, _command_label
+
+
+def test_counter_and_label_escaping():
+    counter = Counter('jobs_total', 'Jobs', ('name',))
+    counter.inc(name='a "b"\n')
+    counter.inc(2, name='a "b"\n')
+    assert counter.value(name='a "b"\n') == 3
+    assert counter.render() == ['# HELP jobs_total Jobs', '# TYPE jobs_total counter',
+                                'jobs_total{name="a \\"b\\"\\n"} 3']
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 5.65',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_gauge_callback_and_registry():
+    registry = Registry()
+    registry.register(Gauge('entries', 'Entries', ('cache',), callback=lambda: {('lint',): 2}))
+    failing = registry.register(Gauge('broken', 'Broken', callback=lambda: 1 / 0))
+    assert 'entries{cache="lint"} 2' in registry.render().splitlines()
+    assert failing.render() == ['# HELP broken Broken', '# TYPE broken gauge']
+    assert registry.series_count() == 1
+
+
+@pytest.mark.parametrize('args, label', [
+    (['docker', 'compose', '-f', 'a.yml', 'up'], 'docker compose'),
+    (['/usr/bin/docker-compose', 'up'], 'docker-compose'),
+    ([b'docker', b'--version'], 'docker'),
+    ('git', 'git'),
+    ([], 'unknown'),
+])
+def test_command_label(args, label):
+    assert _command_label(args) == label
+
+
+def test_metrics_require_login_unless_public(app, client, monkeypatch):
+    assert app.test_client().get('/metrics').status_code == 401
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    monkeypatch.setattr(metrics_routes, 'METRICS_PUBLIC', True)
+    assert app.test_client().get('/metrics').status_code == 200
+
+
+def test_requests_queries_and_subprocesses_are_recorded(client):
+    client.get('/api/tokens')
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{blueprint="auth",endpoint="auth.list_api_tokens",' \
+           'method="GET",status="200"}' in body
+    assert 'db_query_duration_seconds_count{operation="SELECT"}' in body
+    assert instrumentation.subprocess_spawns.value(command=_command_label([sys.executable])) >= 1
@@ -0,0 +1,54 @@
+import json
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks import load_test
+from benchmarks.load_test import parse_mix, percentile, run_load
+from tests.conftest import ROOT
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    values = list(range(100, 0, -1))
+    assert (percentile(values, 0.5), percentile(values, 0.99), percentile(values, 1)) == (51, 100, 100)
+
+
+def test_parse_mix():
+    assert parse_mix('deploy=1, status=2.5') == {'deploy': 1.0, 'status': 2.5}
+    with pytest.raises(SystemExit, match='unknown actions in --mix: nope'):
+        parse_mix('deploy=1,nope=2')
+
+
+def test_run_load_counts_statuses_errors_and_failures(monkeypatch):
+    replies = {'ok': SimpleNamespace(status_code=200), 'bad': SimpleNamespace(status_code=500)}
+
+    def failing(client):
+        raise load_test.requests.ConnectionError()
+
+    monkeypatch.setattr(load_test, 'ACTIONS', {'ok': lambda client: replies['ok'], 'bad': lambda client: replies['bad'],
+                                               'down': failing})
+    results, elapsed, dropped = run_load(None, {'ok': 1, 'bad': 1, 'down': 1}, rps=300, duration=0.1,
+                                         max_in_flight=64)
+    assert dropped == 0 and elapsed >= 0.09
+    assert sum(len(result['latency']) for result in results.values()) == 30
+    expected = {'ok': (200, False), 'bad': (500, True), 'down': ('ConnectionError', True)}
+    for name, result in results.items():
+        status, failed = expected[name]
+        assert dict(result['statuses']) == {status: len(result['latency'])}
+        assert result['errors'] == (len(result['latency']) if failed else 0)
+
+
+def test_end_to_end_run(tmp_path):
+    report_path = tmp_path / 'report.json'
+    command = [sys.executable, 'benchmarks/load_test.py', '--rps', '10', '--duration', '1.5', '--compose-delay', '0.1',
+               '--compose-lines', '5', '--files', '20', '--github-entries', '5', '--users', '1', '--workers', '2',
+               '--threads', '4', '--mix', 'local_files=1,deployments=1,deploy=1,status=1', '--json', str(report_path)]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(report_path.read_text())
+    assert report['target_rps'] == 10 and report['dropped'] == 0
+    assert sum(row['count'] for row in report['endpoints'].values()) == 15
+    assert all(row['errors'] == 0 for row in report['endpoints'].values()), report
@@ -0,0 +1,70 @@
+import pytest
+
+from app.routes import docker as docker_routes
+
+
+class _Lines:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    calls = []
+    lines = [
+        ('stdout', '2024-05-01T10:00:00.100000000Z before'),
+        ('stdout', '2024-05-01T10:00:00.2Z delivered'),
+        ('stderr', '2024-05-01T10:00:00.200000001Z next'),
+        ('stdout', '2024-05-01T10:00:01Z later'),
+    ]
+
+    def open_log_stream(container_id, **kwargs):
+        calls.append(kwargs)
+        return True, _Lines(lines)
+
+    monkeypatch.setattr(docker_routes.docker_service, 'open_log_stream', open_log_stream)
+    return calls
+
+
+def _events(response):
+    return [block for block in response.get_data(as_text=True).split('\n\n') if block]
+
+
+def test_stream_sends_lines_as_events(client, opened):
+    response = client.get('/api/docker/containers/abc/logs/stream?since=1714557600&tail=10')
+    assert response.status_code == 200
+    assert opened[0]['since'] == 1714557600 and opened[0]['tail'] == 10
+    events = _events(response)
+    assert len(events) == 5
+    assert events[0] == 'id: 2024-05-01T10:00:00.100000000Z\nevent: stdout\ndata: before'
+    assert events[-1] == 'event: end\ndata: '
+
+
+def test_stream_resumes_after_last_event_id(client, opened):
+    response = client.get('/api/docker/containers/abc/logs/stream?since=1714557000&tail=10',
+                          headers={'Last-Event-ID': '2024-05-01T10:00:00.200Z'})
+    assert response.status_code == 200
+    assert opened[0]['since'] == 1714557600
+    assert opened[0]['tail'] == 'all'
+    assert [event.split('data: ')[1] for event in _events(response)] == ['next', 'later', '']
+
+
+def test_stream_rejects_invalid_last_event_id(client, opened):
+    response = client.get('/api/docker/containers/abc/logs/stream', headers={'Last-Event-ID': 'yesterday'})
+    assert response.status_code == 400
+    assert opened == []
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-05-01T10:00:00Z', 1714557600 * 10 ** 9),
+    ('2024-05-01T10:00:00.5Z', 1714557600 * 10 ** 9 + 500000000),
+    ('2024-05-01T12:00:00.000000001+02:00', 1714557600 * 10 ** 9 + 1),
+])
+def test_log_time_key(value, expected):
+    assert docker_routes._log_time_key(value) == expected
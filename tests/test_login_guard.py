@@ -0,0 +1,111 @@
+import threading
+
+import bcrypt
+import pytest
+
+from app.services import login_guard as login_guard_module
+from app.services.login_guard import LoginGuard, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(login_guard_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def guard(monkeypatch, clock):
+    monkeypatch.setenv('LOGIN_IP_RATE', '60')
+    monkeypatch.setenv('LOGIN_IP_BURST', '5')
+    monkeypatch.setenv('LOGIN_USER_RATE', '6')
+    monkeypatch.setenv('LOGIN_USER_BURST', '2')
+    return LoginGuard()
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(2, 0.5)
+    assert bucket.take() == (True, 0)
+    assert bucket.take() == (True, 0)
+    assert bucket.take() == (False, 2.0)
+    clock[0] += 2
+    assert bucket.take() == (True, 0)
+    clock[0] += 100
+    assert [bucket.take()[0] for _ in range(3)] == [True, True, False]
+
+
+def test_username_bucket_is_per_ip(guard):
+    assert [guard.allow('10.0.0.1', 'admin')[0] for _ in range(3)] == [True, True, False]
+    # Another client can still log in as the user the first one is guessing
+    assert guard.allow('10.0.0.2', 'admin') == (True, 0)
+    assert guard.allow('10.0.0.1', 'other') == (True, 0)
+    assert guard.stats()['rejected_username'] == 1
+
+
+def test_ip_bucket_covers_all_usernames(guard):
+    assert all(guard.allow('10.0.0.1', f'user{i}')[0] for i in range(5))
+    allowed, retry_after = guard.allow('10.0.0.1', 'admin')
+    assert not allowed and retry_after == pytest.approx(1.0)
+    assert guard.stats()['rejected_ip'] == 1
+
+
+def test_buckets_are_bounded(guard):
+    guard.max_buckets = 3
+    for i in range(10):
+        guard.allow(f'10.0.0.{i}', 'admin')
+    stats = guard.stats()
+    assert stats['tracked_ips'] == 3 and stats['tracked_usernames'] == 3
+
+
+def test_check_password():
+    hashed = bcrypt.hashpw(b'secret', bcrypt.gensalt(4)).decode('utf-8')
+    guard = LoginGuard()
+    assert guard.check_password('secret', hashed) is True
+    assert guard.check_password('wrong', hashed) is False
+    assert guard.stats()['verified'] == 2
+
+
+def test_check_password_is_busy_when_queue_is_full(monkeypatch):
+    monkeypatch.setenv('LOGIN_BCRYPT_WORKERS', '1')
+    monkeypatch.setenv('LOGIN_BCRYPT_QUEUE', '1')
+    guard = LoginGuard()
+    started, release = threading.Event(), threading.Event()
+
+    def checkpw(password, hashed):
+        started.set()
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(bcrypt, 'checkpw', checkpw)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(guard.check_password('x', 'y'))) for _ in range(2)]
+    threads[0].start()
+    started.wait(5)
+    threads[1].start()
+    for _ in range(500):
+        if guard.stats()['queued']:
+            break
+        threads[1].join(0.01)
+    # One check runs and one waits, so a third is turned away without waiting
+    assert guard.check_password('x', 'y') is None
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [True, True]
+    assert guard.stats()['rejected_busy'] == 1
+    assert guard.check_password('x', 'y') is True
+
+
+def test_login_route_returns_429_with_retry_after(app, monkeypatch):
+    monkeypatch.setattr(login_guard_module.login_guard, 'allow', lambda ip, username: (False, 2.5))
+    response = app.test_client().post('/api/login', json={'username': 'admin', 'password': 'x'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3'
+
+
+def test_login_route_returns_429_when_bcrypt_is_busy(app, monkeypatch):
+    monkeypatch.setattr(login_guard_module.login_guard, 'allow', lambda ip, username: (True, 0))
+    monkeypatch.setattr(login_guard_module.login_guard, 'check_password', lambda password, hashed: None)
+    response = app.test_client().post('/api/login', json={'username': 'admin', 'password': 'x'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
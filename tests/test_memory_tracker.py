@@ -0,0 +1,36 @@
+import tracemalloc
+
+import pytest
+
+from app.services.memory_tracker import MAX_FRAMES, MemoryTracker
+
+
+@pytest.fixture
+def tracker():
+    tracker = MemoryTracker()
+    yield tracker
+    tracker.stop()
+
+
+@pytest.mark.parametrize('frames, expected', [(0, 1), (5, 5), (100000, MAX_FRAMES)])
+def test_start_clamps_frames(tracker, frames, expected):
+    assert tracker.start(frames) is True
+    assert tracemalloc.get_traceback_limit() == expected
+    assert tracker.start(frames) is False
+
+
+@pytest.mark.parametrize('frames', [0, MAX_FRAMES + 1, 'deep'])
+def test_start_route_rejects_frames_out_of_range(client, frames):
+    response = client.post('/api/admin/memory/start', json={'frames': frames})
+    assert response.status_code == 400
+    assert not tracemalloc.is_tracing()
+
+
+def test_start_route(client):
+    try:
+        response = client.post('/api/admin/memory/start', json={'frames': 3})
+        assert response.status_code == 200
+        assert tracemalloc.get_traceback_limit() == 3
+    finally:
+        client.post('/api/admin/memory/stop')
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from app.services.metrics_store import RESOLUTIONS, MetricsStore, RingBuffer
+
+VALUES = {'cpu_percent': 10.0, 'mem_usage': 100.0, 'net_rx_rate': 1.0, 'net_tx_rate': 2.0}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = MetricsStore(str(tmp_path), max_series=2, persist_interval=60)
+    monkeypatch.setattr(store, '_read_host_metrics', lambda timestamp: dict(VALUES, cpu_percent=99.0))
+    return store
+
+
+def test_ring_buffer_averages_samples_per_bucket():
+    buffer = RingBuffer(10, 6)
+    buffer.add(1000, VALUES)
+    buffer.add(1005, dict(VALUES, cpu_percent=20.0))
+    buffer.add(1010, dict(VALUES, cpu_percent=40.0))
+    result = buffer.query(0, 2000)
+    assert result['timestamps'] == [1000, 1010]
+    assert result['cpu_percent'] == [15.0, 40.0]
+    assert result['mem_usage'] == [100.0, 100.0]
+
+
+def test_ring_buffer_overwrites_expired_buckets():
+    buffer = RingBuffer(10, 3)
+    for timestamp in (1000, 1010, 1020, 1030):
+        buffer.add(timestamp, dict(VALUES, cpu_percent=float(timestamp)))
+    result = buffer.query(0, 2000)
+    assert result['timestamps'] == [1010, 1020, 1030]
+    assert result['cpu_percent'] == [1010.0, 1020.0, 1030.0]
+    assert buffer.query(1015, 1025)['timestamps'] == [1020]
+
+
+def test_ring_buffer_dump_and_load():
+    buffer = RingBuffer(10, 4)
+    buffer.add(1000, VALUES)
+    restored = RingBuffer(10, 4)
+    assert restored.load(buffer.dump())
+    assert restored.query(0, 2000) == buffer.query(0, 2000)
+    assert not RingBuffer(10, 5).load(buffer.dump())
+
+
+@pytest.mark.parametrize('span, step', [(1800, 10), (7200, 60), (86400 * 2, 600), (86400 * 30, 600)])
+def test_query_picks_finest_resolution_covering_start(store, span, step):
+    store.record('web', VALUES, timestamp=100000)
+    assert store.query('web', start=100000 - span, end=100000)['step'] == step
+
+
+def test_query_with_explicit_step(store):
+    store.record('web', VALUES, timestamp=100000)
+    assert store.query('web', start=0, end=100000, step=60)['step'] == 60
+    assert store.query('web', step=7) is None
+    assert store.query('missing') is None
+
+
+def test_least_recently_updated_series_is_evicted(store):
+    for name in ('a', 'b', 'a', 'c'):
+        store.record(name, VALUES, timestamp=100000)
+    assert store.list_series() == ['a', 'c']
+    assert store.stats()['series'] == 2
+
+
+def test_host_metrics_do_not_share_project_names(store):
+    store.record_snapshot([{'id': '1', 'name': 'x', 'project': '_host', 'cpu_percent': 1.0, 'mem_usage': 5.0,
+                            'net_rx': 0, 'net_tx': 0}], timestamp=100000)
+    assert store.list_series() == ['_host']
+    assert store.query('_host', start=99000, end=100000)['cpu_percent'] == [1.0]
+    host = store.query_host(start=99000, end=100000)
+    assert host['host'] is True and host['cpu_percent'] == [99.0]
+    assert store.has_host()
+
+
+def test_other_workers_reload_persisted_history(store, tmp_path):
+    reader = MetricsStore(str(tmp_path), max_series=2)
+    assert reader.list_series() == [] and not reader.has_host()
+
+    store.record('web', VALUES, timestamp=100000)
+    store.record_host(VALUES, timestamp=100000)
+    store.persist()
+    assert reader.list_series() == ['web']
+    assert reader.query_host(start=99000, end=100000)['timestamps'] == [100000]
+
+    store.record('db', VALUES, timestamp=100010)
+    store.persist()
+    # Make sure the second write gets a new modification time on coarse clocks
+    os.utime(store.file_path, ns=(1, os.stat(store.file_path).st_mtime_ns + 1))
+    assert reader.list_series() == ['web', 'db']
+
+
+def test_record_snapshot_persists_after_interval(store):
+    container = {'id': '1', 'name': 'x', 'project': 'p', 'cpu_percent': 1.0, 'mem_usage': 5.0,
+                 'net_rx': 0, 'net_tx': 0}
+    store._last_persist = 100000
+    store.record_snapshot([container], timestamp=100030)
+    assert not os.path.exists(store.file_path)
+    store.record_snapshot([dict(container, net_rx=600)], timestamp=100060)
+    assert os.path.exists(store.file_path)
+    assert store.query('p', start=100000, end=100060, step=RESOLUTIONS[0][0])['net_rx_rate'] == [0.0, 20.0]
+
+
+def test_history_route_serves_host_and_projects(client, monkeypatch):
+    from app.routes import docker as docker_routes
+
+    store = MetricsStore(os.path.join(os.environ['DATA_DIR'], 'route-metrics'))
+    store.record('_host', VALUES)
+    store.record_host(dict(VALUES, cpu_percent=50.0))
+    monkeypatch.setattr(docker_routes, 'metrics_store', store)
+
+    listing = client.get('/api/docker/metrics/history').get_json()
+    assert listing['series'] == ['_host'] and listing['host'] is True
+    assert client.get('/api/docker/metrics/history?series=_host').get_json()['cpu_percent'] == [10.0]
+    assert client.get('/api/docker/metrics/history?host=1').get_json()['cpu_percent'] == [50.0]
+    assert client.get('/api/docker/metrics/history?series=missing').status_code == 404
@@ -0,0 +1,166 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+from app.routes import docker as docker_routes
+from app.services.compose_service import ComposeService
+from app.services.mirror_service import MirrorService
+
+MIRROR = 'docker.1ms.run'
+
+COMPOSE = """\
+services:
+  web:
+    image: nginx:1.25  # pinned
+  cache:
+    image: redis:7
+  app:
+    image: ghcr.io/org/app:1
+  gone:
+    image: missing:1
+  built:
+    build: .
+    image: local/built:1
+"""
+
+# Stand-in for the docker CLI: images live in a JSON file, `compose pull` logs the file it was given
+FAKE_DOCKER = """#!{python}
+import json, os, sys
+import yaml
+
+state_path = os.environ['FAKE_DOCKER_STATE']
+with open(state_path) as f:
+    state = json.load(f)
+args = sys.argv[1:]
+if args[0] == 'compose':
+    path, command = args[2], args[3]
+    with open(path) as f:
+        content = f.read()
+    if command == 'config':
+        print(content)
+    elif command == 'pull':
+        state['pulled_from'] = content
+        services = yaml.safe_load(content)['services']
+        for name in args[5:]:
+            image = services[name]['image']
+            if 'missing' not in image:
+                state['images'][image] = 1000
+elif args[:2] == ['image', 'inspect']:
+    if args[-1] not in state['images']:
+        sys.exit(1)
+    print(state['images'][args[-1]])
+elif args[0] == 'tag':
+    state['images'][args[2]] = state['images'][args[1]]
+elif args[:2] == ['image', 'rm']:
+    state['images'].pop(args[2])
+with open(state_path, 'w') as f:
+    json.dump(state, f)
+"""
+
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'docker'
+    script.write_text(FAKE_DOCKER.format(python=sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    state_path = tmp_path / 'docker-state.json'
+    state_path.write_text(json.dumps({'images': {'redis:7': 500}}))
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    monkeypatch.setenv('FAKE_DOCKER_STATE', str(state_path))
+    return lambda: json.loads(state_path.read_text())
+
+
+@pytest.fixture
+def compose_file(tmp_path):
+    path = tmp_path / 'project' / 'docker-compose.yml'
+    path.parent.mkdir()
+    path.write_text(COMPOSE)
+    return str(path)
+
+
+@pytest.fixture
+def mirrors(tmp_path, monkeypatch):
+    monkeypatch.setenv('REGISTRY_MIRRORS', f'{MIRROR},mirror.example.com')
+    service = MirrorService(str(tmp_path / 'mirror_stats.json'))
+    monkeypatch.setattr(docker_routes, 'mirror_service', service)
+    return service
+
+
+def test_pull_through_mirror_rewrites_only_missing_hub_images(docker, compose_file):
+    success, report = ComposeService('v2').pull_through_mirror(compose_file, MIRROR)
+    assert success, report
+    assert report['pulled'] == ['nginx:1.25'] and report['fallback'] == ['missing:1']
+    assert report['bytes'] == 1000 and report['mirror'] == MIRROR
+
+    state = docker()
+    # Pulled images are tagged back to their original name and the mirror tag is removed
+    assert state['images'] == {'redis:7': 500, 'nginx:1.25': 1000}
+    assert f'    image: {MIRROR}/library/nginx:1.25 # pinned\n' in state['pulled_from']
+    assert '    image: redis:7\n' in state['pulled_from'] and 'ghcr.io/org/app:1' in state['pulled_from']
+    # The temporary copy is removed and the compose file itself is not touched
+    assert os.listdir(os.path.dirname(compose_file)) == ['docker-compose.yml']
+    assert open(compose_file).read() == COMPOSE
+
+
+def test_pull_through_mirror_limited_to_services(docker, compose_file):
+    success, report = ComposeService('v2').pull_through_mirror(compose_file, MIRROR, services=['cache', 'app'])
+    assert success and report['pulled'] == [] and report['fallback'] == []
+    assert 'pulled_from' not in docker()
+
+
+def test_select_uses_the_best_healthy_mirror(mirrors, monkeypatch):
+    probed = []
+    monkeypatch.setattr(mirrors, 'probe', lambda mirror, url: probed.append(mirror))
+    mirrors.record(MIRROR, {'kind': 'probe', 'ok': False, 'latency_ms': None, 'error': 'timeout'})
+    mirrors.record('mirror.example.com', {'kind': 'probe', 'ok': True, 'latency_ms': 20})
+    assert mirrors.select() == 'mirror.example.com'
+    assert mirrors.select(MIRROR) == MIRROR and mirrors.select('unknown') is None
+    # Fresh records are not probed again
+    assert probed == []
+
+    mirrors.record('mirror.example.com', {'kind': 'probe', 'ok': False, 'latency_ms': None, 'error': 'HTTP 502'})
+    assert mirrors.select() is None
+
+
+def test_refresh_probes_stale_mirrors(mirrors, monkeypatch):
+    probed = []
+    monkeypatch.setattr(mirrors, 'probe', lambda mirror, url: probed.append((mirror, url)))
+    mirrors.record(MIRROR, {'kind': 'probe', 'ok': True, 'latency_ms': 20})
+    mirrors.refresh()
+    assert probed == [('mirror.example.com', 'https://mirror.example.com')]
+    mirrors.refresh(force=True)
+    assert len(probed) == 3
+
+
+def test_deploy_records_pull_throughput(docker, compose_file, mirrors):
+    mirrors.record(MIRROR, {'kind': 'probe', 'ok': True, 'latency_ms': 20})
+    mirrors.record('mirror.example.com', {'kind': 'probe', 'ok': True, 'latency_ms': 50})
+    lines = []
+    docker_routes.pull_through_mirror(ComposeService('v2'), compose_file, None, True, lines.append)
+    assert lines[0] == f'Pulling missing images through {MIRROR}\n'
+    assert f'missing:1 not pulled from {MIRROR}, falling back to its original registry\n' in lines
+    sample = mirrors.history()[MIRROR][-1]
+    assert sample['kind'] == 'pull' and sample['ok'] is True and sample['error'] == '1 images not available'
+
+
+def test_deploy_without_healthy_mirror_pulls_directly(docker, compose_file, mirrors, monkeypatch):
+    monkeypatch.setattr(mirrors, 'probe', lambda mirror, url: mirrors.record(
+        mirror, {'kind': 'probe', 'ok': False, 'latency_ms': None, 'error': 'timeout'}))
+    lines = []
+    docker_routes.pull_through_mirror(ComposeService('v2'), compose_file, None, True, lines.append)
+    assert lines == ['No healthy registry mirror, pulling images from their original registries\n']
+    assert 'pulled_from' not in docker()
+
+
+@pytest.mark.parametrize('mirror, error', [
+    ('unknown.example.com', 'Unknown mirror: unknown.example.com'),
+    (1, 'mirror must be a boolean or a mirror name'),
+])
+def test_deploy_rejects_invalid_mirror(client, compose_file, mirrors, mirror, error):
+    response = client.post('/api/docker/deploy', json={'file_path': compose_file, 'mirror': mirror})
+    assert response.status_code == 400 and response.get_json()['error'] == error
@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+from app.services.mirror_service import MirrorService, configured_mirrors
+from benchmarks.registry_speed import start_registry_stub
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv('MIRROR_HISTORY_SIZE', '3')
+    return MirrorService(str(tmp_path / 'mirror_stats.json'))
+
+
+@pytest.fixture
+def registry():
+    servers = []
+
+    def start(**kwargs):
+        server = start_registry_stub(64 * 1024 * 1024, layer_size=256 * 1024, **kwargs)
+        servers.append(server)
+        return f'127.0.0.1:{server.server_address[1]}', f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_configured_mirrors(monkeypatch):
+    monkeypatch.setenv('REGISTRY_MIRRORS', 'docker.1ms.run, http://127.0.0.1:5000/ ,')
+    assert configured_mirrors() == {'docker.1ms.run': 'https://docker.1ms.run',
+                                    '127.0.0.1:5000': 'http://127.0.0.1:5000'}
+
+
+def test_history_keeps_last_samples(service):
+    for index in range(5):
+        service.record('a', {'kind': 'probe', 'ok': True, 'latency_ms': index, 'error': None})
+    assert [sample['latency_ms'] for sample in service.history()['a']] == [2, 3, 4]
+
+
+def test_rank_orders_by_health_throughput_and_latency(service):
+    mirrors = {name: f'https://{name}' for name in ('slow', 'fast', 'probed', 'down', 'unknown')}
+    service.record('slow', {'kind': 'speed', 'ok': True, 'latency_ms': 10, 'throughput': 1000, 'ttfb_ms': 5})
+    service.record('fast', {'kind': 'speed', 'ok': True, 'latency_ms': 50, 'throughput': 5000, 'ttfb_ms': 9})
+    service.record('fast', {'kind': 'pull', 'ok': True, 'latency_ms': None, 'throughput': 10})
+    service.record('probed', {'kind': 'probe', 'ok': True, 'latency_ms': 1})
+    service.record('down', {'kind': 'speed', 'ok': True, 'latency_ms': 1, 'throughput': 9000})
+    service.record('down', {'kind': 'probe', 'ok': False, 'latency_ms': None, 'error': 'timeout'})
+
+    ranking = service.rank(mirrors)
+    assert [item['mirror'] for item in ranking] == ['fast', 'slow', 'probed', 'down', 'unknown']
+    # Speed tests take precedence over pull throughput
+    assert ranking[0]['throughput'] == 5000
+    assert ranking[3]['healthy'] is False and ranking[3]['last_error'] == 'timeout'
+    assert ranking[4]['checked_at'] is None
+
+
+def test_rank_falls_back_to_pull_throughput(service):
+    service.record('a', {'kind': 'pull', 'ok': True, 'latency_ms': None, 'throughput': 300})
+    service.record('a', {'kind': 'pull', 'ok': True, 'latency_ms': None, 'throughput': 100})
+    assert service.rank({'a': 'https://a'})[0]['throughput'] == 200
+
+
+@pytest.mark.parametrize('auth', [False, True])
+def test_speed_test_downloads_the_largest_layer(service, registry, auth):
+    mirror, url = registry(auth=auth)
+    sample = service.speed_test(mirror, url, image='library/debian:stable-slim', max_bytes=128 * 1024)
+    assert sample['ok'] is True, sample['error']
+    assert sample['bytes'] >= 128 * 1024
+    assert sample['throughput'] and sample['ttfb_ms'] is not None
+    assert service.history()[mirror][-1]['kind'] == 'speed'
+
+
+def test_speed_test_records_failures(service, registry):
+    mirror, url = registry(broken=True)
+    sample = service.speed_test(mirror, url)
+    assert sample['ok'] is False
+    assert sample['error'] == '获取清单返回 HTTP 500'
+    assert service.rank({mirror: url})[0]['healthy'] is False
+
+
+@pytest.mark.parametrize('challenge, message', [
+    ('Basic realm="x"', '镜像站需要认证'),
+    ('Bearer service="x"', '认证质询缺少 realm'),
+])
+def test_pull_token_rejects_unusable_challenges(service, challenge, message):
+    with pytest.raises(Exception, match=message):
+        service._pull_token(None, challenge, 'library/debian', 1)
+
+
+def test_probe_accepts_unauthorized_registries(service, registry):
+    mirror, url = registry(auth=True)
+    sample = service.probe(mirror, url)
+    assert sample['ok'] is True and sample['latency_ms'] is not None
+
+
+def test_background_speed_test_runs_once(service, monkeypatch):
+    release = threading.Event()
+    tested = []
+
+    def speed_test_all(mirrors):
+        release.wait(5)
+        tested.append(list(mirrors))
+
+    monkeypatch.setattr(service, 'speed_test_all', speed_test_all)
+    assert service.speed_test_status()['running'] is False
+
+    started, status = service.start_speed_test({'a': 'https://a'})
+    assert started and status['running'] is True
+    started, status = MirrorService(service.file_path).start_speed_test({'a': 'https://a'})
+    assert not started
+    assert status['running'] is True and status['mirrors'] == ['a']
+
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == 'mirror-speed-test':
+            thread.join(5)
+    status = service.speed_test_status()
+    assert status['running'] is False and status['finished_at'] >= status['started_at']
+    assert tested == [['a']]
+
+
+def test_speed_test_route_runs_in_background(client, monkeypatch):
+    from app.services.mirror_service import mirror_service
+
+    calls = []
+    monkeypatch.setattr(mirror_service, 'start_speed_test',
+                        lambda mirrors: (calls.append(mirrors) or True, {'running': True}))
+    response = client.post('/api/mirrors/speed-test', json={'mirror': 'docker.1ms.run'})
+    assert response.status_code == 202
+    assert calls == [{'docker.1ms.run': 'https://docker.1ms.run'}]
+
+    monkeypatch.setattr(mirror_service, 'start_speed_test', lambda mirrors: (False, {'running': True}))
+    assert client.post('/api/mirrors/speed-test').status_code == 409
+    assert client.post('/api/mirrors/speed-test', json={'mirror': 'nope'}).status_code == 400
+    assert 'speed_test' in client.get('/api/mirrors').get_json()
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+from flask import Flask, session
+
+from app.services.profiler import RequestProfiler
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setenv('PROFILE_MAX_FILES', '2')
+
+    def make_app(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        profiler = RequestProfiler()
+        app = Flask(__name__)
+        app.secret_key = 'test'
+
+        @app.route('/api/<name>')
+        def api(name):
+            if name == 'admin':
+                session['is_admin'] = True
+            if name == 'fail':
+                raise RuntimeError('boom')
+            return 'ok'
+
+        @app.route('/other')
+        def other():
+            return 'ok'
+
+        profiler.init_app(app)
+        return app, profiler
+
+    return make_app
+
+
+def test_disabled_profiler_adds_no_hooks(make_app):
+    app, profiler = make_app(PROFILE_REQUESTS='')
+    assert not app.before_request_funcs and not app.after_request_funcs
+    assert profiler.list_profiles() == []
+
+
+def test_matching_paths_are_profiled_and_old_files_pruned(make_app):
+    app, profiler = make_app(PROFILE_REQUESTS='/api')
+    client = app.test_client()
+    assert 'X-Profile-File' not in client.get('/other').headers
+    names = [client.get(f'/api/{index}').headers['X-Profile-File'] for index in range(3)]
+    assert all(name.endswith('.prof') and '-api-' in name for name in names)
+
+    profiles = profiler.list_profiles()
+    assert len(profiles) == 2 and all(profile['size'] > 0 for profile in profiles)
+    assert sorted(os.listdir(profiler.directory)) == sorted(profile['name'] for profile in profiles)
+
+
+def test_header_profiles_admin_requests_only(make_app):
+    app, _ = make_app(PROFILE_REQUESTS='', PROFILE_ALLOW_HEADER='true')
+    client = app.test_client()
+    assert 'X-Profile-File' not in client.get('/other', headers={'X-Profile': '1'}).headers
+    client.get('/api/admin')
+    assert 'X-Profile-File' in client.get('/other', headers={'X-Profile': '1'}).headers
+    assert 'X-Profile-File' not in client.get('/other').headers
+
+
+def test_one_request_is_profiled_at_a_time(make_app):
+    _, profiler = make_app(PROFILE_REQUESTS='/api')
+    profile = profiler.start()
+    assert profile is not None and profiler.start() is None
+    profiler.stop(profile)
+    profiler.stop(profiler.start())
+
+
+def test_failed_request_releases_the_profiler(make_app):
+    app, profiler = make_app(PROFILE_REQUESTS='/api')
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    assert app.test_client().get('/api/fail').status_code == 500
+    profile = profiler.start()
+    assert profile is not None
+    profiler.stop(profile)
+
+
+def test_admin_routes_list_and_download_profiles(client, make_app, monkeypatch):
+    from app.routes import admin as admin_routes
+
+    app, profiler = make_app(PROFILE_REQUESTS='/api')
+    name = app.test_client().get('/api/1').headers['X-Profile-File']
+    monkeypatch.setattr(admin_routes, 'request_profiler', profiler)
+
+    listing = client.get('/api/admin/profiles').get_json()
+    assert [profile['name'] for profile in listing['profiles']] == [name] and listing['max_files'] == 2
+    assert client.get(f'/api/admin/profiles/{name}').status_code == 200
+    assert client.get('/api/admin/profiles/..%2Fsecret.prof').status_code == 404
+    assert client.get('/api/admin/profiles/notes.txt').status_code == 404
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from app.services.rate_limit import RateLimitExceeded, RateLimitStore
+
+
+class _Response:
+    def __init__(self, status_code=200, **headers):
+        self.status_code = status_code
+        self.headers = {key.replace('_', '-'): value for key, value in headers.items()}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_RESERVE', '100')
+    return RateLimitStore(str(tmp_path / 'limits.json'))
+
+
+def _limit(remaining, reset_at=None):
+    return _Response(**{'X_RateLimit_Remaining': str(remaining), 'X_RateLimit_Limit': '5000',
+                        'X_RateLimit_Reset': str(int(reset_at or time.time() + 3600))})
+
+
+def test_update_reads_rate_limit_headers(store):
+    reset_at = int(time.time() + 3600)
+    store.update('github', _limit(4321, reset_at))
+    state = store.get('github')
+    assert (state['limit'], state['remaining'], state['reset_at']) == (5000, 4321, reset_at)
+
+
+def test_responses_without_headers_are_ignored(store):
+    store.update('github', _Response())
+    assert store.get('github') is None
+    store.check('github')
+
+
+def test_reserve_defers_only_background_requests(store):
+    store.update('github', _limit(50))
+    store.check('github', interactive=True)
+    with pytest.raises(RateLimitExceeded) as error:
+        store.check('github', interactive=False)
+    assert error.value.deferred is True
+
+
+def test_exhausted_budget_blocks_all_requests_until_reset(store):
+    store.update('github', _limit(0))
+    with pytest.raises(RateLimitExceeded) as error:
+        store.check('github')
+    assert error.value.deferred is False
+
+    store.update('github', _limit(0, reset_at=time.time() - 1))
+    store.check('github')
+
+
+def test_retry_after_marks_budget_exhausted(store):
+    store.update('github', _Response(429, Retry_After='60'))
+    state = store.get('github')
+    assert state['remaining'] == 0 and state['reset_at'] >= time.time() + 59
+    with pytest.raises(RateLimitExceeded):
+        store.check('github')
+
+
+def test_out_of_order_responses_keep_the_lower_remaining(store):
+    reset_at = time.time() + 3600
+    store.update('github', _limit(10, reset_at))
+    store.update('github', _limit(12, reset_at))
+    assert store.get('github')['remaining'] == 10
+
+
+def test_budget_is_shared_between_workers(store):
+    other = RateLimitStore(store.file_path)
+    assert other.get('github') is None
+    store.update('github', _limit(0))
+    with pytest.raises(RateLimitExceeded):
+        other.check('github')
+    assert other.summary()['github']['remaining'] == 0
+
+
+def test_rate_limit_exceeded_is_an_ioerror():
+    assert issubclass(RateLimitExceeded, IOError)
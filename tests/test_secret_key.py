@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import load_secret_key
+from tests.conftest import ROOT
+
+
+@pytest.fixture
+def key_path(tmp_path, monkeypatch):
+    path = tmp_path / 'keys' / '.secret_key'
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    monkeypatch.setenv('SECRET_KEY_FILE', str(path))
+    return path
+
+
+def test_environment_key_wins(key_path, monkeypatch):
+    monkeypatch.setenv('SECRET_KEY', 'from-env')
+    assert load_secret_key() == 'from-env'
+    assert not key_path.exists()
+
+
+def test_generated_key_is_persisted(key_path):
+    key = load_secret_key()
+    assert len(key) == 64
+    assert key_path.read_text() == key
+    assert os.stat(key_path).st_mode & 0o777 == 0o600
+    assert load_secret_key() == key
+
+
+def test_existing_key_file_is_used(key_path):
+    key_path.parent.mkdir()
+    key_path.write_text('saved-key\n')
+    assert load_secret_key() == 'saved-key'
+
+
+def test_workers_starting_together_share_one_key(key_path):
+    # An empty SECRET_KEY keeps load_dotenv from filling it in from the repository's .env
+    env = dict(os.environ, SECRET_KEY='', SECRET_KEY_FILE=str(key_path))
+    workers = [subprocess.Popen([sys.executable, '-c', 'from app import load_secret_key; print(load_secret_key())'],
+                                cwd=ROOT, env=env, stdout=subprocess.PIPE) for _ in range(4)]
+    keys = {worker.communicate(timeout=60)[0].decode().strip() for worker in workers}
+    assert keys == {key_path.read_text()}
+
+
+def test_sessions_survive_a_restart(key_path, tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "app.db"}')
+    from app import create_app
+
+    first = create_app().test_client()
+    with first.session_transaction() as session:
+        session['user_id'] = 1
+    cookie = first.get_cookie('session')
+
+    second = create_app().test_client()
+    second.set_cookie('session', cookie.value)
+    with second.session_transaction() as session:
+        assert session['user_id'] == 1
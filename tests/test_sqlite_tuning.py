@@ -0,0 +1,25 @@
+import pytest
+
+from app import db, sqlite_engine_options
+
+
+@pytest.mark.parametrize('uri', ['sqlite://', 'sqlite:///:memory:', 'postgresql://db/app'])
+def test_no_options_for_memory_and_other_databases(uri):
+    assert sqlite_engine_options(uri) == {}
+
+
+def test_file_database_options(monkeypatch):
+    monkeypatch.setenv('SQLITE_BUSY_TIMEOUT', '5000')
+    monkeypatch.setenv('SQLITE_POOL_SIZE', '4')
+    options = sqlite_engine_options('sqlite:///data/app.db')
+    assert options['connect_args'] == {'timeout': 5.0, 'check_same_thread': False}
+    assert (options['pool_size'], options['max_overflow']) == (4, 40)
+
+
+def test_connections_use_wal_and_busy_timeout(app):
+    with app.app_context(), db.engine.connect() as connection:
+        pragma = lambda name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('busy_timeout') == 15000
+
@@ -0,0 +1,98 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import stats_sampler as sampler_module
+from app.services.metrics_store import MetricsStore
+from app.services.stats_sampler import ContainerStatsSampler, parse_stats
+
+STATS = {
+    'cpu_stats': {'cpu_usage': {'total_usage': 3000}, 'system_cpu_usage': 20000, 'online_cpus': 2},
+    'precpu_stats': {'cpu_usage': {'total_usage': 1000}, 'system_cpu_usage': 10000},
+    'memory_stats': {'usage': 500, 'limit': 1000, 'stats': {'inactive_file': 100}},
+    'networks': {'eth0': {'rx_bytes': 10, 'tx_bytes': 20}, 'eth1': {'rx_bytes': 1, 'tx_bytes': 2}},
+    'blkio_stats': {'io_service_bytes_recursive': [{'op': 'Read', 'value': 7}, {'op': 'Write', 'value': 8},
+                                                   {'op': 'Total', 'value': 15}]},
+    'pids_stats': {'current': 4},
+}
+
+
+def _container(container_id, project='web'):
+    return SimpleNamespace(id=container_id, short_id=container_id[:12], name=f'{project}-{container_id}',
+                           labels={'com.docker.compose.project': project, 'com.docker.compose.service': 'app'})
+
+
+@pytest.fixture
+def sampler(tmp_path, monkeypatch):
+    monkeypatch.setattr(sampler_module, 'metrics_store', MetricsStore(str(tmp_path / 'history')))
+    sampler = ContainerStatsSampler(interval=1, data_dir=str(tmp_path))
+    yield sampler
+    sampler._release_leadership()
+
+
+def test_parse_stats():
+    assert parse_stats(STATS) == {'cpu_percent': 40.0, 'mem_usage': 400, 'mem_limit': 1000, 'net_rx': 11,
+                                  'net_tx': 22, 'block_read': 7, 'block_write': 8, 'pids': 4}
+
+
+def test_parse_stats_without_previous_sample():
+    values = parse_stats({'cpu_stats': {'cpu_usage': {'total_usage': 10}}})
+    assert values['cpu_percent'] == 0.0 and values['mem_usage'] == 0 and values['net_rx'] == 0
+
+
+def test_released_slots_are_reused(sampler):
+    with sampler._lock:
+        first = sampler._allocate_slot(_container('a' * 64))
+        second = sampler._allocate_slot(_container('b' * 64))
+    sampler._values['cpu_percent'][first] = 50.0
+    sampler._release_slot('a' * 64)
+    with sampler._lock:
+        third = sampler._allocate_slot(_container('c' * 64))
+    assert (first, second, third) == (0, 1, 0)
+    assert sampler._values['cpu_percent'][third] == 0.0
+    assert sampler.stats()['slots'] == 2 and sampler.stats()['containers'] == 2
+
+
+def test_only_one_sampler_holds_the_lock(sampler, tmp_path):
+    other = ContainerStatsSampler(interval=1, data_dir=str(tmp_path))
+    assert sampler._acquire_leadership()
+    assert not other._acquire_leadership()
+    assert sampler.is_leader() and not other.is_leader()
+
+    sampler._release_leadership()
+    assert other._acquire_leadership()
+    other._release_leadership()
+
+
+def test_other_workers_read_the_leaders_snapshot(sampler, tmp_path):
+    follower = ContainerStatsSampler(interval=1, data_dir=str(tmp_path))
+    assert json.loads(follower.snapshot())['containers'] == []
+
+    assert sampler._acquire_leadership()
+    with sampler._lock:
+        slot = sampler._allocate_slot(_container('a' * 64))
+        for field, value in parse_stats(STATS).items():
+            sampler._values[field][slot] = value
+        sampler._updated_at[slot] = 1000.0
+        # Containers without a sample yet are left out
+        sampler._allocate_slot(_container('b' * 64))
+    sampler._rebuild_snapshot()
+
+    snapshot = json.loads(follower.snapshot())
+    assert follower.snapshot() == sampler.snapshot()
+    container, = snapshot['containers']
+    assert container['project'] == 'web' and container['cpu_percent'] == 40.0 and container['sampled_at'] == 1000.0
+    assert sampler_module.metrics_store.list_series() == ['web']
+
+
+def test_stats_route_serves_the_cached_snapshot(client, sampler, monkeypatch):
+    from app.routes import docker as docker_routes
+
+    started = []
+    monkeypatch.setattr(sampler, 'start', lambda: started.append(True))
+    monkeypatch.setattr(docker_routes, 'stats_sampler', sampler)
+    response = client.get('/api/docker/containers/stats')
+    assert response.status_code == 200 and response.mimetype == 'application/json'
+    assert response.get_json() == {'containers': [], 'updated_at': None, 'interval': 1.0}
+    assert started == [True]
@@ -0,0 +1,159 @@
+import pytest
+
+from app.services.yaml_patch import YamlPatchError, apply_patch, format_path, parse_path
+
+COMPOSE = """\
+# top comment
+services:
+  web:
+    image: nginx:1.25  # pinned
+    environment:
+      - A=1
+  # cache
+  redis:
+    image: redis:7
+    ports:
+      - "6379:6379"
+
+  # database
+  db:
+    image: postgres:16
+"""
+
+
+def test_parse_and_format_path():
+    parts = parse_path('services.web.labels["traefik.enable"].ports[0]')
+    assert parts == ['services', 'web', 'labels', 'traefik.enable', 'ports', 0]
+    assert format_path(parts) == 'services.web.labels["traefik.enable"].ports[0]'
+
+
+def test_parse_path_rejects_empty():
+    with pytest.raises(YamlPatchError):
+        parse_path('')
+
+
+def test_no_change_returns_original():
+    content, results = apply_patch(COMPOSE, [{'op': 'set', 'path': 'services.web.image', 'value': 'nginx:1.25'}])
+    assert content == COMPOSE
+    assert results[0]['changed'] is False
+
+
+def test_set_keeps_end_of_line_comment():
+    content, _ = apply_patch(COMPOSE, [{'op': 'set', 'path': 'services.web.image', 'value': 'nginx:1.27'}])
+    assert '    image: nginx:1.27  # pinned\n' in content
+
+
+def test_set_new_key_keeps_comment_before_next_service():
+    content, results = apply_patch(COMPOSE, [{'op': 'set', 'path': 'services.*.restart', 'value': 'unless-stopped'}])
+    assert results[0]['matches'] == 3
+    assert content == """\
+# top comment
+services:
+  web:
+    image: nginx:1.25  # pinned
+    environment:
+      - A=1
+    restart: unless-stopped
+  # cache
+  redis:
+    image: redis:7
+    ports:
+      - "6379:6379"
+    restart: unless-stopped
+
+  # database
+  db:
+    image: postgres:16
+    restart: unless-stopped
+"""
+
+
+def test_set_nested_path_keeps_comment_before_next_service():
+    content, _ = apply_patch(COMPOSE, [{'op': 'set', 'path': 'services.redis.deploy.resources.limits.cpus',
+                                        'value': '0.5'}])
+    assert '      - "6379:6379"\n    deploy:\n      resources:\n        limits:\n          cpus: "0.5"\n\n' \
+           '  # database\n  db:\n' in content
+
+
+def test_append_keeps_comment_before_next_service():
+    content, _ = apply_patch(COMPOSE, [{'op': 'append', 'path': 'services.redis.ports', 'value': '6380:6380'}])
+    assert '      - "6379:6379"\n      - 6380:6380\n\n  # database\n  db:\n' in content
+
+
+def test_set_env_list_keeps_comment_before_next_service():
+    content, _ = apply_patch(COMPOSE, [{'op': 'set_env', 'service': 'web', 'name': 'B', 'value': 2}])
+    assert '      - A=1\n      - B=2\n  # cache\n  redis:\n' in content
+
+
+def test_set_env_new_mapping_keeps_comment_before_next_service():
+    content, _ = apply_patch(COMPOSE, [{'op': 'set_env', 'service': 'redis', 'name': 'TZ', 'value': 'UTC'}])
+    assert '      - "6379:6379"\n    environment:\n      TZ: UTC\n\n  # database\n  db:\n' in content
+
+
+def test_replace_list_with_mapping_keeps_comment_before_next_service():
+    content, _ = apply_patch(COMPOSE, [{'op': 'set', 'path': 'services.web.environment', 'value': {'A': '1'}}])
+    assert '    environment:\n      A: "1"\n  # cache\n  redis:\n' in content
+
+
+def test_delete_keeps_comment_of_next_service():
+    content, _ = apply_patch(COMPOSE, [{'op': 'delete', 'path': 'services.web.environment'}])
+    assert '    image: nginx:1.25  # pinned\n  # cache\n  redis:\n' in content
+
+
+def test_new_top_level_key_goes_after_existing_content():
+    content, _ = apply_patch(COMPOSE, [{'op': 'set', 'path': 'networks.default.name', 'value': 'proxy'}])
+    assert content.startswith('# top comment\n')
+    assert content.endswith('    image: postgres:16\nnetworks:\n  default:\n    name: proxy\n')
+
+
+def test_set_quotes_values_yaml_would_retype():
+    content, _ = apply_patch(COMPOSE, [{'op': 'append', 'path': 'services.web.ports', 'value': '22:22'},
+                                       {'op': 'set_env', 'service': 'web', 'name': 'DEBUG', 'value': 'yes'}])
+    assert '"22:22"' in content
+    assert 'DEBUG=yes' in content
+
+
+def test_append_unique():
+    _, results = apply_patch(COMPOSE, [{'op': 'append', 'path': 'services.redis.ports', 'value': '6379:6379',
+                                        'unique': True}])
+    assert results[0]['changed'] is False
+
+
+def test_rewrite_registry_only_docker_hub():
+    content, results = apply_patch(
+        COMPOSE.replace('postgres:16', 'ghcr.io/org/postgres:16'),
+        [{'op': 'rewrite_registry', 'mirror': 'https://mirror.example.com'}]
+    )
+    assert results[0]['images'] == {'web': 'mirror.example.com/library/nginx:1.25',
+                                    'redis': 'mirror.example.com/library/redis:7'}
+    assert 'image: ghcr.io/org/postgres:16' in content
+    assert 'image: mirror.example.com/library/nginx:1.25 # pinned' in content
+
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'rename', 'path': 'services'},
+    {'op': 'set', 'path': 'services.web.image'},
+    {'op': 'set_env', 'name': 'A=B', 'value': '1'},
+    {'op': 'set', 'path': 'services.web.image.tag', 'value': 'x'},
+])
+def test_invalid_operations(operation):
+    with pytest.raises(YamlPatchError):
+        apply_patch(COMPOSE, [operation])
+
+
+def test_patch_file_route_checks_version(client, tmp_path):
+    from app.services.file_service import content_hash
+
+    path = tmp_path / 'docker-compose.yml'
+    path.write_text(COMPOSE, encoding='utf-8')
+    operations = [{'op': 'set', 'path': 'services.web.image', 'value': 'nginx:1.27'}]
+    response = client.post('/api/github/patch-file', json={'file_path': str(path), 'operations': operations,
+                                                           'base_hash': content_hash('old')})
+    assert response.status_code == 412
+    assert response.get_json()['content_hash'] == content_hash(COMPOSE)
+
+    response = client.post('/api/github/patch-file', json={'file_path': str(path), 'operations': operations,
+                                                           'base_hash': content_hash(COMPOSE)})
+    assert response.status_code == 200 and response.get_json()['changed'] is True
+    assert '    image: nginx:1.27  # pinned\n' in path.read_text(encoding='utf-8')
+    assert response.headers['ETag'] == f'"{response.get_json()["content_hash"]}"'